@@ -0,0 +1,44 @@
+"""hash_existing_verification_tokens
+
+Revision ID: b3e8d1f6a9c2
+Revises: f1c6e9a2b4d8
+Create Date: 2026-10-14 16:05:00.000000
+
+"""
+import hashlib
+import hmac
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d1f6a9c2'
+down_revision = 'f1c6e9a2b4d8'
+branch_labels = None
+depends_on = None
+
+# Тот же ключ и алгоритм, что в auth_service.hash_verification_token: миграцию
+# нужно запускать с SECRET_KEY продакшена, иначе ссылки из писем не совпадут
+_SECRET_KEY_BYTES = os.getenv("SECRET_KEY", "your-secret-key-change-in-production").encode()
+
+
+def upgrade() -> None:
+    # Токены, выданные до хранения HMAC, лежат в открытом виде; уже
+    # захешированные значения - 64 hex-символа, их не трогаем
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, verification_token FROM users "
+        "WHERE verification_token IS NOT NULL AND verification_token !~ '^[0-9a-f]{64}$'"
+    )).fetchall()
+    update = sa.text("UPDATE users SET verification_token = :token_hash WHERE id = :id")
+    for user_id, token in rows:
+        token_hash = hmac.new(_SECRET_KEY_BYTES, token.encode(), hashlib.sha256).hexdigest()
+        bind.execute(update, {"id": user_id, "token_hash": token_hash})
+
+
+def downgrade() -> None:
+    # HMAC необратим: исходные токены восстановить нельзя, пользователи
+    # запросят письмо заново через /auth/resend-verification
+    pass
@@ -0,0 +1,36 @@
+"""author_and_client_user_indexes
+
+Revision ID: b6d1f3a8c2e0
+Revises: f4a9d3e6c1b8
+Create Date: 2026-10-14 12:20:31.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f3a8c2e0'
+down_revision = 'f4a9d3e6c1b8'
+branch_labels = None
+depends_on = None
+
+
+# (имя индекса, таблица, колонка внешнего ключа)
+_INDEXES = [
+    ('ix_notes_author_id', 'notes', 'author_id'),
+    ('ix_clients_users_client_id', 'clients_users', 'client_id'),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, column in _INDEXES:
+            op.create_index(name, table, [column], postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,32 @@
+"""partial_index_on_verification_token
+
+Revision ID: c3f1a8d2b7e4
+Revises: 9a7d4d9e1eea
+Create Date: 2026-10-14 10:12:30.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a8d2b7e4'
+down_revision = '9a7d4d9e1eea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_constraint('users_verification_token_key', 'users', type_='unique')
+    op.create_index(
+        'ix_users_verification_token',
+        'users',
+        ['verification_token'],
+        unique=True,
+        postgresql_where=sa.text('verification_token IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_verification_token', table_name='users')
+    op.create_unique_constraint('users_verification_token_key', 'users', ['verification_token'])
@@ -0,0 +1,49 @@
+"""server_side_timestamps
+
+Revision ID: c9e4a7b2d5f3
+Revises: b6d1f3a8c2e0
+Create Date: 2026-10-14 12:36:12.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e4a7b2d5f3'
+down_revision = 'b6d1f3a8c2e0'
+branch_labels = None
+depends_on = None
+
+
+_TABLES = ['tenants', 'users', 'clients', 'sessions', 'notes', 'media', 'ai_insights']
+_COLUMNS = ['created_at', 'updated_at']
+
+
+def upgrade() -> None:
+    # Старые значения писались через datetime.utcnow, то есть в UTC
+    for table in _TABLES:
+        for column in _COLUMNS:
+            op.alter_column(
+                table,
+                column,
+                type_=sa.DateTime(timezone=True),
+                existing_type=sa.DateTime(),
+                existing_nullable=False,
+                server_default=sa.text('now()'),
+                postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+            )
+
+
+def downgrade() -> None:
+    for table in reversed(_TABLES):
+        for column in _COLUMNS:
+            op.alter_column(
+                table,
+                column,
+                type_=sa.DateTime(),
+                existing_type=sa.DateTime(timezone=True),
+                existing_nullable=False,
+                server_default=None,
+                postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+            )
@@ -0,0 +1,40 @@
+"""jsonb_content_and_transcription
+
+Revision ID: d2f7b8e1a4c6
+Revises: c9e4a7b2d5f3
+Create Date: 2026-10-14 12:58:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f7b8e1a4c6'
+down_revision = 'c9e4a7b2d5f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # jsonb хранится уже разобранным и индексируется GIN
+    op.alter_column('media', 'transcription', type_=postgresql.JSONB(), existing_type=sa.JSON(),
+                    postgresql_using='transcription::jsonb')
+    op.alter_column('ai_insights', 'content_json', type_=postgresql.JSONB(), existing_type=sa.JSON(),
+                    existing_nullable=False, postgresql_using='content_json::jsonb')
+    op.create_index(
+        'ix_ai_insights_content_json_gin',
+        'ai_insights',
+        ['content_json'],
+        postgresql_using='gin',
+        postgresql_ops={'content_json': 'jsonb_path_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_insights_content_json_gin', table_name='ai_insights')
+    op.alter_column('ai_insights', 'content_json', type_=sa.JSON(), existing_type=postgresql.JSONB(),
+                    existing_nullable=False, postgresql_using='content_json::json')
+    op.alter_column('media', 'transcription', type_=sa.JSON(), existing_type=postgresql.JSONB(),
+                    postgresql_using='transcription::json')
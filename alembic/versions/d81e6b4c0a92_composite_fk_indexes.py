@@ -0,0 +1,37 @@
+"""composite_fk_indexes
+
+Revision ID: d81e6b4c0a92
+Revises: c3f1a8d2b7e4
+Create Date: 2026-10-14 11:40:05.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e6b4c0a92'
+down_revision = 'c3f1a8d2b7e4'
+branch_labels = None
+depends_on = None
+
+
+# (имя индекса, таблица, колонка внешнего ключа)
+_INDEXES = [
+    ('ix_users_tenant_id_id', 'users', 'tenant_id'),
+    ('ix_clients_tenant_id_id', 'clients', 'tenant_id'),
+    ('ix_sessions_client_id_id', 'sessions', 'client_id'),
+    ('ix_notes_session_id_id', 'notes', 'session_id'),
+    ('ix_media_session_id_id', 'media', 'session_id'),
+    ('ix_ai_insights_session_id_id', 'ai_insights', 'session_id'),
+]
+
+
+def upgrade() -> None:
+    for name, table, column in _INDEXES:
+        op.create_index(name, table, [column, 'id'])
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,50 @@
+"""tenant_stats_materialized_view
+
+Revision ID: e5a1c3d7f9b2
+Revises: d2f7b8e1a4c6
+Create Date: 2026-10-14 13:10:27.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a1c3d7f9b2'
+down_revision = 'd2f7b8e1a4c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Сессии и инсайты агрегируются отдельно и до join-а с tenants:
+    # без размножения строк и без COUNT(DISTINCT)
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW tenant_stats AS
+        SELECT t.id AS tenant_id,
+               COALESCE(s.sessions, 0) AS sessions,
+               COALESCE(i.insights, 0) AS insights,
+               s.last_session
+        FROM tenants t
+        LEFT JOIN (
+            SELECT c.tenant_id, COUNT(*) AS sessions, MAX(se.scheduled_at) AS last_session
+            FROM sessions se JOIN clients c ON c.id = se.client_id
+            GROUP BY c.tenant_id
+        ) s ON s.tenant_id = t.id
+        LEFT JOIN (
+            SELECT c.tenant_id, COUNT(*) AS insights
+            FROM ai_insights ai
+            JOIN sessions se ON se.id = ai.session_id
+            JOIN clients c ON c.id = se.client_id
+            GROUP BY c.tenant_id
+        ) i ON i.tenant_id = t.id
+        WITH DATA
+        """
+    )
+    # Уникальный индекс обязателен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.create_index('ix_tenant_stats_tenant_id', 'tenant_stats', ['tenant_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW tenant_stats")
@@ -0,0 +1,35 @@
+"""hnsw_index_on_ai_insight_embedding
+
+Revision ID: e7b2c94f1d35
+Revises: d81e6b4c0a92
+Create Date: 2026-10-14 11:52:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c94f1d35'
+down_revision = 'd81e6b4c0a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Построение HNSW упирается в память и распараллеливается: поднимаем лимиты
+    # только на время этой транзакции
+    op.execute("SET LOCAL maintenance_work_mem = '2GB'")
+    op.execute("SET LOCAL max_parallel_maintenance_workers = 7")
+    op.create_index(
+        'ix_ai_insights_embedding_hnsw',
+        'ai_insights',
+        ['embedding'],
+        postgresql_using='hnsw',
+        postgresql_with={'m': 24, 'ef_construction': 128},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_insights_embedding_hnsw', table_name='ai_insights')
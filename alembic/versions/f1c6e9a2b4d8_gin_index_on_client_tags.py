@@ -0,0 +1,24 @@
+"""gin_index_on_client_tags
+
+Revision ID: f1c6e9a2b4d8
+Revises: e5a1c3d7f9b2
+Create Date: 2026-10-14 13:22:03.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6e9a2b4d8'
+down_revision = 'e5a1c3d7f9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_clients_tags_gin', 'clients', ['tags'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_clients_tags_gin', table_name='clients')
@@ -0,0 +1,42 @@
+"""halfvec_ai_insight_embedding
+
+Revision ID: f4a9d3e6c1b8
+Revises: e7b2c94f1d35
+Create Date: 2026-10-14 11:58:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a9d3e6c1b8'
+down_revision = 'e7b2c94f1d35'
+branch_labels = None
+depends_on = None
+
+
+def _create_hnsw_index(ops: str) -> None:
+    op.execute("SET LOCAL maintenance_work_mem = '2GB'")
+    op.execute("SET LOCAL max_parallel_maintenance_workers = 7")
+    op.create_index(
+        'ix_ai_insights_embedding_hnsw',
+        'ai_insights',
+        ['embedding'],
+        postgresql_using='hnsw',
+        postgresql_with={'m': 24, 'ef_construction': 128},
+        postgresql_ops={'embedding': ops},
+    )
+
+
+def upgrade() -> None:
+    # halfvec требует pgvector >= 0.7.0 на сервере
+    op.drop_index('ix_ai_insights_embedding_hnsw', table_name='ai_insights')
+    op.execute("ALTER TABLE ai_insights ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536)")
+    _create_hnsw_index('halfvec_cosine_ops')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ai_insights_embedding_hnsw', table_name='ai_insights')
+    op.execute("ALTER TABLE ai_insights ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector(1536)")
+    _create_hnsw_index('vector_cosine_ops')
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel, Field, EmailStr, ConfigDict
+from pydantic import AwareDatetime, BaseModel, Field, EmailStr, ConfigDict, field_validator
 
 
 # ----- Tenant -----
@@ -13,11 +13,18 @@ class TenantRead(BaseModel):
     id: UUID
     name: str
     plan: str
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class TenantStatsRead(BaseModel):
+    tenant_id: UUID
+    sessions: int
+    insights: int
+    last_session: Optional[datetime]
+
+
 # ----- Authentication -----
 class AuthRegister(BaseModel):
     email: EmailStr
@@ -61,7 +68,7 @@ class UserRead(BaseModel):
     role: str
     locale: str
     is_verified: bool
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -78,7 +85,7 @@ class ClientRead(BaseModel):
     full_name: str
     birthday: Optional[datetime]
     tags: List[str]
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -95,7 +102,7 @@ class SessionRead(BaseModel):
     client_id: UUID
     scheduled_at: datetime
     duration_min: int
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -111,7 +118,7 @@ class NoteRead(BaseModel):
     session_id: Optional[UUID]
     author_id: UUID
     body_md: str
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -130,7 +137,7 @@ class MediaRead(BaseModel):
     type: str
     url: str
     transcription: Optional[dict]
-    created_at: datetime
+    created_at: AwareDatetime
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -148,7 +155,18 @@ class AIInsightRead(BaseModel):
     session_id: UUID
     kind: str
     content_json: dict
+    created_at: AwareDatetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AIInsightReadWithEmbedding(AIInsightRead):
+    """Инсайт вместе с эмбеддингом (1536 чисел): отдается только отдельным эндпоинтом"""
     embedding: Optional[List[float]]
-    created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True) 
+    @field_validator("embedding", mode="before")
+    @classmethod
+    def _embedding_to_list(cls, value):
+        # halfvec из pgvector приходит как HalfVector
+        return value.to_list() if hasattr(value, "to_list") else value
+
@@ -1,12 +1,21 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 from uuid import UUID
 from datetime import datetime
 
+# Поля, которые разрешено менять через update_* (общие для всех адаптеров)
+CLIENT_UPDATE_FIELDS = frozenset({"full_name", "birthday", "tags"})
+SESSION_UPDATE_FIELDS = frozenset({"client_id", "scheduled_at", "duration_min", "status"})
+NOTE_UPDATE_FIELDS = frozenset({"session_id", "body_md"})
+MEDIA_UPDATE_FIELDS = frozenset({"session_id", "type", "url", "transcription"})
+AI_INSIGHT_UPDATE_FIELDS = frozenset({"session_id", "kind", "content_json", "embedding"})
 
 class DatabaseInterface(ABC):
     """Абстрактный интерфейс для работы с базой данных"""
     
+    # Без __dict__ у экземпляров: адаптер создается на каждый запрос
+    __slots__ = ()
+    
     # Tenant operations
     @abstractmethod
     def get_tenant(self, tenant_id: UUID) -> Optional[Dict[str, Any]]:
@@ -29,10 +38,18 @@ class DatabaseInterface(ABC):
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def user_email_exists(self, email: str) -> bool:
+        pass
+    
     @abstractmethod
     def get_users(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def iter_users(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
@@ -45,10 +62,30 @@ class DatabaseInterface(ABC):
     def update_user_verification(self, user_id: UUID, is_verified: bool, verification_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def update_user_password_hash(self, user_id: UUID, password_hash: str) -> bool:
+        pass
+    
+    @abstractmethod
+    def get_user_with_tenant(self, user_id: UUID) -> Optional[Dict[str, Any]]:
+        pass
+    
+    @abstractmethod
+    def get_user_by_email_with_tenant(self, email: str) -> Optional[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def get_user_by_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def consume_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно подтверждает пользователя с этим (хешированным) токеном и стирает
+        токен. Из параллельных вызовов с одним токеном пользователя получает только один
+        """
+        pass
+    
     # Client operations
     @abstractmethod
     def get_client(self, client_id: UUID) -> Optional[Dict[str, Any]]:
@@ -58,10 +95,18 @@ class DatabaseInterface(ABC):
     def get_clients(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def iter_clients(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def create_client(self, client_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
     
+    @abstractmethod
+    def bulk_create_clients(self, clients_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def update_client(self, client_id: UUID, client_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
@@ -79,10 +124,18 @@ class DatabaseInterface(ABC):
     def get_sessions(self, client_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def iter_sessions(self, client_id: UUID) -> Iterator[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def create_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
     
+    @abstractmethod
+    def bulk_create_sessions(self, sessions_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def update_session(self, session_id: UUID, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
@@ -104,6 +157,10 @@ class DatabaseInterface(ABC):
     def create_note(self, note_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
     
+    @abstractmethod
+    def bulk_create_notes(self, notes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def update_note(self, note_id: UUID, note_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
@@ -125,6 +182,10 @@ class DatabaseInterface(ABC):
     def create_media(self, media_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
     
+    @abstractmethod
+    def bulk_create_media(self, media_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pass
+    
     @abstractmethod
     def update_media(self, media_id: UUID, media_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
@@ -146,6 +207,11 @@ class DatabaseInterface(ABC):
     def create_ai_insight(self, insight_data: Dict[str, Any]) -> Dict[str, Any]:
         pass
     
+    @abstractmethod
+    def bulk_create_ai_insights(self, insights_data: List[Dict[str, Any]]) -> List[UUID]:
+        """Пакетная вставка инсайтов; возвращает только id, без чтения эмбеддингов обратно"""
+        pass
+    
     @abstractmethod
     def update_ai_insight(self, insight_id: UUID, insight_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         pass
@@ -1,106 +1,205 @@
 import os
-import secrets
-from datetime import datetime, timedelta, timezone
+import base64
+import hmac
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from functools import lru_cache
 from typing import Optional
-from uuid import UUID
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from uuid import UUID, uuid4
+import orjson
+from cachetools import TLRUCache
 from sqlalchemy.orm import Session
 from app.infrastructure.database import models, crud
-from app.application import schemas
-from app.infrastructure.external.email_service import email_service
+from app.domain.services.password_hashing import pwd_context, get_password_hash, verify_password, verify_dummy_password
+from app.infrastructure.external.token_blacklist import token_blacklist
 
 # Настройки безопасности
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Настройки для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Инварианты для горячего пути выпуска/проверки токенов
+_SECRET_KEY_BYTES = SECRET_KEY.encode()
+_DEFAULT_EXPIRE_SECONDS = 15 * 60
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+# Заголовок JWT одинаков для всех токенов: сериализуем его один раз
+_JWT_HEADER_B64 = _b64url(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
 
 # Настройки для отправки email
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
 
+# Кэш проверенных JWT: запись живет до exp самого токена (часы — time.time, как у exp).
+# Отзыв токенов проверяется по черному списку на каждом запросе.
+def _token_expires_at(key: str, payload: dict, now: float) -> float:
+    return payload.get("exp", now)
+
+
+_token_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_token_expires_at, timer=time.time)
+_token_cache_lock = threading.Lock()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверяет пароль"""
-    return pwd_context.verify(plain_password, hashed_password)
+# Пул случайных байт для токенов подтверждения: один вызов os.urandom на 256 токенов
+VERIFICATION_TOKEN_BYTES = 32
+_ENTROPY_POOL_SIZE = VERIFICATION_TOKEN_BYTES * 256
+_entropy_pool = b""
+_entropy_offset = 0
+_entropy_lock = threading.Lock()
 
 
-def get_password_hash(password: str) -> str:
-    """Хеширует пароль"""
-    return pwd_context.hash(password)
+def _reset_entropy_pool() -> None:
+    """Сбрасывает пул, чтобы дочерний процесс после fork не выдал те же токены"""
+    global _entropy_pool, _entropy_offset
+    _entropy_pool = b""
+    _entropy_offset = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_entropy_pool)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Создает JWT токен"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    expire_seconds = int(expires_delta.total_seconds()) if expires_delta else _DEFAULT_EXPIRE_SECONDS
+    to_encode["exp"] = int(time.time()) + expire_seconds
+    to_encode["jti"] = uuid4().hex
+    # HS256 собирается вручную из готового заголовка, проверка - в _decode_hs256
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(orjson.dumps(to_encode))
+    signature = hmac.new(_SECRET_KEY_BYTES, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode()
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _decode_hs256(token: str) -> Optional[dict]:
+    """
+    Проверяет подпись HS256 и срок действия без JWT-библиотеки: одно HMAC-сравнение за
+    постоянное время и один orjson.loads
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = orjson.loads(_b64url_decode(header_b64))
+        if not isinstance(header, dict) or header.get("alg") != ALGORITHM:
+            return None
+        expected = hmac.new(_SECRET_KEY_BYTES, f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+            return None
+        payload = orjson.loads(_b64url_decode(payload_b64))
+    except (ValueError, TypeError):
+        # binascii.Error и orjson.JSONDecodeError — подклассы ValueError
+        return None
+    if not isinstance(payload, dict):
+        return None
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return None
+    return payload
+
+
+def _token_cache_key(token: str) -> str:
+    """Ключ кэша токена — только подпись, чтобы не дублировать payload в памяти"""
+    return token.rsplit(".", 1)[-1]
 
 
 def verify_token(token: str) -> Optional[dict]:
-    """Проверяет JWT токен"""
+    """Проверяет JWT токен (успешно проверенные токены кэшируются до истечения срока)"""
+    key = _token_cache_key(token)
+    with _token_cache_lock:
+        payload = _token_cache.get(key)
+    if payload is not None:
+        # Подпись уже проверена, достаточно перепроверить срок действия
+        if payload.get("exp", 0) <= time.time():
+            return None
+    else:
+        payload = _decode_hs256(token)
+        if payload is None:
+            return None
+        with _token_cache_lock:
+            _token_cache[key] = payload
+    
+    jti = payload.get("jti")
+    if jti and token_blacklist.is_blacklisted(jti):
+        return None
+    return payload
+
+
+@lru_cache(maxsize=10_000)
+def _parse_subject(sub: str) -> UUID:
+    return UUID(sub)
+
+
+def token_subject(payload: dict) -> Optional[UUID]:
+    """UUID пользователя из sub: разбор строки кэшируется, как и сам токен"""
+    sub = payload.get("sub")
+    if not isinstance(sub, str):
+        return None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError:
+        return _parse_subject(sub)
+    except ValueError:
         return None
 
 
+def revoke_token(token: str) -> None:
+    """Отзывает токен (при выходе пользователя) до истечения его срока действия"""
+    payload = verify_token(token)
+    with _token_cache_lock:
+        _token_cache.pop(_token_cache_key(token), None)
+    if payload and payload.get("jti"):
+        token_blacklist.blacklist(payload["jti"], int(payload["exp"] - time.time()))
+
+
 def generate_verification_token() -> str:
     """Генерирует токен для подтверждения email"""
-    return secrets.token_urlsafe(32)
+    global _entropy_pool, _entropy_offset
+    with _entropy_lock:
+        if _entropy_offset + VERIFICATION_TOKEN_BYTES > len(_entropy_pool):
+            _entropy_pool = os.urandom(_ENTROPY_POOL_SIZE)
+            _entropy_offset = 0
+        chunk = _entropy_pool[_entropy_offset:_entropy_offset + VERIFICATION_TOKEN_BYTES]
+        _entropy_offset += VERIFICATION_TOKEN_BYTES
+    return _b64url(chunk).decode()
+
+
+def hash_verification_token(token: str) -> str:
+    """HMAC-SHA256 токена подтверждения: в БД хранится только он, а не сам токен"""
+    return hmac.new(_SECRET_KEY_BYTES, token.encode(), hashlib.sha256).hexdigest()
+
+
+def verification_token_matches(token: str, token_hash: Optional[str]) -> bool:
+    """Сравнивает токен с сохраненным хешем за постоянное время"""
+    if not token_hash:
+        return False
+    return hmac.compare_digest(hash_verification_token(token), token_hash)
 
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
     """Аутентифицирует пользователя"""
     user = crud.get_user_by_email(db, email=email)
     if not user:
+        verify_dummy_password()
         return None
     if not verify_password(password, user.password_hash):
         return None
-    return user
-
-
-def register_user(db: Session, email: str, password: str, tenant_name: str, role: str, locale: str = "en") -> models.User:
-    """Регистрирует нового пользователя"""
-    # Создаем tenant
-    tenant = crud.create_tenant(db, schemas.TenantCreate(name=tenant_name))
-    
-    # Создаем пользователя
-    password_hash = get_password_hash(password)
-    verification_token = generate_verification_token()
-    
-    user = models.User(
-        email=email,
-        password_hash=password_hash,
-        tenant_id=tenant.id,
-        role=role,
-        locale=locale,
-        is_verified=False,
-        verification_token=verification_token
-    )
-    
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Отправляем email для подтверждения
-    email_service.send_verification_email(email, verification_token, tenant_name, BASE_URL)
-    
+    if pwd_context.needs_update(user.password_hash):
+        user.password_hash = get_password_hash(password)
+        db.commit()
     return user
 
 
 def verify_email(db: Session, token: str) -> Optional[models.User]:
     """Подтверждает email пользователя"""
-    user = db.query(models.User).filter(models.User.verification_token == token).first()
-    if not user:
+    # Строка блокируется до commit, поэтому параллельный запрос с тем же токеном
+    # ее пропустит и не подтвердит email повторно
+    user = crud.get_user_by_verification_token(db, hash_verification_token(token), for_update=True)
+    if not user or not verification_token_matches(token, user.verification_token):
         return None
     
     user.is_verified = True
@@ -0,0 +1,144 @@
+import asyncio
+import hmac
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from cachetools import TTLCache
+from passlib.context import CryptContext
+from app.config import settings
+
+# Единый контекст хеширования паролей для всего приложения: новые хеши — Argon2id
+# (по умолчанию параметры OWASP), старые bcrypt-хеши продолжают проверяться и
+# перехешируются при входе. Стоимость задается в settings, чтобы в тестах и при
+# сидинге можно было ее снизить.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=settings.argon2_memory_cost,
+    argon2__time_cost=settings.argon2_time_cost,
+    argon2__parallelism=settings.argon2_parallelism,
+    bcrypt__rounds=settings.bcrypt_rounds,
+)
+
+# Основная схема захватывается один раз: хеширование и проверка argon2-хешей идут
+# напрямую через настроенный обработчик, без разбора префикса в CryptContext.
+# Остальные (старые bcrypt) хеши проверяются через контекст.
+_argon2 = pwd_context.handler("argon2")
+_ARGON2_PREFIX = "$argon2"
+
+
+def _verify_hash(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password.startswith(_ARGON2_PREFIX):
+        return _argon2.verify(plain_password, hashed_password)
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+# Кэш успешных проверок паролей. Ключ — HMAC-SHA256(secret_key, plain:hashed),
+# поэтому дамп памяти процесса без секретного ключа не позволяет восстановить пароли.
+# Хеш пароля входит в ключ: после смены пароля старые записи просто перестают
+# совпадать, отдельная инвалидация не нужна. Неверные пароли не кэшируются: иначе
+# повторный неверный вход для существующего email отвечал бы быстрее, чем для
+# несуществующего (verify_dummy_password всегда платит полную цену Argon2).
+PASSWORD_CACHE_TTL_SECONDS = 300
+_password_cache: TTLCache = TTLCache(maxsize=1024, ttl=PASSWORD_CACHE_TTL_SECONDS, timer=time.monotonic)
+_password_cache_lock = threading.Lock()
+
+
+def _password_cache_key(plain_password: str, hashed_password: str) -> bytes:
+    """Ключ кэша проверки пароля"""
+    message = f"{plain_password}:{hashed_password}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).digest()
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет пароль (успешная проверка кэшируется на 5 минут)"""
+    key = _password_cache_key(plain_password, hashed_password)
+    with _password_cache_lock:
+        if key in _password_cache:
+            return True
+
+    result = _verify_hash(plain_password, hashed_password)
+    if result:
+        with _password_cache_lock:
+            _password_cache[key] = True
+    return result
+
+
+def get_password_hash(password: str) -> str:
+    """Хеширует пароль"""
+    return _argon2.hash(password)
+
+
+# Хеш-заглушка для входа с несуществующим email: проверка пароля выполняется всегда,
+# поэтому по времени ответа нельзя понять, зарегистрирован ли адрес
+_DUMMY_PASSWORD = "x" * 16
+_DUMMY_HASH = _argon2.hash(_DUMMY_PASSWORD)
+
+
+def verify_dummy_password() -> None:
+    """Тратит столько же времени, сколько проверка настоящего пароля (без кэша)"""
+    _argon2.verify(_DUMMY_PASSWORD, _DUMMY_HASH)
+
+
+# Пул процессов для хеширования: async-обработчики ждут результат, не занимая
+# поток event loop. Создается лениво при первом использовании (spawn — чтобы
+# дочерние процессы не наследовали состояние сервера после fork).
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    """Lazy initialization of password hashing process pool"""
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    """Останавливает пул процессов (при завершении приложения)"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=True, cancel_futures=True)
+            _hash_pool = None
+
+
+def _verify_in_worker(plain_password: str, hashed_password: str) -> bool:
+    return _verify_hash(plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Хеширует пароль в пуле процессов"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_pool(), get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет пароль в пуле процессов (кэш успешных проверок — в текущем процессе)"""
+    key = _password_cache_key(plain_password, hashed_password)
+    with _password_cache_lock:
+        if key in _password_cache:
+            return True
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_get_hash_pool(), _verify_in_worker, plain_password, hashed_password)
+    if result:
+        with _password_cache_lock:
+            _password_cache[key] = True
+    return result
+
+
+async def verify_dummy_password_async() -> None:
+    """Асинхронный вариант verify_dummy_password"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_get_hash_pool(), verify_dummy_password)
@@ -0,0 +1,152 @@
+"""
+Асинхронные операции чтения для FastAPI обработчиков.
+Синхронный crud остается для записи, миграций и скриптов.
+"""
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, raiseload
+from app.infrastructure.database import models
+
+# SQLSTATE undefined_table
+UNDEFINED_TABLE = "42P01"
+
+
+def _paginate(query, model, skip: int, limit: int, after_id: Optional[UUID]):
+    """
+    LIMIT/OFFSET или, если передан after_id, keyset-страница по id: WHERE id > :after_id
+    ORDER BY id идет по индексам (fk, id) и не перебирает пропущенные строки.
+    Ленивая загрузка связей в async невозможна, raiseload делает ошибку явной
+    """
+    query = query.options(raiseload("*"))
+    if after_id is not None:
+        return query.where(model.id > after_id).order_by(model.id).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+# Tenant read operations
+async def get_tenant(db: AsyncSession, tenant_id: UUID) -> Optional[models.Tenant]:
+    result = await db.execute(select(models.Tenant).where(models.Tenant.id == tenant_id))
+    return result.scalar_one_or_none()
+
+
+async def get_tenants(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.Tenant]:
+    result = await db.execute(_paginate(select(models.Tenant), models.Tenant, skip, limit, after_id))
+    return list(result.scalars().all())
+
+
+# User read operations
+async def get_user(db: AsyncSession, user_id: UUID) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    return result.scalar_one_or_none()
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalar_one_or_none()
+
+
+async def get_users(db: AsyncSession, tenant_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.User]:
+    result = await db.execute(
+        _paginate(select(models.User).where(models.User.tenant_id == tenant_id), models.User, skip, limit, after_id)
+    )
+    return list(result.scalars().all())
+
+
+# Client read operations
+async def get_client(db: AsyncSession, client_id: UUID) -> Optional[models.Client]:
+    result = await db.execute(select(models.Client).where(models.Client.id == client_id))
+    return result.scalar_one_or_none()
+
+
+async def get_clients(db: AsyncSession, tenant_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, tag: Optional[str] = None) -> List[models.Client]:
+    query = select(models.Client).where(models.Client.tenant_id == tenant_id)
+    if tag is not None:
+        # tags @> ARRAY[:tag] идет по GIN-индексу ix_clients_tags_gin
+        query = query.where(models.Client.tags.contains([tag]))
+    result = await db.execute(_paginate(query, models.Client, skip, limit, after_id))
+    return list(result.scalars().all())
+
+
+# Session read operations
+async def get_session(db: AsyncSession, session_id: UUID) -> Optional[models.Session]:
+    result = await db.execute(select(models.Session).where(models.Session.id == session_id))
+    return result.scalar_one_or_none()
+
+
+async def get_sessions(db: AsyncSession, client_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.Session]:
+    result = await db.execute(
+        _paginate(select(models.Session).where(models.Session.client_id == client_id), models.Session, skip, limit, after_id)
+    )
+    return list(result.scalars().all())
+
+
+# Note read operations
+async def get_note(db: AsyncSession, note_id: UUID) -> Optional[models.Note]:
+    result = await db.execute(select(models.Note).where(models.Note.id == note_id))
+    return result.scalar_one_or_none()
+
+
+async def get_notes(db: AsyncSession, session_id: Optional[UUID] = None, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.Note]:
+    query = select(models.Note)
+    if session_id:
+        query = query.where(models.Note.session_id == session_id)
+    result = await db.execute(_paginate(query, models.Note, skip, limit, after_id))
+    return list(result.scalars().all())
+
+
+# Media read operations
+async def get_media(db: AsyncSession, media_id: UUID) -> Optional[models.Media]:
+    result = await db.execute(select(models.Media).where(models.Media.id == media_id))
+    return result.scalar_one_or_none()
+
+
+async def get_media_by_session(db: AsyncSession, session_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.Media]:
+    result = await db.execute(
+        _paginate(select(models.Media).where(models.Media.session_id == session_id), models.Media, skip, limit, after_id)
+    )
+    return list(result.scalars().all())
+
+
+# AI Insight read operations
+def _select_ai_insights(with_embedding: bool = False):
+    """
+    SELECT по инсайтам без колонки embedding, если она не нужна: PostgreSQL не читает
+    и не распаковывает ее из TOAST, а случайное обращение к атрибуту поднимает ошибку
+    """
+    query = select(models.AIInsight)
+    if not with_embedding:
+        query = query.options(defer(models.AIInsight.embedding, raiseload=True))
+    return query
+
+
+async def get_ai_insight(db: AsyncSession, insight_id: UUID, with_embedding: bool = False) -> Optional[models.AIInsight]:
+    result = await db.execute(_select_ai_insights(with_embedding).where(models.AIInsight.id == insight_id))
+    return result.scalar_one_or_none()
+
+
+async def get_ai_insights_by_session(db: AsyncSession, session_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None) -> List[models.AIInsight]:
+    result = await db.execute(
+        _paginate(_select_ai_insights().where(models.AIInsight.session_id == session_id), models.AIInsight, skip, limit, after_id)
+    )
+    return list(result.scalars().all())
+
+
+# Tenant stats (материализованное представление)
+async def get_tenant_stats(db: AsyncSession, tenant_id: UUID) -> Optional[dict]:
+    """
+    Строка tenant_stats или None, если ее нет: tenant создан после последнего
+    REFRESH или представления нет вовсе (схема из create_all, без alembic)
+    """
+    try:
+        result = await db.execute(select(models.tenant_stats).where(models.tenant_stats.c.tenant_id == tenant_id))
+    except ProgrammingError as exc:
+        if getattr(exc.orig, "pgcode", None) != UNDEFINED_TABLE:
+            raise
+        # Ошибка прерывает транзакцию; откатываем, чтобы сессией можно было пользоваться дальше
+        await db.rollback()
+        return None
+    row = result.mappings().first()
+    return dict(row) if row is not None else None
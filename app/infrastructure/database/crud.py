@@ -1,214 +1,228 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload, raiseload
+from sqlalchemy import and_, insert, update, delete, select, bindparam, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
 from uuid import UUID
 from app.infrastructure.database import models
 from app.application import schemas
-from passlib.context import CryptContext
+from app.domain.services.password_hashing import get_password_hash
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Заранее построенные запросы для самых частых чтений: выражение собирается один раз
+# при импорте, а скомпилированный SQL переиспользуется из кэша SQLAlchemy
+_GET_USER_BY_EMAIL = select(models.User).where(models.User.email == bindparam("email"))
+_GET_USER_BY_VERIFICATION_TOKEN = select(models.User).where(models.User.verification_token == bindparam("token"))
+_GET_USER_BY_VERIFICATION_TOKEN_FOR_UPDATE = _GET_USER_BY_VERIFICATION_TOKEN.with_for_update(skip_locked=True)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
 
+# SQLSTATE нарушения внешнего ключа в Postgres
+FOREIGN_KEY_VIOLATION = "23503"
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+def _insert_returning(db: Session, model, values: dict):
+    """INSERT ... RETURNING: строка с серверными значениями за один запрос, без refresh"""
+    try:
+        db_obj = db.execute(insert(model).values(**values).returning(model)).scalar_one()
+    except IntegrityError:
+        db.rollback()
+        raise
+    db.commit()
+    return db_obj
+
+
+def missing_reference(model, exc: IntegrityError) -> Optional[str]:
+    """
+    Колонка внешнего ключа, для которой не нашлось строки (tenant_id, session_id, ...).
+    None, если IntegrityError вызван не нарушением FK
+    """
+    orig = exc.orig
+    if getattr(orig, "pgcode", None) != FOREIGN_KEY_VIOLATION:
+        return None
+    # Имена ограничений по умолчанию: <таблица>_<колонка>_fkey
+    constraint = getattr(getattr(orig, "diag", None), "constraint_name", None) or ""
+    prefix = f"{model.__tablename__}_"
+    if constraint.startswith(prefix) and constraint.endswith("_fkey"):
+        return constraint[len(prefix):-len("_fkey")]
+    return ""
+
+
+def _update_returning(db: Session, model, obj_id: UUID, values: dict):
+    """UPDATE ... WHERE id = ? RETURNING: обновление и чтение строки за один запрос"""
+    if not values:
+        return db.get(model, obj_id)
+    stmt = update(model).where(model.id == obj_id).values(**values).returning(model)
+    # populate_existing: объект из identity map получает значения из RETURNING
+    stmt = select(model).from_statement(stmt).execution_options(populate_existing=True)
+    db_obj = db.execute(stmt).scalar_one_or_none()
+    db.commit()
+    return db_obj
+
+
+def _delete_by_id(db: Session, model, obj_id: UUID) -> bool:
+    """DELETE ... WHERE id = ? без предварительного SELECT"""
+    result = db.execute(delete(model).where(model.id == obj_id))
+    db.commit()
+    return result.rowcount > 0
+
+
+def _with_relations(query, model, load_relations: Tuple[str, ...]):
+    """
+    Подгружает связи одним SELECT ... IN (...) на связь вместо запроса на каждую строку.
+    Остальные связи в списках не грузятся лениво: обращение к ним поднимает ошибку
+    """
+    options = [selectinload(getattr(model, name)) for name in load_relations]
+    return query.options(*options, raiseload("*"))
 
 
 # Tenant CRUD operations
 def get_tenant(db: Session, tenant_id: UUID) -> Optional[models.Tenant]:
-    return db.query(models.Tenant).filter(models.Tenant.id == tenant_id).first()
+    return db.get(models.Tenant, tenant_id)
 
 
-def get_tenants(db: Session, skip: int = 0, limit: int = 100) -> List[models.Tenant]:
-    return db.query(models.Tenant).offset(skip).limit(limit).all()
+def get_tenants(db: Session, skip: int = 0, limit: int = 100, load_relations: Tuple[str, ...] = ()) -> List[models.Tenant]:
+    query = _with_relations(db.query(models.Tenant), models.Tenant, load_relations)
+    return query.offset(skip).limit(limit).all()
 
 
 def create_tenant(db: Session, tenant: schemas.TenantCreate) -> models.Tenant:
-    db_tenant = models.Tenant(**tenant.dict())
-    db.add(db_tenant)
-    db.commit()
-    db.refresh(db_tenant)
-    return db_tenant
+    return _insert_returning(db, models.Tenant, tenant.dict())
 
 
 # User CRUD operations
 def get_user(db: Session, user_id: UUID) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return db.get(models.User, user_id)
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.execute(_GET_USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
+
+
+def get_user_by_verification_token(db: Session, token: str, for_update: bool = False) -> Optional[models.User]:
+    """Ищет пользователя по токену подтверждения (for_update блокирует строку до commit)"""
+    stmt = _GET_USER_BY_VERIFICATION_TOKEN_FOR_UPDATE if for_update else _GET_USER_BY_VERIFICATION_TOKEN
+    return db.execute(stmt, {"token": token}).scalar_one_or_none()
 
 
-def get_users(db: Session, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[models.User]:
-    return db.query(models.User).filter(models.User.tenant_id == tenant_id).offset(skip).limit(limit).all()
+def get_users(db: Session, tenant_id: UUID, skip: int = 0, limit: int = 100, load_relations: Tuple[str, ...] = ()) -> List[models.User]:
+    query = _with_relations(db.query(models.User), models.User, load_relations)
+    return query.filter(models.User.tenant_id == tenant_id).offset(skip).limit(limit).all()
 
 
 def create_user(db: Session, user: schemas.UserCreate, tenant_id: UUID) -> models.User:
-    db_user = models.User(**user.dict(), tenant_id=tenant_id)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return _insert_returning(db, models.User, {**user.dict(), "tenant_id": tenant_id})
 
 
-def create_user_with_password(db: Session, user: schemas.UserCreate, tenant_id: UUID, password: str) -> models.User:
-    """Создает пользователя с хешированным паролем"""
+def create_user_with_password(db: Session, user: schemas.UserCreate, tenant_id: UUID, password: str) -> Optional[models.User]:
+    """
+    Создает пользователя с хешированным паролем одним запросом:
+    None, если email уже занят; IntegrityError, если tenant не существует
+    """
     password_hash = get_password_hash(password)
-    db_user = models.User(
-        **user.dict(),
-        tenant_id=tenant_id,
-        password_hash=password_hash,
-        is_verified=True  # Администратор создает пользователя как подтвержденного
+    stmt = (
+        postgresql.insert(models.User)
+        .values(
+            **user.dict(),
+            tenant_id=tenant_id,
+            password_hash=password_hash,
+            is_verified=True,  # Администратор создает пользователя как подтвержденного
+        )
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(models.User)
     )
-    db.add(db_user)
+    try:
+        db_user = db.execute(stmt).scalar_one_or_none()
+    except IntegrityError:
+        db.rollback()
+        raise
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
 def delete_user(db: Session, user_id: int) -> bool:
-    db_user = get_user(db, user_id)
-    if not db_user:
-        return False
-    
-    db.delete(db_user)
-    db.commit()
-    return True
+    return _delete_by_id(db, models.User, user_id)
 
 
 # Client CRUD operations
 def get_client(db: Session, client_id: UUID) -> Optional[models.Client]:
-    return db.query(models.Client).filter(models.Client.id == client_id).first()
+    return db.get(models.Client, client_id)
 
 
-def get_clients(db: Session, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[models.Client]:
-    return db.query(models.Client).filter(models.Client.tenant_id == tenant_id).offset(skip).limit(limit).all()
+def get_clients(db: Session, tenant_id: UUID, skip: int = 0, limit: int = 100, load_relations: Tuple[str, ...] = ()) -> List[models.Client]:
+    query = _with_relations(db.query(models.Client), models.Client, load_relations)
+    return query.filter(models.Client.tenant_id == tenant_id).offset(skip).limit(limit).all()
 
 
 def create_client(db: Session, client: schemas.ClientCreate, tenant_id: UUID) -> models.Client:
-    db_client = models.Client(**client.dict(), tenant_id=tenant_id)
-    db.add(db_client)
+    return _insert_returning(db, models.Client, {**client.dict(), "tenant_id": tenant_id})
+
+
+def bulk_create_clients(db: Session, clients: List[dict]) -> List[models.Client]:
+    """Пакетная вставка клиентов: один INSERT ... VALUES (...), (...) RETURNING вместо N запросов"""
+    if not clients:
+        return []
+    db_clients = db.execute(insert(models.Client).returning(models.Client), clients).scalars().all()
     db.commit()
-    db.refresh(db_client)
-    return db_client
+    return list(db_clients)
 
 
 def update_client(db: Session, client_id: UUID, client_update: schemas.ClientCreate) -> Optional[models.Client]:
-    db_client = get_client(db, client_id)
-    if not db_client:
-        return None
-    
-    update_data = client_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_client, field, value)
-    
-    db.commit()
-    db.refresh(db_client)
-    return db_client
+    return _update_returning(db, models.Client, client_id, client_update.dict(exclude_unset=True))
 
 
 def delete_client(db: Session, client_id: UUID) -> bool:
-    db_client = get_client(db, client_id)
-    if not db_client:
-        return False
-    
-    db.delete(db_client)
-    db.commit()
-    return True
+    return _delete_by_id(db, models.Client, client_id)
 
 
 # Session CRUD operations
 def get_session(db: Session, session_id: UUID) -> Optional[models.Session]:
-    return db.query(models.Session).filter(models.Session.id == session_id).first()
+    return db.get(models.Session, session_id)
 
 
-def get_sessions(db: Session, client_id: UUID, skip: int = 0, limit: int = 100) -> List[models.Session]:
-    return db.query(models.Session).filter(models.Session.client_id == client_id).offset(skip).limit(limit).all()
+def get_sessions(db: Session, client_id: UUID, skip: int = 0, limit: int = 100, load_relations: Tuple[str, ...] = ()) -> List[models.Session]:
+    query = _with_relations(db.query(models.Session), models.Session, load_relations)
+    return query.filter(models.Session.client_id == client_id).offset(skip).limit(limit).all()
 
 
 def create_session(db: Session, session: schemas.SessionCreate) -> models.Session:
-    db_session = models.Session(**session.dict())
-    db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
-    return db_session
+    return _insert_returning(db, models.Session, session.dict())
 
 
 def update_session(db: Session, session_id: UUID, session_update: schemas.SessionCreate) -> Optional[models.Session]:
-    db_session = get_session(db, session_id)
-    if not db_session:
-        return None
-    
-    update_data = session_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_session, field, value)
-    
-    db.commit()
-    db.refresh(db_session)
-    return db_session
+    return _update_returning(db, models.Session, session_id, session_update.dict(exclude_unset=True))
 
 
 def delete_session(db: Session, session_id: UUID) -> bool:
-    db_session = get_session(db, session_id)
-    if not db_session:
-        return False
-    
-    db.delete(db_session)
-    db.commit()
-    return True
+    return _delete_by_id(db, models.Session, session_id)
 
 
 # Note CRUD operations
 def get_note(db: Session, note_id: UUID) -> Optional[models.Note]:
-    return db.query(models.Note).filter(models.Note.id == note_id).first()
+    return db.get(models.Note, note_id)
 
 
-def get_notes(db: Session, session_id: Optional[UUID] = None, skip: int = 0, limit: int = 100) -> List[models.Note]:
-    query = db.query(models.Note)
+def get_notes(db: Session, session_id: Optional[UUID] = None, skip: int = 0, limit: int = 100, load_relations: Tuple[str, ...] = ()) -> List[models.Note]:
+    query = _with_relations(db.query(models.Note), models.Note, load_relations)
     if session_id:
         query = query.filter(models.Note.session_id == session_id)
     return query.offset(skip).limit(limit).all()
 
 
 def create_note(db: Session, note: schemas.NoteCreate, author_id: UUID) -> models.Note:
-    db_note = models.Note(**note.dict(), author_id=author_id)
-    db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
-    return db_note
+    return _insert_returning(db, models.Note, {**note.dict(), "author_id": author_id})
 
 
 def update_note(db: Session, note_id: UUID, note_update: schemas.NoteCreate) -> Optional[models.Note]:
-    db_note = get_note(db, note_id)
-    if not db_note:
-        return None
-    
-    update_data = note_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_note, field, value)
-    
-    db.commit()
-    db.refresh(db_note)
-    return db_note
+    return _update_returning(db, models.Note, note_id, note_update.dict(exclude_unset=True))
 
 
 def delete_note(db: Session, note_id: UUID) -> bool:
-    db_note = get_note(db, note_id)
-    if not db_note:
-        return False
-    
-    db.delete(db_note)
-    db.commit()
-    return True
+    return _delete_by_id(db, models.Note, note_id)
 
 
 # Media CRUD operations
 def get_media(db: Session, media_id: UUID) -> Optional[models.Media]:
-    return db.query(models.Media).filter(models.Media.id == media_id).first()
+    return db.get(models.Media, media_id)
 
 
 def get_media_by_session(db: Session, session_id: UUID, skip: int = 0, limit: int = 100) -> List[models.Media]:
@@ -216,40 +230,20 @@ def get_media_by_session(db: Session, session_id: UUID, skip: int = 0, limit: in
 
 
 def create_media(db: Session, media: schemas.MediaCreate) -> models.Media:
-    db_media = models.Media(**media.dict())
-    db.add(db_media)
-    db.commit()
-    db.refresh(db_media)
-    return db_media
+    return _insert_returning(db, models.Media, media.dict())
 
 
 def update_media(db: Session, media_id: UUID, media_update: schemas.MediaCreate) -> Optional[models.Media]:
-    db_media = get_media(db, media_id)
-    if not db_media:
-        return None
-    
-    update_data = media_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_media, field, value)
-    
-    db.commit()
-    db.refresh(db_media)
-    return db_media
+    return _update_returning(db, models.Media, media_id, media_update.dict(exclude_unset=True))
 
 
 def delete_media(db: Session, media_id: UUID) -> bool:
-    db_media = get_media(db, media_id)
-    if not db_media:
-        return False
-    
-    db.delete(db_media)
-    db.commit()
-    return True
+    return _delete_by_id(db, models.Media, media_id)
 
 
 # AIInsight CRUD operations
 def get_ai_insight(db: Session, insight_id: UUID) -> Optional[models.AIInsight]:
-    return db.query(models.AIInsight).filter(models.AIInsight.id == insight_id).first()
+    return db.get(models.AIInsight, insight_id)
 
 
 def get_ai_insights_by_session(db: Session, session_id: UUID, skip: int = 0, limit: int = 100) -> List[models.AIInsight]:
@@ -257,32 +251,31 @@ def get_ai_insights_by_session(db: Session, session_id: UUID, skip: int = 0, lim
 
 
 def create_ai_insight(db: Session, insight: schemas.AIInsightCreate) -> models.AIInsight:
-    db_insight = models.AIInsight(**insight.dict())
-    db.add(db_insight)
+    return _insert_returning(db, models.AIInsight, insight.dict())
+
+
+def bulk_create_ai_insights(db: Session, insights: List[dict], chunk_size: int = 500) -> List[UUID]:
+    """
+    Пакетная вставка инсайтов пачками по chunk_size строк. Возвращаются только id:
+    эмбеддинги (1536 значений на строку) не читаются обратно
+    """
+    stmt = insert(models.AIInsight).returning(models.AIInsight.id)
+    ids: List[UUID] = []
+    for start in range(0, len(insights), chunk_size):
+        ids.extend(db.execute(stmt, insights[start:start + chunk_size]).scalars().all())
     db.commit()
-    db.refresh(db_insight)
-    return db_insight
+    return ids
 
 
 def update_ai_insight(db: Session, insight_id: UUID, insight_update: schemas.AIInsightCreate) -> Optional[models.AIInsight]:
-    db_insight = get_ai_insight(db, insight_id)
-    if not db_insight:
-        return None
-    
-    update_data = insight_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_insight, field, value)
-    
-    db.commit()
-    db.refresh(db_insight)
-    return db_insight
+    return _update_returning(db, models.AIInsight, insight_id, insight_update.dict(exclude_unset=True))
 
 
 def delete_ai_insight(db: Session, insight_id: UUID) -> bool:
-    db_insight = get_ai_insight(db, insight_id)
-    if not db_insight:
-        return False
-    
-    db.delete(db_insight)
+    return _delete_by_id(db, models.AIInsight, insight_id)
+
+
+def refresh_tenant_stats(db: Session) -> None:
+    """Пересчитывает tenant_stats, не блокируя чтение представления"""
+    db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY tenant_stats"))
     db.commit()
-    return True 
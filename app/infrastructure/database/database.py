@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from typing import AsyncGenerator
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from app.config import settings
 
@@ -8,19 +11,82 @@ Base = declarative_base()
 # Create SQLAlchemy engine (lazy initialization)
 _engine = None
 _SessionLocal = None
+_async_engine = None
+_AsyncSessionLocal = None
+
+def _vector_search_settings() -> dict:
+    """Параметры поиска pgvector, которые сервер применяет при открытии соединения"""
+    return {
+        "hnsw.ef_search": str(settings.hnsw_ef_search),
+        "ivfflat.probes": str(settings.ivfflat_probes),
+    }
+
+
+def _startup_connect_args() -> dict:
+    """
+    Параметры pgvector в стартовом пакете соединения (psycopg2: options -c).
+    PgBouncer такие параметры не пропускает, поэтому за ним они задаются иначе
+    (см. _set_vector_search_per_transaction)
+    """
+    if settings.db_use_pgbouncer:
+        return {}
+    return {"options": " ".join(f"-c {name}={value}" for name, value in _vector_search_settings().items())}
+
+
+def _set_vector_search_per_transaction(sync_engine) -> None:
+    """
+    За транзакционным PgBouncer сессионные настройки не переживают транзакцию,
+    поэтому параметры поиска задаются в начале каждой транзакции (аналог SET LOCAL).
+    Это лишний запрос на транзакцию; вместо него можно один раз выполнить
+    ALTER ROLE <роль> SET hnsw.ef_search = ...; ALTER ROLE <роль> SET ivfflat.probes = ...
+    """
+    assignments = ", ".join(
+        f"set_config('{name}', '{value}', true)" for name, value in _vector_search_settings().items()
+    )
+    statement = f"SELECT {assignments}"
+
+    @event.listens_for(sync_engine, "begin")
+    def _apply_vector_search(connection):
+        connection.exec_driver_sql(statement)
+
+
+def _pool_options() -> dict:
+    """
+    Параметры пула соединений. За PgBouncer (transaction pooling) пул на стороне
+    приложения отключается: мультиплексированием соединений занимается PgBouncer
+    """
+    if settings.db_use_pgbouncer:
+        return {"poolclass": NullPool}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_use_lifo": settings.db_pool_use_lifo,
+    }
+
 
 def get_engine():
     """Lazy initialization of SQLAlchemy engine"""
     global _engine
     if _engine is None:
-        _engine = create_engine(settings.database_url)
+        _engine = create_engine(
+            settings.database_url,
+            **_pool_options(),
+            connect_args=_startup_connect_args(),
+        )
+        if settings.db_use_pgbouncer:
+            _set_vector_search_per_transaction(_engine)
     return _engine
 
 def get_session_local():
     """Lazy initialization of SessionLocal"""
     global _SessionLocal
     if _SessionLocal is None:
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+        # expire_on_commit=False: объекты, полученные через RETURNING, остаются
+        # заполненными после commit и не перечитываются отдельным SELECT
+        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=get_engine())
     return _SessionLocal
 
 # Dependency to get database session
@@ -30,4 +96,48 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
+        db.close()
+
+
+def get_async_database_url() -> str:
+    """URL базы данных с асинхронным драйвером asyncpg"""
+    url = settings.database_url
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+def get_async_engine():
+    """Lazy initialization of async SQLAlchemy engine"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            get_async_database_url(),
+            **_pool_options(),
+            # За PgBouncer ни server_settings (он отвергает лишние стартовые параметры),
+            # ни кэша prepared statements (они не переживают транзакцию)
+            connect_args=(
+                {"statement_cache_size": 0}
+                if settings.db_use_pgbouncer
+                else {"server_settings": _vector_search_settings()}
+            ),
+            echo=False,
+        )
+        if settings.db_use_pgbouncer:
+            _set_vector_search_per_transaction(_async_engine.sync_engine)
+    return _async_engine
+
+def get_async_session_local():
+    """Lazy initialization of AsyncSessionLocal"""
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _AsyncSessionLocal
+
+# Dependency to get async database session
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    AsyncSessionLocal = get_async_session_local()
+    async with AsyncSessionLocal() as db:
+        yield db
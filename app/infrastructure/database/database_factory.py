@@ -1,10 +1,31 @@
 import os
-from typing import Optional
+from typing import Callable, Dict, Optional
 from app.domain.repositories.database_interface import DatabaseInterface
 from app.infrastructure.database.mock_database import MockDatabase
 from app.infrastructure.database.real_database import RealDatabase
 from sqlalchemy.orm import Session
 
+# Тип БД и признак тестового окружения определяются один раз при импорте
+_DATABASE_TYPE = os.getenv("DATABASE_TYPE", "real").lower()
+_IS_TEST = os.getenv("TESTING", "false").lower() == "true" or _DATABASE_TYPE == "mock"
+
+
+def _create_real_database(db_session: Optional[Session]) -> DatabaseInterface:
+    if db_session is None:
+        raise ValueError("db_session is required for real database")
+    return RealDatabase(db_session)
+
+
+_FACTORIES: Dict[str, Callable[[Optional[Session]], DatabaseInterface]] = {
+    "mock": lambda db_session: MockDatabase(),
+    "real": _create_real_database,
+}
+
+if _DATABASE_TYPE not in _FACTORIES:
+    raise ValueError(f"Unknown database type: {_DATABASE_TYPE}")
+
+_create = _FACTORIES[_DATABASE_TYPE]
+
 
 class DatabaseFactory:
     """Фабрика для создания экземпляров базы данных"""
@@ -20,20 +41,9 @@ class DatabaseFactory:
         Returns:
             Экземпляр DatabaseInterface
         """
-        # Проверяем переменную окружения для выбора типа БД
-        database_type = os.getenv("DATABASE_TYPE", "real").lower()
-        
-        if database_type == "mock":
-            return MockDatabase()
-        elif database_type == "real":
-            if db_session is None:
-                raise ValueError("db_session is required for real database")
-            return RealDatabase(db_session)
-        else:
-            raise ValueError(f"Unknown database type: {database_type}")
+        return _create(db_session)
     
     @staticmethod
     def is_test_environment() -> bool:
         """Проверяет, находимся ли мы в тестовом окружении"""
-        return os.getenv("TESTING", "false").lower() == "true" or \
-               os.getenv("DATABASE_TYPE", "real").lower() == "mock" 
+        return _IS_TEST
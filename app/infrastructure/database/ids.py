@@ -0,0 +1,20 @@
+"""
+Генерация первичных ключей.
+UUIDv7 (RFC 9562) начинается с 48-битной метки времени в миллисекундах, поэтому новые
+ключи попадают в конец btree-индекса, а не в случайные страницы, как uuid4.
+"""
+import os
+import time
+from uuid import UUID
+
+
+def uuid7() -> UUID:
+    """UUID версии 7: unix_ts_ms (48 бит) | ver | rand_a (12 бит) | var | rand_b (62 бита)"""
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= ((rand >> 62) & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+    return UUID(int=value)
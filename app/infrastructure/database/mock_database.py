@@ -1,22 +1,147 @@
-from typing import List, Optional, Dict, Any
-from uuid import UUID, uuid4
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+import threading
+from itertools import islice
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from uuid import UUID
+from app.infrastructure.database.ids import uuid7
+from sortedcontainers import SortedDict
 from datetime import datetime, timezone
-from app.domain.repositories.database_interface import DatabaseInterface
+from app.domain.repositories.database_interface import (
+    DatabaseInterface,
+    CLIENT_UPDATE_FIELDS,
+    SESSION_UPDATE_FIELDS,
+    NOTE_UPDATE_FIELDS,
+    MEDIA_UPDATE_FIELDS,
+    AI_INSIGHT_UPDATE_FIELDS,
+)
+
+
+# Строки мок-базы: слотовые dataclass-ы вместо словарей (меньше памяти, быстрый доступ к полям).
+# Наружу по-прежнему отдаются словари — снимки строки
+@dataclass(slots=True)
+class TenantRow:
+    id: UUID
+    name: str
+    plan: str
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class UserRow:
+    id: UUID
+    email: str
+    role: str
+    locale: str
+    tenant_id: UUID
+    password_hash: str
+    is_verified: bool
+    verification_token: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class ClientRow:
+    id: UUID
+    full_name: str
+    birthday: Optional[datetime]
+    tags: List[str]
+    tenant_id: UUID
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class SessionRow:
+    id: UUID
+    client_id: UUID
+    scheduled_at: datetime
+    duration_min: Optional[int]
+    status: str
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class NoteRow:
+    id: UUID
+    session_id: Optional[UUID]
+    author_id: UUID
+    body_md: str
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class MediaRow:
+    id: UUID
+    session_id: UUID
+    type: str
+    url: str
+    transcription: Optional[Any]
+    created_at: datetime
+    updated_at: datetime
+
+
+@dataclass(slots=True)
+class AIInsightRow:
+    id: UUID
+    session_id: UUID
+    kind: str
+    content_json: Any
+    embedding: Optional[Any]
+    created_at: datetime
+    updated_at: datetime
+
+
+_utc_now = datetime.now
+_UTC = timezone.utc
+
+
+def _row_to_dict(row) -> Optional[Dict[str, Any]]:
+    """Снимок строки в виде словаря (порядок ключей — порядок полей)"""
+    if row is None:
+        return None
+    return {name: getattr(row, name) for name in row.__slots__}
 
 
 class MockDatabase(DatabaseInterface):
     """Мок-реализация базы данных для тестирования"""
     
     def __init__(self):
-        self.tenants: Dict[UUID, Dict[str, Any]] = {}
-        self.users: Dict[UUID, Dict[str, Any]] = {}
-        self.clients: Dict[UUID, Dict[str, Any]] = {}
-        self.sessions: Dict[UUID, Dict[str, Any]] = {}
-        self.notes: Dict[UUID, Dict[str, Any]] = {}
-        self.media: Dict[UUID, Dict[str, Any]] = {}
-        self.ai_insights: Dict[UUID, Dict[str, Any]] = {}
-        self.email_to_user: Dict[str, UUID] = {}
-        self.verification_tokens: Dict[str, UUID] = {}
+        # Защищает операции "проверить и изменить", которые в PostgreSQL атомарны
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        """Создает пустые хранилища (старые целиком отдаются сборщику мусора)"""
+        self.tenants: Dict[UUID, TenantRow] = {}
+        self.users: Dict[UUID, UserRow] = {}
+        self.clients: Dict[UUID, ClientRow] = {}
+        self.sessions: Dict[UUID, SessionRow] = {}
+        self.notes: Dict[UUID, NoteRow] = {}
+        self.media: Dict[UUID, MediaRow] = {}
+        self.ai_insights: Dict[UUID, AIInsightRow] = {}
+        # Строковые индексы пользователей: ("email", email) / ("token", token) -> id
+        self.string_index: Dict[Tuple[str, str], UUID] = {}
+        
+        # Вторичные индексы по внешним ключам: внешний ключ -> {id: None}
+        # (dict как упорядоченное множество: порядок вставки и удаление за O(1))
+        self.users_by_tenant: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        self.clients_by_tenant: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        self.sessions_by_client: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        self.notes_by_session: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        self.media_by_session: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        self.insights_by_session: Dict[UUID, Dict[UUID, None]] = defaultdict(dict)
+        
+        # Клиенты tenant-а, отсортированные по (created_at, id), для курсорной пагинации
+        self.clients_by_tenant_created: Dict[UUID, SortedDict] = defaultdict(SortedDict)
+        
+        # Зафиксированное время на время пакетной вставки (см. bulk_clock)
+        self._clock_override: Optional[datetime] = None
     
     def _convert_to_dict(self, obj: Any) -> Dict[str, Any]:
         """Конвертирует объект в словарь"""
@@ -27,115 +152,197 @@ class MockDatabase(DatabaseInterface):
         else:
             return str(obj)
     
-    def _add_timestamps(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Добавляет временные метки"""
-        now = datetime.now(timezone.utc)
-        data['created_at'] = now
-        data['updated_at'] = now
-        return data
+    def _now(self) -> datetime:
+        """Текущее время для временных меток"""
+        if self._clock_override is not None:
+            return self._clock_override
+        return _utc_now(_UTC)
+    
+    @contextmanager
+    def bulk_clock(self):
+        """Одна временная метка на всю пачку create_*/update_* внутри блока"""
+        previous = self._clock_override
+        self._clock_override = _utc_now(_UTC)
+        try:
+            yield
+        finally:
+            self._clock_override = previous
+    
+    def _index_remove(self, index: Dict[UUID, Dict[UUID, None]], key: Optional[UUID], row_id: UUID):
+        """Удаляет id из вторичного индекса"""
+        ids = index.get(key)
+        if ids is not None:
+            ids.pop(row_id, None)
+            if not ids:
+                del index[key]
+    
+    def _index_move(self, index: Dict[UUID, Dict[UUID, None]], old_key: Optional[UUID], new_key: Optional[UUID], row_id: UUID):
+        """Переносит id в индексе при смене внешнего ключа"""
+        if old_key == new_key:
+            return
+        self._index_remove(index, old_key, row_id)
+        if new_key is not None:
+            index[new_key][row_id] = None
+    
+    def _page(self, rows: Dict[UUID, Any], index: Dict[UUID, Dict[UUID, None]], key: UUID, skip: int, limit: int) -> List[Dict[str, Any]]:
+        """Страница строк по вторичному индексу"""
+        ids = index.get(key)
+        if not ids:
+            return []
+        return [_row_to_dict(rows[row_id]) for row_id in islice(ids, skip, skip + limit)]
     
     # Tenant operations
     def get_tenant(self, tenant_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.tenants.get(tenant_id)
+        return _row_to_dict(self.tenants.get(tenant_id))
     
     def get_tenants(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        tenants_list = list(self.tenants.values())
-        return tenants_list[skip:skip + limit]
+        return [_row_to_dict(row) for row in islice(self.tenants.values(), skip, skip + limit)]
     
     def create_tenant(self, tenant_data: Dict[str, Any]) -> Dict[str, Any]:
-        tenant_id = uuid4()
-        tenant = {
-            'id': tenant_id,
-            'name': tenant_data['name'],
-            'plan': tenant_data.get('plan', 'free')
-        }
-        tenant = self._add_timestamps(tenant)
+        tenant_id = uuid7()
+        now = self._now()
+        tenant = TenantRow(
+            id=tenant_id,
+            name=tenant_data['name'],
+            plan=tenant_data.get('plan', 'free'),
+            created_at=now,
+            updated_at=now,
+        )
         self.tenants[tenant_id] = tenant
-        return tenant
+        return _row_to_dict(tenant)
     
     # User operations
     def get_user(self, user_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.users.get(user_id)
+        return _row_to_dict(self.users.get(user_id))
     
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        user_id = self.email_to_user.get(email)
-        if user_id:
-            return self.users.get(user_id)
-        return None
+        return _row_to_dict(self.users.get(self.string_index.get(("email", email))))
+    
+    def user_email_exists(self, email: str) -> bool:
+        return ("email", email) in self.string_index
     
     def get_users(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        users_list = [user for user in self.users.values() if user['tenant_id'] == tenant_id]
-        return users_list[skip:skip + limit]
+        return self._page(self.users, self.users_by_tenant, tenant_id, skip, limit)
+    
+    def iter_users(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        for row_id in list(self.users_by_tenant.get(tenant_id, ())):
+            yield _row_to_dict(self.users[row_id])
+    
+    def _build_user(self, user_data: Dict[str, Any], password_hash: Optional[str] = None, is_verified: Optional[bool] = None) -> Dict[str, Any]:
+        """Создает и индексирует пользователя за один проход, не изменяя user_data"""
+        user_id = uuid7()
+        now = self._now()
+        user = UserRow(
+            id=user_id,
+            email=user_data['email'],
+            role=user_data['role'],
+            locale=user_data.get('locale', 'en'),
+            tenant_id=user_data['tenant_id'],
+            password_hash=password_hash if password_hash is not None else user_data.get('password_hash', ''),
+            is_verified=is_verified if is_verified is not None else user_data.get('is_verified', False),
+            verification_token=user_data.get('verification_token'),
+            created_at=now,
+            updated_at=now,
+        )
+        self.users[user_id] = user
+        self.users_by_tenant[user.tenant_id][user_id] = None
+        self.string_index[("email", user.email)] = user_id
+        if user.verification_token:
+            self.string_index[("token", user.verification_token)] = user_id
+        return _row_to_dict(user)
     
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        user_id = uuid4()
-        user = {
-            'id': user_id,
-            'email': user_data['email'],
-            'role': user_data['role'],
-            'locale': user_data.get('locale', 'en'),
-            'tenant_id': user_data['tenant_id'],
-            'password_hash': user_data.get('password_hash', ''),
-            'is_verified': user_data.get('is_verified', False),
-            'verification_token': user_data.get('verification_token')
-        }
-        user = self._add_timestamps(user)
-        self.users[user_id] = user
-        self.email_to_user[user['email']] = user_id
-        if user['verification_token']:
-            self.verification_tokens[user['verification_token']] = user_id
-        return user
+        return self._build_user(user_data)
     
     def create_user_with_password(self, user_data: Dict[str, Any], password: str) -> Dict[str, Any]:
-        user_data['password_hash'] = f"hashed_{password}"  # Упрощенное хеширование для мока
-        user_data['is_verified'] = True
-        return self.create_user(user_data)
+        # Упрощенное хеширование для мока
+        return self._build_user(user_data, password_hash=f"hashed_{password}", is_verified=True)
     
     def update_user_verification(self, user_id: UUID, is_verified: bool, verification_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
         user = self.users.get(user_id)
         if not user:
             return None
         
-        user['is_verified'] = is_verified
+        user.is_verified = is_verified
         if verification_token is not None:
-            user['verification_token'] = verification_token
+            # Старый токен больше не должен находить пользователя
+            if user.verification_token:
+                self.string_index.pop(("token", user.verification_token), None)
+            user.verification_token = verification_token
             if verification_token:
-                self.verification_tokens[verification_token] = user_id
-            else:
-                # Удаляем старый токен
-                old_token = user.get('verification_token')
-                if old_token and old_token in self.verification_tokens:
-                    del self.verification_tokens[old_token]
+                self.string_index[("token", verification_token)] = user_id
         
-        user['updated_at'] = datetime.now(timezone.utc)
-        return user
+        user.updated_at = self._now()
+        return _row_to_dict(user)
+    
+    def update_user_password_hash(self, user_id: UUID, password_hash: str) -> bool:
+        user = self.users.get(user_id)
+        if not user:
+            return False
+        user.password_hash = password_hash
+        user.updated_at = self._now()
+        return True
+    
+    def get_user_with_tenant(self, user_id: UUID) -> Optional[Dict[str, Any]]:
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        return {**_row_to_dict(user), "tenant": _row_to_dict(self.tenants.get(user.tenant_id))}
+    
+    def get_user_by_email_with_tenant(self, email: str) -> Optional[Dict[str, Any]]:
+        return self.get_user_with_tenant(self.string_index.get(("email", email)))
     
     def get_user_by_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
-        user_id = self.verification_tokens.get(token)
-        if user_id:
-            return self.users.get(user_id)
-        return None
+        return _row_to_dict(self.users.get(self.string_index.get(("token", token))))
+    
+    def consume_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            user = self.users.get(self.string_index.pop(("token", token), None))
+            if user is None:
+                return None
+            user.is_verified = True
+            user.verification_token = None
+            user.updated_at = self._now()
+            return _row_to_dict(user)
     
     # Client operations
     def get_client(self, client_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.clients.get(client_id)
-    
-    def get_clients(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        clients_list = [client for client in self.clients.values() if client['tenant_id'] == tenant_id]
-        return clients_list[skip:skip + limit]
+        return _row_to_dict(self.clients.get(client_id))
+    
+    def get_clients(self, tenant_id: UUID, skip: int = 0, limit: int = 100, cursor: Optional[Tuple[datetime, UUID]] = None) -> List[Dict[str, Any]]:
+        """Клиенты tenant-а: по курсору (created_at, id) последней строки или по skip/limit"""
+        if cursor is None:
+            return self._page(self.clients, self.clients_by_tenant, tenant_id, skip, limit)
+        by_created = self.clients_by_tenant_created.get(tenant_id)
+        if not by_created:
+            return []
+        keys = by_created.irange(minimum=cursor, inclusive=(False, True))
+        return [_row_to_dict(self.clients[by_created[key]]) for key in islice(keys, limit)]
+    
+    def iter_clients(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        for row_id in list(self.clients_by_tenant.get(tenant_id, ())):
+            yield _row_to_dict(self.clients[row_id])
     
     def create_client(self, client_data: Dict[str, Any]) -> Dict[str, Any]:
-        client_id = uuid4()
-        client = {
-            'id': client_id,
-            'full_name': client_data['full_name'],
-            'birthday': client_data.get('birthday'),
-            'tags': client_data.get('tags', []),
-            'tenant_id': client_data['tenant_id']
-        }
-        client = self._add_timestamps(client)
+        client_id = uuid7()
+        now = self._now()
+        client = ClientRow(
+            id=client_id,
+            full_name=client_data['full_name'],
+            birthday=client_data.get('birthday'),
+            tags=client_data.get('tags', []),
+            tenant_id=client_data['tenant_id'],
+            created_at=now,
+            updated_at=now,
+        )
         self.clients[client_id] = client
-        return client
+        self.clients_by_tenant[client.tenant_id][client_id] = None
+        self.clients_by_tenant_created[client.tenant_id][(client.created_at, client_id)] = client_id
+        return _row_to_dict(client)
+    
+    def bulk_create_clients(self, clients_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.bulk_clock():
+            return [self.create_client(client_data) for client_data in clients_data]
     
     def update_client(self, client_id: UUID, client_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         client = self.clients.get(client_id)
@@ -143,183 +350,222 @@ class MockDatabase(DatabaseInterface):
             return None
         
         for key, value in client_data.items():
-            if key in ['full_name', 'birthday', 'tags']:
-                client[key] = value
+            if key in CLIENT_UPDATE_FIELDS:
+                setattr(client, key, value)
         
-        client['updated_at'] = datetime.now(timezone.utc)
-        return client
+        client.updated_at = self._now()
+        return _row_to_dict(client)
     
     def delete_client(self, client_id: UUID) -> bool:
         if client_id in self.clients:
-            del self.clients[client_id]
+            client = self.clients.pop(client_id)
+            self._index_remove(self.clients_by_tenant, client.tenant_id, client_id)
+            by_created = self.clients_by_tenant_created.get(client.tenant_id)
+            if by_created is not None:
+                by_created.pop((client.created_at, client_id), None)
+                if not by_created:
+                    del self.clients_by_tenant_created[client.tenant_id]
             return True
         return False
     
     # Session operations
     def get_session(self, session_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.sessions.get(session_id)
+        return _row_to_dict(self.sessions.get(session_id))
     
     def get_sessions(self, client_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        sessions_list = [session for session in self.sessions.values() if session['client_id'] == client_id]
-        return sessions_list[skip:skip + limit]
+        return self._page(self.sessions, self.sessions_by_client, client_id, skip, limit)
+    
+    def iter_sessions(self, client_id: UUID) -> Iterator[Dict[str, Any]]:
+        for row_id in list(self.sessions_by_client.get(client_id, ())):
+            yield _row_to_dict(self.sessions[row_id])
     
     def create_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
-        session_id = uuid4()
-        session = {
-            'id': session_id,
-            'client_id': session_data['client_id'],
-            'scheduled_at': session_data['scheduled_at'],
-            'duration_min': session_data.get('duration_min', 50),
-            'status': session_data.get('status', 'planned')
-        }
-        session = self._add_timestamps(session)
+        session_id = uuid7()
+        now = self._now()
+        session = SessionRow(
+            id=session_id,
+            client_id=session_data['client_id'],
+            scheduled_at=session_data['scheduled_at'],
+            duration_min=session_data.get('duration_min', 50),
+            status=session_data.get('status', 'planned'),
+            created_at=now,
+            updated_at=now,
+        )
         self.sessions[session_id] = session
-        return session
+        self.sessions_by_client[session.client_id][session_id] = None
+        return _row_to_dict(session)
+    
+    def bulk_create_sessions(self, sessions_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.bulk_clock():
+            return [self.create_session(row) for row in sessions_data]
     
     def update_session(self, session_id: UUID, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         session = self.sessions.get(session_id)
         if not session:
             return None
         
+        old_client_id = session.client_id
         for key, value in session_data.items():
-            if key in ['client_id', 'scheduled_at', 'duration_min', 'status']:
-                session[key] = value
+            if key in SESSION_UPDATE_FIELDS:
+                setattr(session, key, value)
+        self._index_move(self.sessions_by_client, old_client_id, session.client_id, session_id)
         
-        session['updated_at'] = datetime.now(timezone.utc)
-        return session
+        session.updated_at = self._now()
+        return _row_to_dict(session)
     
     def delete_session(self, session_id: UUID) -> bool:
         if session_id in self.sessions:
-            del self.sessions[session_id]
+            session = self.sessions.pop(session_id)
+            self._index_remove(self.sessions_by_client, session.client_id, session_id)
             return True
         return False
     
     # Note operations
     def get_note(self, note_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.notes.get(note_id)
+        return _row_to_dict(self.notes.get(note_id))
     
     def get_notes(self, session_id: Optional[UUID] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        notes_list = list(self.notes.values())
         if session_id:
-            notes_list = [note for note in notes_list if note['session_id'] == session_id]
-        return notes_list[skip:skip + limit]
+            return self._page(self.notes, self.notes_by_session, session_id, skip, limit)
+        return [_row_to_dict(row) for row in islice(self.notes.values(), skip, skip + limit)]
     
     def create_note(self, note_data: Dict[str, Any]) -> Dict[str, Any]:
-        note_id = uuid4()
-        note = {
-            'id': note_id,
-            'session_id': note_data.get('session_id'),
-            'author_id': note_data['author_id'],
-            'body_md': note_data['body_md']
-        }
-        note = self._add_timestamps(note)
+        note_id = uuid7()
+        now = self._now()
+        note = NoteRow(
+            id=note_id,
+            session_id=note_data.get('session_id'),
+            author_id=note_data['author_id'],
+            body_md=note_data['body_md'],
+            created_at=now,
+            updated_at=now,
+        )
         self.notes[note_id] = note
-        return note
+        if note.session_id is not None:
+            self.notes_by_session[note.session_id][note_id] = None
+        return _row_to_dict(note)
+    
+    def bulk_create_notes(self, notes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.bulk_clock():
+            return [self.create_note(row) for row in notes_data]
     
     def update_note(self, note_id: UUID, note_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         note = self.notes.get(note_id)
         if not note:
             return None
         
+        old_session_id = note.session_id
         for key, value in note_data.items():
-            if key in ['session_id', 'body_md']:
-                note[key] = value
+            if key in NOTE_UPDATE_FIELDS:
+                setattr(note, key, value)
+        self._index_move(self.notes_by_session, old_session_id, note.session_id, note_id)
         
-        note['updated_at'] = datetime.now(timezone.utc)
-        return note
+        note.updated_at = self._now()
+        return _row_to_dict(note)
     
     def delete_note(self, note_id: UUID) -> bool:
         if note_id in self.notes:
-            del self.notes[note_id]
+            note = self.notes.pop(note_id)
+            self._index_remove(self.notes_by_session, note.session_id, note_id)
             return True
         return False
     
     # Media operations
     def get_media(self, media_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.media.get(media_id)
+        return _row_to_dict(self.media.get(media_id))
     
     def get_media_by_session(self, session_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        media_list = [media for media in self.media.values() if media['session_id'] == session_id]
-        return media_list[skip:skip + limit]
+        return self._page(self.media, self.media_by_session, session_id, skip, limit)
     
     def create_media(self, media_data: Dict[str, Any]) -> Dict[str, Any]:
-        media_id = uuid4()
-        media = {
-            'id': media_id,
-            'session_id': media_data['session_id'],
-            'type': media_data['type'],
-            'url': media_data['url'],
-            'transcription': media_data.get('transcription')
-        }
-        media = self._add_timestamps(media)
+        media_id = uuid7()
+        now = self._now()
+        media = MediaRow(
+            id=media_id,
+            session_id=media_data['session_id'],
+            type=media_data['type'],
+            url=media_data['url'],
+            transcription=media_data.get('transcription'),
+            created_at=now,
+            updated_at=now,
+        )
         self.media[media_id] = media
-        return media
+        self.media_by_session[media.session_id][media_id] = None
+        return _row_to_dict(media)
+    
+    def bulk_create_media(self, media_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.bulk_clock():
+            return [self.create_media(row) for row in media_data]
     
     def update_media(self, media_id: UUID, media_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         media = self.media.get(media_id)
         if not media:
             return None
         
+        old_session_id = media.session_id
         for key, value in media_data.items():
-            if key in ['session_id', 'type', 'url', 'transcription']:
-                media[key] = value
+            if key in MEDIA_UPDATE_FIELDS:
+                setattr(media, key, value)
+        self._index_move(self.media_by_session, old_session_id, media.session_id, media_id)
         
-        media['updated_at'] = datetime.now(timezone.utc)
-        return media
+        media.updated_at = self._now()
+        return _row_to_dict(media)
     
     def delete_media(self, media_id: UUID) -> bool:
         if media_id in self.media:
-            del self.media[media_id]
+            media = self.media.pop(media_id)
+            self._index_remove(self.media_by_session, media.session_id, media_id)
             return True
         return False
     
     # AI Insight operations
     def get_ai_insight(self, insight_id: UUID) -> Optional[Dict[str, Any]]:
-        return self.ai_insights.get(insight_id)
+        return _row_to_dict(self.ai_insights.get(insight_id))
     
     def get_ai_insights_by_session(self, session_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        insights_list = [insight for insight in self.ai_insights.values() if insight['session_id'] == session_id]
-        return insights_list[skip:skip + limit]
+        return self._page(self.ai_insights, self.insights_by_session, session_id, skip, limit)
     
     def create_ai_insight(self, insight_data: Dict[str, Any]) -> Dict[str, Any]:
-        insight_id = uuid4()
-        insight = {
-            'id': insight_id,
-            'session_id': insight_data['session_id'],
-            'kind': insight_data['kind'],
-            'content_json': insight_data['content_json'],
-            'embedding': insight_data.get('embedding')
-        }
-        insight = self._add_timestamps(insight)
+        insight_id = uuid7()
+        now = self._now()
+        insight = AIInsightRow(
+            id=insight_id,
+            session_id=insight_data['session_id'],
+            kind=insight_data['kind'],
+            content_json=insight_data['content_json'],
+            embedding=insight_data.get('embedding'),
+            created_at=now,
+            updated_at=now,
+        )
         self.ai_insights[insight_id] = insight
-        return insight
+        self.insights_by_session[insight.session_id][insight_id] = None
+        return _row_to_dict(insight)
+    
+    def bulk_create_ai_insights(self, insights_data: List[Dict[str, Any]]) -> List[UUID]:
+        with self.bulk_clock():
+            return [self.create_ai_insight(row)["id"] for row in insights_data]
     
     def update_ai_insight(self, insight_id: UUID, insight_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         insight = self.ai_insights.get(insight_id)
         if not insight:
             return None
         
+        old_session_id = insight.session_id
         for key, value in insight_data.items():
-            if key in ['session_id', 'kind', 'content_json', 'embedding']:
-                insight[key] = value
+            if key in AI_INSIGHT_UPDATE_FIELDS:
+                setattr(insight, key, value)
+        self._index_move(self.insights_by_session, old_session_id, insight.session_id, insight_id)
         
-        insight['updated_at'] = datetime.now(timezone.utc)
-        return insight
+        insight.updated_at = self._now()
+        return _row_to_dict(insight)
     
     def delete_ai_insight(self, insight_id: UUID) -> bool:
         if insight_id in self.ai_insights:
-            del self.ai_insights[insight_id]
+            insight = self.ai_insights.pop(insight_id)
+            self._index_remove(self.insights_by_session, insight.session_id, insight_id)
             return True
         return False
     
     def clear(self):
         """Очищает все данные в мок-базе"""
-        self.tenants.clear()
-        self.users.clear()
-        self.clients.clear()
-        self.sessions.clear()
-        self.notes.clear()
-        self.media.clear()
-        self.ai_insights.clear()
-        self.email_to_user.clear()
-        self.verification_tokens.clear() 
+        self._reset()
@@ -1,54 +1,74 @@
-from datetime import datetime
-from uuid import uuid4
 from sqlalchemy import (
     Column, String, DateTime, Enum, ForeignKey, Integer,
-    Boolean, JSON, UniqueConstraint, ARRAY
+    Boolean, Index, BigInteger, table, column
 )
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import declarative_base, relationship
-from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from pgvector.sqlalchemy import HALFVEC
 from app.infrastructure.database.database import Base
+from app.infrastructure.database.ids import uuid7
 
 
 class TimestampMixin:
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime,
-                        default=datetime.utcnow,
-                        onupdate=datetime.utcnow,
+    # Время ставит PostgreSQL (now()), а не Python: меньше параметров в INSERT/UPDATE
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True),
+                        server_default=func.now(),
+                        onupdate=func.now(),
                         nullable=False)
 
 
 class Tenant(Base, TimestampMixin):
     __tablename__ = "tenants"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     name = Column(String(120), nullable=False, unique=True)
     plan = Column(Enum("free", "pro", "org", name="plan_t"), default="free")
+    users = relationship("User", back_populates="tenant", cascade="all, delete")
+    clients = relationship("Client", back_populates="tenant")
 
 
 class User(Base, TimestampMixin):
     __tablename__ = "users"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     tenant_id = Column(ForeignKey("tenants.id"), nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(Enum("therapist", "assistant", "owner", name="user_role"), nullable=False)
     locale = Column(String(8), default="en")
     is_verified = Column(Boolean, default=False, nullable=False)
-    verification_token = Column(String, unique=True, nullable=True)
+    verification_token = Column(String, nullable=True)
     tenant = relationship("Tenant", back_populates="users")
+    notes = relationship("Note", back_populates="author")
 
-
-Tenant.users = relationship("User", back_populates="tenant", cascade="all, delete")
+    __table_args__ = (
+        # Частичный уникальный индекс: у подтвержденных пользователей токен NULL
+        Index(
+            "ix_users_verification_token",
+            "verification_token",
+            unique=True,
+            postgresql_where=verification_token.isnot(None),
+        ),
+        Index("ix_users_tenant_id_id", "tenant_id", "id"),
+    )
 
 
 class Client(Base, TimestampMixin):
     __tablename__ = "clients"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     tenant_id = Column(ForeignKey("tenants.id"), nullable=False)
     full_name = Column(String(120), nullable=False)
     birthday = Column(DateTime)
     tags = Column(ARRAY(String))  # PostgreSQL array
-    tenant = relationship("Tenant")
+    tenant = relationship("Tenant", back_populates="clients")
+    sessions = relationship("Session", back_populates="client")
+
+    __table_args__ = (
+        # Составной индекс под выборки клиентов tenant-а постранично
+        Index("ix_clients_tenant_id_id", "tenant_id", "id"),
+        # Поиск клиентов по тегу (tags @> ARRAY[...])
+        Index("ix_clients_tags_gin", "tags", postgresql_using="gin"),
+    )
 
 
 class ClientUser(Base):
@@ -57,39 +77,91 @@ class ClientUser(Base):
     client_id = Column(ForeignKey("clients.id"), primary_key=True)
     role = Column(Enum("primary", "viewer", name="client_user_role"), default="primary")
 
+    __table_args__ = (
+        # PK начинается с user_id; поиск по client_id нужен отдельный индекс
+        Index("ix_clients_users_client_id", "client_id"),
+    )
+
 
 class Session(Base, TimestampMixin):
     __tablename__ = "sessions"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     client_id = Column(ForeignKey("clients.id"), nullable=False)
     scheduled_at = Column(DateTime, nullable=False)
     duration_min = Column(Integer)
     status = Column(Enum("planned", "in_progress", "done", name="session_status"), default="planned")
-    client = relationship("Client")
+    client = relationship("Client", back_populates="sessions")
+
+    __table_args__ = (
+        Index("ix_sessions_client_id_id", "client_id", "id"),
+    )
 
 
 class Note(Base, TimestampMixin):
     __tablename__ = "notes"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(ForeignKey("sessions.id"), nullable=True)
     author_id = Column(ForeignKey("users.id"), nullable=False)
     body_md = Column(String)
-    author = relationship("User")
+    author = relationship("User", back_populates="notes")
+
+    __table_args__ = (
+        Index("ix_notes_session_id_id", "session_id", "id"),
+        # Заметки автора и каскадные проверки FK при удалении пользователя
+        Index("ix_notes_author_id", "author_id"),
+    )
 
 
 class Media(Base, TimestampMixin):
     __tablename__ = "media"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(ForeignKey("sessions.id"), nullable=False)
     type = Column(Enum("audio", "video", "image", name="media_type"))
     url = Column(String, nullable=False)
-    transcription = Column(JSON)
+    transcription = Column(JSONB)
+
+    __table_args__ = (
+        Index("ix_media_session_id_id", "session_id", "id"),
+    )
 
 
 class AIInsight(Base, TimestampMixin):
     __tablename__ = "ai_insights"
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     session_id = Column(ForeignKey("sessions.id"), nullable=False)
     kind = Column(Enum("summary", "trigger", "todo", name="insight_kind"))
-    content_json = Column(JSON, nullable=False)
-    embedding = Column(Vector(1536))  # pgvector 
+    content_json = Column(JSONB, nullable=False)
+    embedding = Column(HALFVEC(1536))  # pgvector, float16: вдвое меньше таблица и индекс
+
+    __table_args__ = (
+        Index("ix_ai_insights_session_id_id", "session_id", "id"),
+        # Фильтры по содержимому (content_json @> '{"priority": "high"}')
+        Index(
+            "ix_ai_insights_content_json_gin",
+            "content_json",
+            postgresql_using="gin",
+            postgresql_ops={"content_json": "jsonb_path_ops"},
+        ),
+        # ANN-поиск по косинусному расстоянию вместо Seq Scan; ef_search/probes
+        # задаются на соединение. Схема фиксирована на HNSW, переход на IVFFlat
+        # делается явно через scripts/switch_vector_index.py
+        Index(
+            "ix_ai_insights_embedding_hnsw",
+            embedding,
+            postgresql_using="hnsw",
+            postgresql_with={"m": 24, "ef_construction": 128},
+            postgresql_ops={"embedding": "halfvec_cosine_ops"},
+        ),
+    )
+
+
+# Материализованное представление со сводкой по tenant-ам (таблица создается миграцией,
+# обновляется REFRESH MATERIALIZED VIEW CONCURRENTLY). Не входит в Base.metadata,
+# поэтому create_all его не трогает
+tenant_stats = table(
+    "tenant_stats",
+    column("tenant_id", UUID(as_uuid=True)),
+    column("sessions", BigInteger),
+    column("insights", BigInteger),
+    column("last_session", DateTime),
+)
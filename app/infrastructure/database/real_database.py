@@ -1,17 +1,69 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from uuid import UUID
+from sqlalchemy import insert, select, update, bindparam, exists
 from sqlalchemy.orm import Session
-from app.domain.repositories.database_interface import DatabaseInterface
-from app.infrastructure.database import models
+from app.domain.repositories.database_interface import (
+    DatabaseInterface,
+    CLIENT_UPDATE_FIELDS,
+    SESSION_UPDATE_FIELDS,
+    NOTE_UPDATE_FIELDS,
+    MEDIA_UPDATE_FIELDS,
+    AI_INSIGHT_UPDATE_FIELDS,
+)
+from app.infrastructure.database import models, crud
 from app.application import schemas
-from passlib.context import CryptContext
+from app.domain.services.password_hashing import get_password_hash
+from app.infrastructure.database.request_cache import request_cached, invalidate_request_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Заранее собранные запросы для горячих путей аутентификации
+_users = models.User.__table__
+_GET_USER = select(_users).where(_users.c.id == bindparam("user_id"))
+_GET_USER_BY_EMAIL = select(_users).where(_users.c.email == bindparam("email"))
+_USER_EMAIL_EXISTS = select(exists().where(_users.c.email == bindparam("email")))
+_GET_USER_BY_VERIFICATION_TOKEN = select(_users).where(_users.c.verification_token == bindparam("token")).limit(1)
+# UPDATE блокирует строку: второй запрос с тем же токеном дождется commit первого,
+# перепроверит WHERE по уже обнуленному токену и не найдет строку
+_CONSUME_VERIFICATION_TOKEN = (
+    update(_users)
+    .where(_users.c.verification_token == bindparam("token"))
+    .values(is_verified=True, verification_token=None)
+    .returning(_users)
+)
+_tenants = models.Tenant.__table__
+_USER_JOIN_TENANT = select(_users, _tenants).join_from(_users, _tenants, _users.c.tenant_id == _tenants.c.id)
+_GET_USER_WITH_TENANT = _USER_JOIN_TENANT.where(_users.c.id == bindparam("user_id"))
+_GET_USER_BY_EMAIL_WITH_TENANT = _USER_JOIN_TENANT.where(_users.c.email == bindparam("email"))
+_USER_COLUMNS = tuple(column.name for column in _users.columns)
+_TENANT_COLUMNS = tuple(column.name for column in _tenants.columns)
+
+# Пользователи и tenant-ы между запросами не кэшируются: локальный кэш процесса
+# не узнает об изменениях и удалениях из других воркеров uvicorn и скриптов
+# (scripts/delete_user.py). Повторные чтения в пределах одного запроса снимает
+# @request_cached.
+
+
+# Размер пачки при потоковом чтении больших выборок (серверный курсор)
+STREAM_CHUNK_SIZE = 500
+
+# Размер пачки при пакетной вставке: память под параметры и RETURNING ограничена
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Имена колонок по классу модели: обходим __table__.columns один раз, а не на каждую строку
+_COLS_CACHE: Dict[type, Tuple[str, ...]] = {}
+
+
+def _column_names(model_class) -> Tuple[str, ...]:
+    cols = _COLS_CACHE.get(model_class)
+    if cols is None:
+        cols = _COLS_CACHE.setdefault(model_class, tuple(column.name for column in model_class.__table__.columns))
+    return cols
 
 
 class RealDatabase(DatabaseInterface):
     """Адаптер для реальной базы данных PostgreSQL"""
     
+    __slots__ = ("db",)
+    
     def __init__(self, db_session: Session):
         self.db = db_session
     
@@ -20,145 +72,195 @@ class RealDatabase(DatabaseInterface):
         if not model_instance:
             return None
         
-        result = {}
-        for column in model_instance.__table__.columns:
-            value = getattr(model_instance, column.name)
-            result[column.name] = value
-        
-        return result
+        return {name: getattr(model_instance, name) for name in _column_names(type(model_instance))}
     
     def _dict_to_model(self, model_class, data: Dict[str, Any]):
         """Конвертирует словарь в SQLAlchemy модель"""
         return model_class(**data)
     
+    def _bulk_insert(self, model_class, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Вставляет строки пачками INSERT ... VALUES (...), (...) RETURNING и одним commit"""
+        if not rows:
+            return []
+        stmt = insert(model_class).returning(model_class)
+        result = []
+        for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            instances = self.db.execute(stmt, rows[start:start + BULK_INSERT_CHUNK_SIZE]).scalars().all()
+            result.extend(self._model_to_dict(instance) for instance in instances)
+        self.db.commit()
+        return result
+    
+    def _update_returning(self, model_class, obj_id: UUID, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """UPDATE ... WHERE id = ? RETURNING: обновление и чтение строки за один запрос"""
+        if not values:
+            return self._fetch_one(model_class, model_class.id == obj_id)
+        table = model_class.__table__
+        stmt = update(table).where(table.c.id == obj_id).values(**values).returning(table)
+        row = self.db.execute(stmt).mappings().first()
+        self.db.commit()
+        return dict(row) if row is not None else None
+    
+    def _fetch_prepared(self, stmt, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Выполняет заранее собранный запрос и возвращает первую строку словарем"""
+        row = self.db.execute(stmt, params).mappings().first()
+        return dict(row) if row is not None else None
+    
+    def _fetch_one(self, model_class, *criteria) -> Optional[Dict[str, Any]]:
+        """Читает одну строку через Core: без ORM-объектов и identity map"""
+        row = self.db.execute(select(model_class.__table__).where(*criteria).limit(1)).mappings().first()
+        return dict(row) if row is not None else None
+    
+    def _fetch_many(self, model_class, *criteria, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Читает страницу строк через Core и сразу отдает словари"""
+        stmt = select(model_class.__table__).where(*criteria).offset(skip).limit(limit)
+        return [dict(row) for row in self.db.execute(stmt).mappings()]
+    
+    def _iter_rows(self, model_class, *criteria) -> Iterator[Dict[str, Any]]:
+        """Потоково читает все строки пачками по STREAM_CHUNK_SIZE, не держа выборку целиком в памяти"""
+        stmt = select(model_class.__table__).where(*criteria).execution_options(yield_per=STREAM_CHUNK_SIZE)
+        for row in self.db.execute(stmt).mappings():
+            yield dict(row)
+    
     # Tenant operations
+    @request_cached
     def get_tenant(self, tenant_id: UUID) -> Optional[Dict[str, Any]]:
-        tenant = self.db.query(models.Tenant).filter(models.Tenant.id == tenant_id).first()
-        return self._model_to_dict(tenant)
+        return self._fetch_one(models.Tenant, models.Tenant.id == tenant_id)
     
     def get_tenants(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        tenants = self.db.query(models.Tenant).offset(skip).limit(limit).all()
-        return [self._model_to_dict(tenant) for tenant in tenants]
+        return self._fetch_many(models.Tenant, skip=skip, limit=limit)
     
     def create_tenant(self, tenant_data: Dict[str, Any]) -> Dict[str, Any]:
-        tenant = models.Tenant(**tenant_data)
-        self.db.add(tenant)
-        self.db.commit()
-        self.db.refresh(tenant)
-        return self._model_to_dict(tenant)
+        tenant = self._bulk_insert(models.Tenant, [tenant_data])[0]
+        invalidate_request_cache()
+        return tenant
     
     # User operations
+    @request_cached
     def get_user(self, user_id: UUID) -> Optional[Dict[str, Any]]:
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        return self._model_to_dict(user)
+        return self._fetch_prepared(_GET_USER, {"user_id": user_id})
     
+    @request_cached
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        user = self.db.query(models.User).filter(models.User.email == email).first()
-        return self._model_to_dict(user)
+        return self._fetch_prepared(_GET_USER_BY_EMAIL, {"email": email})
+    
+    def user_email_exists(self, email: str) -> bool:
+        """Проверка занятости email: SELECT EXISTS без чтения и разбора строки"""
+        return bool(self.db.execute(_USER_EMAIL_EXISTS, {"email": email}).scalar())
     
     def get_users(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        users = self.db.query(models.User).filter(models.User.tenant_id == tenant_id).offset(skip).limit(limit).all()
-        return [self._model_to_dict(user) for user in users]
+        return self._fetch_many(models.User, models.User.tenant_id == tenant_id, skip=skip, limit=limit)
+    
+    def iter_users(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        return self._iter_rows(models.User, models.User.tenant_id == tenant_id)
     
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        user = models.User(**user_data)
-        self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
-        return self._model_to_dict(user)
+        user = self._bulk_insert(models.User, [user_data])[0]
+        invalidate_request_cache()
+        return user
     
     def create_user_with_password(self, user_data: Dict[str, Any], password: str) -> Dict[str, Any]:
-        password_hash = pwd_context.hash(password)
-        user_data['password_hash'] = password_hash
-        user_data['is_verified'] = True
-        return self.create_user(user_data)
+        return self.create_user({**user_data, "password_hash": get_password_hash(password), "is_verified": True})
     
     def update_user_verification(self, user_id: UUID, is_verified: bool, verification_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
-        user = self.db.query(models.User).filter(models.User.id == user_id).first()
-        if not user:
-            return None
-        
-        user.is_verified = is_verified
+        values: Dict[str, Any] = {"is_verified": is_verified}
         if verification_token is not None:
-            user.verification_token = verification_token
+            values["verification_token"] = verification_token
         
-        self.db.commit()
-        self.db.refresh(user)
-        return self._model_to_dict(user)
+        user = self._update_returning(models.User, user_id, values)
+        if user is not None:
+            invalidate_request_cache()
+        return user
+    
+    def update_user_password_hash(self, user_id: UUID, password_hash: str) -> bool:
+        """Сохраняет новый хеш пароля (перехеширование старых bcrypt-хешей при входе)"""
+        user = self._update_returning(models.User, user_id, {"password_hash": password_hash})
+        if user is None:
+            return False
+        invalidate_request_cache()
+        return True
+    
+    def get_user_with_tenant(self, user_id: UUID) -> Optional[Dict[str, Any]]:
+        """Пользователь с вложенным tenant одним JOIN-запросом вместо двух"""
+        return self._user_with_tenant(_GET_USER_WITH_TENANT, {"user_id": user_id})
+    
+    def get_user_by_email_with_tenant(self, email: str) -> Optional[Dict[str, Any]]:
+        return self._user_with_tenant(_GET_USER_BY_EMAIL_WITH_TENANT, {"email": email})
+    
+    def _user_with_tenant(self, stmt, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(stmt, params).first()
+        if row is None:
+            return None
+        split = len(_USER_COLUMNS)
+        user = dict(zip(_USER_COLUMNS, row[:split]))
+        tenant = dict(zip(_TENANT_COLUMNS, row[split:]))
+        return {**user, "tenant": tenant}
     
     def get_user_by_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
-        user = self.db.query(models.User).filter(models.User.verification_token == token).first()
-        return self._model_to_dict(user)
+        return self._fetch_prepared(_GET_USER_BY_VERIFICATION_TOKEN, {"token": token})
+    
+    def consume_verification_token(self, token: str) -> Optional[Dict[str, Any]]:
+        user = self._fetch_prepared(_CONSUME_VERIFICATION_TOKEN, {"token": token})
+        self.db.commit()
+        if user is not None:
+            invalidate_request_cache()
+        return user
     
     # Client operations
+    @request_cached
     def get_client(self, client_id: UUID) -> Optional[Dict[str, Any]]:
-        client = self.db.query(models.Client).filter(models.Client.id == client_id).first()
-        return self._model_to_dict(client)
+        return self._fetch_one(models.Client, models.Client.id == client_id)
     
     def get_clients(self, tenant_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        clients = self.db.query(models.Client).filter(models.Client.tenant_id == tenant_id).offset(skip).limit(limit).all()
-        return [self._model_to_dict(client) for client in clients]
+        return self._fetch_many(models.Client, models.Client.tenant_id == tenant_id, skip=skip, limit=limit)
+    
+    def iter_clients(self, tenant_id: UUID) -> Iterator[Dict[str, Any]]:
+        return self._iter_rows(models.Client, models.Client.tenant_id == tenant_id)
     
     def create_client(self, client_data: Dict[str, Any]) -> Dict[str, Any]:
-        client = models.Client(**client_data)
-        self.db.add(client)
-        self.db.commit()
-        self.db.refresh(client)
-        return self._model_to_dict(client)
+        return self._bulk_insert(models.Client, [client_data])[0]
+    
+    def bulk_create_clients(self, clients_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._bulk_insert(models.Client, clients_data)
     
     def update_client(self, client_id: UUID, client_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        client = self.db.query(models.Client).filter(models.Client.id == client_id).first()
-        if not client:
-            return None
-        
-        for key, value in client_data.items():
-            if hasattr(client, key):
-                setattr(client, key, value)
-        
-        self.db.commit()
-        self.db.refresh(client)
-        return self._model_to_dict(client)
+        values = {key: value for key, value in client_data.items() if key in CLIENT_UPDATE_FIELDS}
+        client = self._update_returning(models.Client, client_id, values)
+        if client is not None:
+            invalidate_request_cache()
+        return client
     
     def delete_client(self, client_id: UUID) -> bool:
-        client = self.db.query(models.Client).filter(models.Client.id == client_id).first()
+        client = self.db.get(models.Client, client_id)
         if not client:
             return False
         
         self.db.delete(client)
         self.db.commit()
+        invalidate_request_cache()
         return True
     
     # Session operations
     def get_session(self, session_id: UUID) -> Optional[Dict[str, Any]]:
-        session = self.db.query(models.Session).filter(models.Session.id == session_id).first()
-        return self._model_to_dict(session)
+        return self._fetch_one(models.Session, models.Session.id == session_id)
     
     def get_sessions(self, client_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        sessions = self.db.query(models.Session).filter(models.Session.client_id == client_id).offset(skip).limit(limit).all()
-        return [self._model_to_dict(session) for session in sessions]
+        return self._fetch_many(models.Session, models.Session.client_id == client_id, skip=skip, limit=limit)
+    
+    def iter_sessions(self, client_id: UUID) -> Iterator[Dict[str, Any]]:
+        return self._iter_rows(models.Session, models.Session.client_id == client_id)
     
     def create_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
-        session = models.Session(**session_data)
-        self.db.add(session)
-        self.db.commit()
-        self.db.refresh(session)
-        return self._model_to_dict(session)
+        return self._bulk_insert(models.Session, [session_data])[0]
+    
+    def bulk_create_sessions(self, sessions_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._bulk_insert(models.Session, sessions_data)
     
     def update_session(self, session_id: UUID, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        session = self.db.query(models.Session).filter(models.Session.id == session_id).first()
-        if not session:
-            return None
-        
-        for key, value in session_data.items():
-            if hasattr(session, key):
-                setattr(session, key, value)
-        
-        self.db.commit()
-        self.db.refresh(session)
-        return self._model_to_dict(session)
+        values = {key: value for key, value in session_data.items() if key in SESSION_UPDATE_FIELDS}
+        return self._update_returning(models.Session, session_id, values)
     
     def delete_session(self, session_id: UUID) -> bool:
-        session = self.db.query(models.Session).filter(models.Session.id == session_id).first()
+        session = self.db.get(models.Session, session_id)
         if not session:
             return False
         
@@ -168,38 +270,24 @@ class RealDatabase(DatabaseInterface):
     
     # Note operations
     def get_note(self, note_id: UUID) -> Optional[Dict[str, Any]]:
-        note = self.db.query(models.Note).filter(models.Note.id == note_id).first()
-        return self._model_to_dict(note)
+        return self._fetch_one(models.Note, models.Note.id == note_id)
     
     def get_notes(self, session_id: Optional[UUID] = None, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        query = self.db.query(models.Note)
-        if session_id:
-            query = query.filter(models.Note.session_id == session_id)
-        notes = query.offset(skip).limit(limit).all()
-        return [self._model_to_dict(note) for note in notes]
+        criteria = (models.Note.session_id == session_id,) if session_id else ()
+        return self._fetch_many(models.Note, *criteria, skip=skip, limit=limit)
     
     def create_note(self, note_data: Dict[str, Any]) -> Dict[str, Any]:
-        note = models.Note(**note_data)
-        self.db.add(note)
-        self.db.commit()
-        self.db.refresh(note)
-        return self._model_to_dict(note)
+        return self._bulk_insert(models.Note, [note_data])[0]
+    
+    def bulk_create_notes(self, notes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._bulk_insert(models.Note, notes_data)
     
     def update_note(self, note_id: UUID, note_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        note = self.db.query(models.Note).filter(models.Note.id == note_id).first()
-        if not note:
-            return None
-        
-        for key, value in note_data.items():
-            if hasattr(note, key):
-                setattr(note, key, value)
-        
-        self.db.commit()
-        self.db.refresh(note)
-        return self._model_to_dict(note)
+        values = {key: value for key, value in note_data.items() if key in NOTE_UPDATE_FIELDS}
+        return self._update_returning(models.Note, note_id, values)
     
     def delete_note(self, note_id: UUID) -> bool:
-        note = self.db.query(models.Note).filter(models.Note.id == note_id).first()
+        note = self.db.get(models.Note, note_id)
         if not note:
             return False
         
@@ -209,35 +297,23 @@ class RealDatabase(DatabaseInterface):
     
     # Media operations
     def get_media(self, media_id: UUID) -> Optional[Dict[str, Any]]:
-        media = self.db.query(models.Media).filter(models.Media.id == media_id).first()
-        return self._model_to_dict(media)
+        return self._fetch_one(models.Media, models.Media.id == media_id)
     
     def get_media_by_session(self, session_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        media_list = self.db.query(models.Media).filter(models.Media.session_id == session_id).offset(skip).limit(limit).all()
-        return [self._model_to_dict(media) for media in media_list]
+        return self._fetch_many(models.Media, models.Media.session_id == session_id, skip=skip, limit=limit)
     
     def create_media(self, media_data: Dict[str, Any]) -> Dict[str, Any]:
-        media = models.Media(**media_data)
-        self.db.add(media)
-        self.db.commit()
-        self.db.refresh(media)
-        return self._model_to_dict(media)
+        return self._bulk_insert(models.Media, [media_data])[0]
+    
+    def bulk_create_media(self, media_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._bulk_insert(models.Media, media_data)
     
     def update_media(self, media_id: UUID, media_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        media = self.db.query(models.Media).filter(models.Media.id == media_id).first()
-        if not media:
-            return None
-        
-        for key, value in media_data.items():
-            if hasattr(media, key):
-                setattr(media, key, value)
-        
-        self.db.commit()
-        self.db.refresh(media)
-        return self._model_to_dict(media)
+        values = {key: value for key, value in media_data.items() if key in MEDIA_UPDATE_FIELDS}
+        return self._update_returning(models.Media, media_id, values)
     
     def delete_media(self, media_id: UUID) -> bool:
-        media = self.db.query(models.Media).filter(models.Media.id == media_id).first()
+        media = self.db.get(models.Media, media_id)
         if not media:
             return False
         
@@ -247,35 +323,26 @@ class RealDatabase(DatabaseInterface):
     
     # AI Insight operations
     def get_ai_insight(self, insight_id: UUID) -> Optional[Dict[str, Any]]:
-        insight = self.db.query(models.AIInsight).filter(models.AIInsight.id == insight_id).first()
-        return self._model_to_dict(insight)
+        return self._fetch_one(models.AIInsight, models.AIInsight.id == insight_id)
     
     def get_ai_insights_by_session(self, session_id: UUID, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        insights = self.db.query(models.AIInsight).filter(models.AIInsight.session_id == session_id).offset(skip).limit(limit).all()
-        return [self._model_to_dict(insight) for insight in insights]
+        return self._fetch_many(models.AIInsight, models.AIInsight.session_id == session_id, skip=skip, limit=limit)
     
     def create_ai_insight(self, insight_data: Dict[str, Any]) -> Dict[str, Any]:
-        insight = models.AIInsight(**insight_data)
-        self.db.add(insight)
-        self.db.commit()
-        self.db.refresh(insight)
-        return self._model_to_dict(insight)
+        return self._bulk_insert(models.AIInsight, [insight_data])[0]
+    
+    def bulk_create_ai_insights(self, insights_data: List[Dict[str, Any]]) -> List[UUID]:
+        # RETURNING только id: полные строки тянули бы обратно по 1536 значений эмбеддинга
+        if not insights_data:
+            return []
+        return crud.bulk_create_ai_insights(self.db, insights_data, chunk_size=BULK_INSERT_CHUNK_SIZE)
     
     def update_ai_insight(self, insight_id: UUID, insight_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        insight = self.db.query(models.AIInsight).filter(models.AIInsight.id == insight_id).first()
-        if not insight:
-            return None
-        
-        for key, value in insight_data.items():
-            if hasattr(insight, key):
-                setattr(insight, key, value)
-        
-        self.db.commit()
-        self.db.refresh(insight)
-        return self._model_to_dict(insight)
+        values = {key: value for key, value in insight_data.items() if key in AI_INSIGHT_UPDATE_FIELDS}
+        return self._update_returning(models.AIInsight, insight_id, values)
     
     def delete_ai_insight(self, insight_id: UUID) -> bool:
-        insight = self.db.query(models.AIInsight).filter(models.AIInsight.id == insight_id).first()
+        insight = self.db.get(models.AIInsight, insight_id)
         if not insight:
             return False
         
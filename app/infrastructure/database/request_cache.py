@@ -0,0 +1,44 @@
+"""
+Кэш повторяющихся чтений в пределах одного HTTP-запроса.
+
+Словарь кэша живет в ContextVar: middleware создает его в начале запроса и
+сбрасывает в конце, поэтому данные не переживают запрос и не видны другим
+запросам. Вне запроса (скрипты, тесты) кэширование просто не включается.
+"""
+from contextvars import ContextVar, Token
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+_request_cache: ContextVar[Optional[Dict[Any, Any]]] = ContextVar("req_cache", default=None)
+
+
+def start_request_cache() -> Token:
+    """Включает кэш для текущего запроса"""
+    return _request_cache.set({})
+
+
+def reset_request_cache(token: Token) -> None:
+    """Выключает кэш по завершении запроса"""
+    _request_cache.reset(token)
+
+
+def invalidate_request_cache() -> None:
+    """Сбрасывает закэшированные чтения после записи в базу"""
+    cache = _request_cache.get()
+    if cache is not None:
+        cache.clear()
+
+
+def request_cached(func: Callable) -> Callable:
+    """Кэширует результат метода адаптера по (имя метода, аргументы) на время запроса"""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = _request_cache.get()
+        if cache is None:
+            return func(self, *args, **kwargs)
+
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in cache:
+            cache[key] = func(self, *args, **kwargs)
+        return cache[key]
+    return wrapper
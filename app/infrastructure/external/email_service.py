@@ -1,10 +1,67 @@
 import os
+import asyncio
+import json
+import logging
+import re
+from contextlib import AsyncExitStack
+from functools import lru_cache
+import aioboto3
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import BackgroundTasks
+from jinja2 import Environment, PackageLoader, select_autoescape
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Шаблоны писем компилируются один раз на процесс и кэшируются окружением
+_env = Environment(
+    loader=PackageLoader("app", "templates/email"),
+    autoescape=select_autoescape(["html.j2"]),
+    cache_size=-1,
+)
+
+# Пул keep-alive соединений к SES и стандартные ретраи вместо одноразовых соединений
+_SES_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={"mode": "standard", "max_attempts": 3},
+)
+
+
+@lru_cache(maxsize=8)
+def _get_ses_client(region: Optional[str], access_key_id: str, secret_access_key: str):
+    """SES клиент создается один раз на набор credentials (инициализация boto3 дорогая)"""
+    return boto3.client(
+        "ses",
+        region_name=region,
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        config=_SES_CONFIG,
+    )
+
+
+# SES-шаблоны: тема и исходники тех же Jinja-шаблонов (синтаксис {{ var }} совместим с Handlebars)
+SES_TEMPLATES: Dict[str, Tuple[str, str, str]] = {
+    "verification-v1": ("Подтверждение регистрации в {{tenant_name}}", "verification.txt.j2", "verification.html.j2"),
+    "welcome-v1": ("Добро пожаловать в {{tenant_name}}!", "welcome.txt.j2", "welcome.html.j2"),
+}
+
+# Ограничение SES на число получателей в одном SendBulkTemplatedEmail
+BULK_MAX_DESTINATIONS = 50
+
+
+def _template_source(name: str) -> str:
+    return _env.loader.get_source(_env, name)[0]
+
+
+def _unescaped(source: str) -> str:
+    """{{ var }} -> {{{var}}}: Handlebars не должен HTML-экранировать текстовую версию"""
+    return re.sub(r"\{\{\s*(\w+)\s*\}\}", r"{{{\1}}}", source)
+
+
 class EmailService:
     """Сервис для отправки писем через AWS SES"""
     
@@ -14,21 +71,38 @@ class EmailService:
         self.aws_secret_access_key = settings.aws_secret_access_key
         self.sender_email = settings.sender_email
         
+        self._tmpl_verify_text = _env.get_template("verification.txt.j2")
+        self._tmpl_verify_html = _env.get_template("verification.html.j2")
+        self._tmpl_welcome_text = _env.get_template("welcome.txt.j2")
+        self._tmpl_welcome_html = _env.get_template("welcome.html.j2")
+        
         # Инициализация SES клиента только если есть AWS credentials
-        self.ses_client = None
-        if self.aws_access_key_id and self.aws_secret_access_key:
-            try:
-                self.ses_client = boto3.client(
-                    "ses",
-                    region_name=self.aws_region,
-                    aws_access_key_id=self.aws_access_key_id,
-                    aws_secret_access_key=self.aws_secret_access_key
-                )
-                print("✅ AWS SES client initialized successfully")
-            except Exception as e:
-                print(f"❌ Failed to initialize AWS SES client: {e}")
-        else:
-            print("⚠️ AWS credentials not provided, email service will use mock mode")
+        self.ses_client = self._make_ses_client()
+        self._templates_ready = False
+        
+        # Асинхронный SES клиент (aioboto3) открывается лениво в event loop-е приложения
+        self._aio_session = None
+        self._aio_stack: Optional[AsyncExitStack] = None
+        self._aio_client = None
+        if self.ses_client is not None:
+            self._aio_session = aioboto3.Session(
+                aws_access_key_id=self.aws_access_key_id,
+                aws_secret_access_key=self.aws_secret_access_key,
+                region_name=self.aws_region,
+            )
+    
+    def _make_ses_client(self):
+        """SES клиент или None (mock режим); точка подмены транспорта в тестах"""
+        if not (self.aws_access_key_id and self.aws_secret_access_key):
+            logger.warning("⚠️ AWS credentials not provided, email service will use mock mode")
+            return None
+        try:
+            ses_client = _get_ses_client(self.aws_region, self.aws_access_key_id, self.aws_secret_access_key)
+        except Exception as e:
+            logger.error("❌ Failed to initialize AWS SES client: %s", e)
+            return None
+        logger.info("✅ AWS SES client initialized successfully")
+        return ses_client
     
     def send_email(self, to_email: str, subject: str, body_text: str, body_html: str = "") -> bool:
         """
@@ -45,33 +119,170 @@ class EmailService:
         """
         if not self.ses_client:
             # Mock режим - просто выводим в консоль
-            print(f"📧 MOCK EMAIL SENT:")
-            print(f"   To: {to_email}")
-            print(f"   Subject: {subject}")
-            print(f"   Body: {body_text}")
+            logger.info("📧 MOCK EMAIL SENT:\n   To: %s\n   Subject: %s\n   Body: %s", to_email, subject, body_text)
             return True
         
+        # Отправляем только непустые части, без дублирования текста в Html
+        body = {}
+        if body_text:
+            body["Text"] = {"Data": body_text}
+        if body_html:
+            body["Html"] = {"Data": body_html}
+        
         try:
             response = self.ses_client.send_email(
                 Source=self.sender_email,
                 Destination={"ToAddresses": [to_email]},
                 Message={
                     "Subject": {"Data": subject},
-                    "Body": {
-                        "Text": {"Data": body_text},
-                        "Html": {"Data": body_html or body_text},
-                    },
+                    "Body": body,
                 }
             )
-            print(f"✅ Email sent successfully: {response['MessageId']}")
+            logger.info("✅ Email sent successfully: %s", response['MessageId'])
             return True
         except ClientError as e:
-            print(f"❌ Failed to send email: {e.response['Error']['Message']}")
+            logger.error("❌ Failed to send email: %s", e.response['Error']['Message'])
             return False
         except Exception as e:
-            print(f"❌ Unexpected error sending email: {e}")
+            logger.error("❌ Unexpected error sending email: %s", e)
             return False
     
+    def ensure_templates(self) -> bool:
+        """Идемпотентно создает или обновляет SES-шаблоны (один раз на экземпляр)"""
+        if self._templates_ready:
+            return True
+        if not self.ses_client:
+            return False
+        
+        try:
+            for template_name, (subject, text_name, html_name) in SES_TEMPLATES.items():
+                template = {
+                    "TemplateName": template_name,
+                    "SubjectPart": subject,
+                    "TextPart": _unescaped(_template_source(text_name)),
+                    "HtmlPart": _template_source(html_name),
+                }
+                try:
+                    self.ses_client.create_template(Template=template)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] != "AlreadyExists":
+                        raise
+                    self.ses_client.update_template(Template=template)
+        except ClientError as e:
+            logger.error("❌ Failed to sync SES templates: %s", e.response['Error']['Message'])
+            return False
+        
+        self._templates_ready = True
+        return True
+    
+    def send_templated_email(self, to_email: str, template_name: str, template_data: Dict[str, Any]) -> bool:
+        """
+        Отправляет письмо по SES-шаблону: передаются только данные для подстановки
+        
+        Args:
+            to_email: Email получателя
+            template_name: Имя шаблона из SES_TEMPLATES
+            template_data: Значения переменных шаблона
+            
+        Returns:
+            bool: True если письмо отправлено успешно
+        """
+        if not self.ensure_templates():
+            return False
+        
+        try:
+            response = self.ses_client.send_templated_email(
+                Source=self.sender_email,
+                Destination={"ToAddresses": [to_email]},
+                Template=template_name,
+                TemplateData=json.dumps(template_data),
+            )
+            logger.info("✅ Email sent successfully: %s", response['MessageId'])
+            return True
+        except ClientError as e:
+            logger.error("❌ Failed to send email: %s", e.response['Error']['Message'])
+            return False
+        except Exception as e:
+            logger.error("❌ Unexpected error sending email: %s", e)
+            return False
+    
+    async def _get_aio_client(self):
+        """Долгоживущий async SES клиент: соединения переиспользуются между письмами"""
+        if self._aio_client is None:
+            self._aio_stack = AsyncExitStack()
+            self._aio_client = await self._aio_stack.enter_async_context(
+                self._aio_session.client("ses", config=_SES_CONFIG)
+            )
+        return self._aio_client
+    
+    async def aclose(self) -> None:
+        """Закрывает async SES клиент (вызывается при остановке приложения)"""
+        if self._aio_stack is not None:
+            await self._aio_stack.aclose()
+        self._aio_stack = None
+        self._aio_client = None
+    
+    async def send_templated_email_async(self, to_email: str, template_name: str, template_data: Dict[str, Any]) -> bool:
+        """Асинхронный вариант send_templated_email: не занимает поток на время запроса к SES"""
+        if not self._templates_ready and not await asyncio.to_thread(self.ensure_templates):
+            return False
+        
+        try:
+            ses = await self._get_aio_client()
+            response = await ses.send_templated_email(
+                Source=self.sender_email,
+                Destination={"ToAddresses": [to_email]},
+                Template=template_name,
+                TemplateData=json.dumps(template_data),
+            )
+            logger.info("✅ Email sent successfully: %s", response['MessageId'])
+            return True
+        except ClientError as e:
+            logger.error("❌ Failed to send email: %s", e.response['Error']['Message'])
+            return False
+        except Exception as e:
+            logger.error("❌ Unexpected error sending email: %s", e)
+            return False
+    
+    def send_bulk(self, template_name: str, destinations: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        Массовая отправка по SES-шаблону, до BULK_MAX_DESTINATIONS получателей за вызов
+        
+        Args:
+            template_name: Имя шаблона из SES_TEMPLATES
+            destinations: Пары (email, данные шаблона)
+            
+        Returns:
+            bool: True если все пачки приняты SES
+        """
+        if not self.ses_client:
+            for to_email, template_data in destinations:
+                logger.info("📧 MOCK BULK EMAIL SENT: %s -> %s %s", template_name, to_email, template_data)
+            return True
+        if not self.ensure_templates():
+            return False
+        
+        ok = True
+        for start in range(0, len(destinations), BULK_MAX_DESTINATIONS):
+            chunk = destinations[start:start + BULK_MAX_DESTINATIONS]
+            try:
+                self.ses_client.send_bulk_templated_email(
+                    Source=self.sender_email,
+                    Template=template_name,
+                    DefaultTemplateData="{}",
+                    Destinations=[
+                        {
+                            "Destination": {"ToAddresses": [to_email]},
+                            "ReplacementTemplateData": json.dumps(template_data),
+                        }
+                        for to_email, template_data in chunk
+                    ],
+                )
+            except ClientError as e:
+                logger.error("❌ Failed to send bulk email: %s", e.response['Error']['Message'])
+                ok = False
+        return ok
+    
     def send_verification_email(self, to_email: str, verification_token: str, tenant_name: str, base_url: str = "http://localhost:8000") -> bool:
         """
         Отправляет письмо для подтверждения email
@@ -89,58 +300,14 @@ class EmailService:
         
         verification_url = f"{base_url}/auth/verify?token={verification_token}"
         
-        body_text = f"""
-Здравствуйте!
-
-Спасибо за регистрацию в {tenant_name}. Для подтверждения вашего email перейдите по ссылке:
-
-{verification_url}
-
-Если вы не регистрировались в нашем сервисе, проигнорируйте это письмо.
-
-С уважением,
-Команда {tenant_name}
-        """.strip()
-        
-        body_html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Подтверждение регистрации</title>
-</head>
-<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <h2 style="color: #2c3e50;">Подтверждение регистрации</h2>
-        
-        <p>Здравствуйте!</p>
+        if self.ses_client:
+            return self.send_templated_email(to_email, "verification-v1", {
+                "tenant_name": tenant_name,
+                "verification_url": verification_url,
+            })
         
-        <p>Спасибо за регистрацию в <strong>{tenant_name}</strong>. Для подтверждения вашего email нажмите на кнопку ниже:</p>
-        
-        <div style="text-align: center; margin: 30px 0;">
-            <a href="{verification_url}" 
-               style="background-color: #3498db; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                Подтвердить Email
-            </a>
-        </div>
-        
-        <p>Или скопируйте эту ссылку в браузер:</p>
-        <p style="word-break: break-all; color: #7f8c8d;">{verification_url}</p>
-        
-        <hr style="border: none; border-top: 1px solid #ecf0f1; margin: 30px 0;">
-        
-        <p style="font-size: 14px; color: #7f8c8d;">
-            Если вы не регистрировались в нашем сервисе, проигнорируйте это письмо.
-        </p>
-        
-        <p style="font-size: 14px; color: #7f8c8d;">
-            С уважением,<br>
-            Команда {tenant_name}
-        </p>
-    </div>
-</body>
-</html>
-        """
+        body_text = self._tmpl_verify_text.render(tenant_name=tenant_name, verification_url=verification_url)
+        body_html = self._tmpl_verify_html.render(tenant_name=tenant_name, verification_url=verification_url)
         
         return self.send_email(to_email, subject, body_text, body_html)
     
@@ -155,49 +322,31 @@ class EmailService:
         Returns:
             bool: True если письмо отправлено успешно
         """
-        subject = f"Добро пожаловать в {tenant_name}!"
-        
-        body_text = f"""
-Здравствуйте!
-
-Добро пожаловать в {tenant_name}! Ваш email успешно подтвержден.
-
-Теперь вы можете войти в систему и начать работу.
-
-С уважением,
-Команда {tenant_name}
-        """.strip()
-        
-        body_html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Добро пожаловать</title>
-</head>
-<body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-        <h2 style="color: #27ae60;">Добро пожаловать!</h2>
-        
-        <p>Здравствуйте!</p>
+        if self.ses_client:
+            return self.send_templated_email(to_email, "welcome-v1", {"tenant_name": tenant_name})
         
-        <p>Добро пожаловать в <strong>{tenant_name}</strong>! Ваш email успешно подтвержден.</p>
-        
-        <p>Теперь вы можете войти в систему и начать работу.</p>
-        
-        <hr style="border: none; border-top: 1px solid #ecf0f1; margin: 30px 0;">
+        subject = f"Добро пожаловать в {tenant_name}!"
         
-        <p style="font-size: 14px; color: #7f8c8d;">
-            С уважением,<br>
-            Команда {tenant_name}
-        </p>
-    </div>
-</body>
-</html>
-        """
+        body_text = self._tmpl_welcome_text.render(tenant_name=tenant_name)
+        body_html = self._tmpl_welcome_html.render(tenant_name=tenant_name)
         
         return self.send_email(to_email, subject, body_text, body_html)
 
+    
+    async def send_verification_email_async(self, to_email: str, verification_token: str, tenant_name: str, base_url: str = "http://localhost:8000") -> bool:
+        """Асинхронный вариант send_verification_email"""
+        if not self._aio_session:
+            return self.send_verification_email(to_email, verification_token, tenant_name, base_url)
+        return await self.send_templated_email_async(to_email, "verification-v1", {
+            "tenant_name": tenant_name,
+            "verification_url": f"{base_url}/auth/verify?token={verification_token}",
+        })
+    
+    async def send_welcome_email_async(self, to_email: str, tenant_name: str) -> bool:
+        """Асинхронный вариант send_welcome_email"""
+        if not self._aio_session:
+            return self.send_welcome_email(to_email, tenant_name)
+        return await self.send_templated_email_async(to_email, "welcome-v1", {"tenant_name": tenant_name})
 
 # Создаем глобальный экземпляр сервиса
 email_service = EmailService() 
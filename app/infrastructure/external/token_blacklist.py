@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+import redis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBlacklistService:
+    """
+    Черный список отозванных JWT (по jti) в Redis.
+    
+    Без REDIS_URL список живет в памяти процесса: отзыв виден только воркеру,
+    принявшему logout, и теряется при перезапуске - годится лишь для разработки
+    и тестов. Если Redis настроен, но недоступен, проверка работает fail closed:
+    токен считается отозванным, пока Redis не ответит
+    """
+    
+    KEY_PREFIX = "bl:"
+    
+    def __init__(self):
+        self.redis_url = settings.redis_url
+        
+        self.redis_client: Optional[redis.Redis] = None
+        self._memory: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        if self.redis_url:
+            try:
+                self.redis_client = redis.Redis.from_url(self.redis_url)
+                logger.info("✅ Redis token blacklist initialized successfully")
+            except Exception as e:
+                logger.error("❌ Failed to initialize Redis token blacklist: %s", e)
+        else:
+            log = logger.warning if settings.debug else logger.error
+            log("⚠️ REDIS_URL not provided, token blacklist will use in-memory mode: "
+                "revoked tokens stay valid in other workers and after restart")
+    
+    def blacklist(self, jti: str, remaining_ttl_s: int) -> None:
+        """
+        Добавляет токен в черный список до истечения его срока действия
+        
+        Args:
+            jti: Идентификатор токена
+            remaining_ttl_s: Сколько секунд токен еще был бы действителен
+        """
+        if remaining_ttl_s <= 0:
+            return
+        
+        if self.redis_client:
+            try:
+                self.redis_client.set(f"{self.KEY_PREFIX}{jti}", "1", ex=remaining_ttl_s)
+                return
+            except redis.RedisError as e:
+                # Запись в памяти отзывает токен хотя бы в этом воркере
+                logger.error("❌ Failed to blacklist token in Redis, revoked only in this process: %s", e)
+        
+        now = time.monotonic()
+        with self._lock:
+            # Заодно удаляем истекшие записи, чтобы память не росла
+            for expired in [key for key, expires_at in self._memory.items() if expires_at <= now]:
+                del self._memory[expired]
+            self._memory[jti] = now + remaining_ttl_s
+    
+    def is_blacklisted(self, jti: str) -> bool:
+        """Проверяет, отозван ли токен"""
+        # Память проверяется и при настроенном Redis: туда попадают отзывы, которые
+        # не удалось записать в Redis, и они должны действовать после его восстановления
+        with self._lock:
+            expires_at = self._memory.get(jti)
+        if expires_at is not None and expires_at > time.monotonic():
+            return True
+        
+        if self.redis_client:
+            try:
+                return bool(self.redis_client.exists(f"{self.KEY_PREFIX}{jti}"))
+            except redis.RedisError as e:
+                logger.error("❌ Failed to check token blacklist in Redis, rejecting token: %s", e)
+                return True
+        return False
+
+
+# Глобальный экземпляр сервиса
+token_blacklist = TokenBlacklistService()
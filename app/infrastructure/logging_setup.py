@@ -0,0 +1,8 @@
+"""
+Импорт модуля включает логирование через очередь (log_queue.configure_logging).
+app.main импортирует его первым: сервисы пишут свой статус (SES, Redis, брокер
+писем) уже при импорте, и до настройки корневого логгера INFO-сообщения терялись бы
+"""
+from app.infrastructure.log_queue import configure_logging
+
+configure_logging()
@@ -1,20 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Response, Request
+# Первым импортом: логирование настраивается до сервисов, пишущих статус при импорте
+from app.infrastructure import logging_setup  # noqa: F401
+from contextlib import asynccontextmanager
+import numpy as np
+from fastapi import FastAPI, Depends, HTTPException, status, Response, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, TypeAdapter
+from typing import Any, Dict, List, Literal, Optional, Type
 from uuid import UUID
 from datetime import timedelta
-from app.infrastructure.database import models, crud
+from app.infrastructure.database import models, crud, async_crud
 from app.application import schemas
+from app.config import settings
 from app.domain.services import auth_service
-from app.infrastructure.database.database import get_engine, get_db
+from app.domain.services.password_hashing import (
+    pwd_context,
+    shutdown_hash_pool,
+    hash_password_async,
+    verify_password_async,
+    verify_dummy_password_async,
+)
+from app.infrastructure.database.database import get_engine, get_db, get_async_db
 from app.infrastructure.database.database_factory import DatabaseFactory
 from app.domain.repositories.database_interface import DatabaseInterface
 from app.infrastructure.external.email_service import email_service
+from app.tasks.email import enqueue_email, send_verification_task, send_welcome_task
+from app.presentation.middleware.request_cache import RequestCacheMiddleware
+
+# Create database tables (только по RUN_MIGRATIONS=1, иначе схему ведет alembic)
+if settings.run_migrations:
+    models.Base.metadata.create_all(bind=get_engine())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Останавливаем пул процессов хеширования паролей
+    shutdown_hash_pool()
+    # Закрываем async SES клиент
+    await email_service.aclose()
 
-# Create database tables
-models.Base.metadata.create_all(bind=get_engine())
 
 app = FastAPI(
     title="Therapy Management API",
@@ -29,18 +59,26 @@ app = FastAPI(
         {"name": "notes", "description": "Управление заметками"},
         {"name": "media", "description": "Управление медиафайлами"},
         {"name": "ai-insights", "description": "ИИ-инсайты и аналитика"},
-    ]
+    ],
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Add CORS middleware: явный список origin-ов проверяется по множеству, а
+# max_age позволяет браузеру кэшировать preflight
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=[origin.strip() for origin in settings.cors_origins.split(",") if origin.strip()],
+    allow_origin_regex=settings.cors_origin_regex,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=settings.cors_max_age,
 )
 
+# Per-request cache for repeated lookups
+app.add_middleware(RequestCacheMiddleware)
+
 # Security
 security = HTTPBearer(auto_error=False)
 
@@ -50,23 +88,69 @@ def get_database(db_session: Session = Depends(get_db)) -> DatabaseInterface:
     return DatabaseFactory.create_database(db_session)
 
 
+_LIST_ADAPTERS: Dict[Type[BaseModel], TypeAdapter] = {}
+
+
+def _read_value(value: Any) -> Any:
+    # pgvector отдает embedding как HalfVector (halfvec) или numpy-массив (vector)
+    if hasattr(value, "to_list"):
+        return value.to_list()
+    return value.tolist() if hasattr(value, "tolist") else value
+
+
+def list_response(schema: Type[BaseModel], rows: List[Any]) -> Response:
+    """
+    Сериализует строки из БД в JSON без повторной валидации через response_model:
+    данные уже проверены при записи, response_model остается только для OpenAPI
+    """
+    adapter = _LIST_ADAPTERS.get(schema)
+    if adapter is None:
+        adapter = _LIST_ADAPTERS[schema] = TypeAdapter(List[schema])
+    fields = schema.model_fields
+    items = [
+        schema.model_construct(**{name: _read_value(getattr(row, name)) for name in fields})
+        for row in rows
+    ]
+    return Response(content=adapter.dump_json(items), media_type="application/json")
+
+
+def _reference_not_found(model, exc: IntegrityError, details: Dict[str, str]) -> HTTPException:
+    """
+    404 для INSERT, упавшего на внешнем ключе: существование связанных строк
+    проверяет сама БД, без отдельных SELECT перед вставкой
+    """
+    column = crud.missing_reference(model, exc)
+    if column is None:
+        raise exc
+    detail = details.get(column) or next(iter(details.values()))
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+
 def get_token_from_cookie(request: Request) -> Optional[str]:
     """Получает токен из cookie"""
     return request.cookies.get("session_token")
 
 
+# detail и заголовки 401 общие, а исключение создается на каждый raise: общий
+# экземпляр между конкурентными запросами делил бы __traceback__ и __context__
+_CREDENTIALS_DETAIL = "Could not validate credentials"
+_CREDENTIALS_HEADERS = {"WWW-Authenticate": "Bearer"}
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=_CREDENTIALS_DETAIL,
+        headers=_CREDENTIALS_HEADERS,
+    )
+
+
 def get_current_user(
     request: Request,
     bearer_token: Optional[str] = Depends(security),
     database: DatabaseInterface = Depends(get_database)
 ):
     """Получает текущего пользователя из токена (cookie или Bearer)"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
     # Пробуем получить токен из cookie или Bearer
     token = None
     if bearer_token and bearer_token.credentials:
@@ -75,40 +159,43 @@ def get_current_user(
         token = get_token_from_cookie(request)
     
     if not token:
-        raise credentials_exception
+        raise _credentials_exception()
     
     payload = auth_service.verify_token(token)
     if payload is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    user_id: str = payload.get("sub")
+    user_id = auth_service.token_subject(payload)
     if user_id is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
-    user = database.get_user(UUID(user_id))
+    # Пользователь и tenant одним запросом (или из кэшей адаптера)
+    user = database.get_user_with_tenant(user_id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     
     return user
 
 
 # Authentication endpoints
 @app.post("/auth/register", response_model=schemas.AuthResponse, status_code=status.HTTP_201_CREATED, tags=["auth"])
-def register(auth_data: schemas.AuthRegister, database: DatabaseInterface = Depends(get_database)):
+async def register(auth_data: schemas.AuthRegister, background_tasks: BackgroundTasks, database: DatabaseInterface = Depends(get_database)):
     """Регистрирует нового пользователя"""
+    # Хеширование идет в пуле процессов, синхронные запросы к БД — в пуле потоков,
+    # чтобы event loop не блокировался
+    
     # Проверяем, что email не занят
-    existing_user = database.get_user_by_email(auth_data.email)
-    if existing_user:
+    if await run_in_threadpool(database.user_email_exists, auth_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Создаем tenant
-    tenant = database.create_tenant({"name": auth_data.tenant_name})
+    tenant = await run_in_threadpool(database.create_tenant, {"name": auth_data.tenant_name})
     
     # Создаем пользователя
-    password_hash = auth_service.get_password_hash(auth_data.password)
+    password_hash = await hash_password_async(auth_data.password)
     verification_token = auth_service.generate_verification_token()
     
     user_data = {
@@ -118,13 +205,13 @@ def register(auth_data: schemas.AuthRegister, database: DatabaseInterface = Depe
         "role": auth_data.role,
         "locale": auth_data.locale,
         "is_verified": False,
-        "verification_token": verification_token
+        "verification_token": auth_service.hash_verification_token(verification_token)
     }
     
-    user = database.create_user(user_data)
+    user = await run_in_threadpool(database.create_user, user_data)
     
-    # Отправляем email для подтверждения
-    email_service.send_verification_email(auth_data.email, verification_token, auth_data.tenant_name)
+    # Отправляем email для подтверждения уже после ответа клиенту
+    enqueue_email(background_tasks, send_verification_task, auth_data.email, verification_token, auth_data.tenant_name, auth_service.BASE_URL)
     
     return schemas.AuthResponse(
         message="User registered successfully. Please check your email for verification.",
@@ -136,23 +223,30 @@ def register(auth_data: schemas.AuthRegister, database: DatabaseInterface = Depe
 
 
 @app.post("/auth/login", response_model=schemas.AuthResponse, tags=["auth"])
-def login(auth_data: schemas.AuthLogin, response: Response, database: DatabaseInterface = Depends(get_database)):
+async def login(auth_data: schemas.AuthLogin, response: Response, database: DatabaseInterface = Depends(get_database)):
     """Вход пользователя"""
     # Получаем пользователя
-    user = database.get_user_by_email(auth_data.email)
+    user = await run_in_threadpool(database.get_user_by_email, auth_data.email)
     if not user:
+        # Выравниваем время ответа с веткой проверки пароля
+        await verify_dummy_password_async()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
     # Проверяем пароль
-    if not auth_service.verify_password(auth_data.password, user["password_hash"]):
+    if not await verify_password_async(auth_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Старые bcrypt-хеши (и Argon2 с устаревшими параметрами) перехешируются при входе
+    if pwd_context.needs_update(user["password_hash"]):
+        new_hash = await hash_password_async(auth_data.password)
+        await run_in_threadpool(database.update_user_password_hash, user["id"], new_hash)
+    
     # Проверяем, что email подтвержден
     if not user["is_verified"]:
         raise HTTPException(
@@ -186,22 +280,21 @@ def login(auth_data: schemas.AuthLogin, response: Response, database: DatabaseIn
 
 
 @app.get("/auth/verify", tags=["auth"])
-def verify_email(token: str, database: DatabaseInterface = Depends(get_database)):
+def verify_email(token: str, background_tasks: BackgroundTasks, database: DatabaseInterface = Depends(get_database)):
     """Подтверждает email пользователя"""
-    user = database.get_user_by_verification_token(token)
+    # Подтверждение и сброс токена одним атомарным шагом: при двойном клике
+    # только один запрос найдет пользователя и отправит приветственное письмо
+    user = database.consume_verification_token(auth_service.hash_verification_token(token))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired verification token"
         )
     
-    # Обновляем статус пользователя
-    database.update_user_verification(user["id"], True, None)
-    
     # Отправляем приветственное письмо
     tenant = database.get_tenant(user["tenant_id"])
     if tenant:
-        email_service.send_welcome_email(user["email"], tenant["name"])
+        enqueue_email(background_tasks, send_welcome_task, user["email"], tenant["name"])
     
     return {"message": "Email verified successfully"}
 
@@ -209,11 +302,12 @@ def verify_email(token: str, database: DatabaseInterface = Depends(get_database)
 @app.post("/auth/resend-verification", tags=["auth"])
 def resend_verification_email(
     request_data: schemas.ResendVerificationEmail, 
+    background_tasks: BackgroundTasks,
     database: DatabaseInterface = Depends(get_database)
 ):
     """Повторно отправляет письмо для подтверждения email"""
-    # Проверяем, что пользователь существует
-    user = database.get_user_by_email(request_data.email)
+    # Проверяем, что пользователь существует (tenant приходит тем же запросом)
+    user = database.get_user_by_email_with_tenant(request_data.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -234,7 +328,7 @@ def resend_verification_email(
     updated_user = database.update_user_verification(
         user["id"], 
         False, 
-        new_verification_token
+        auth_service.hash_verification_token(new_verification_token)
     )
     
     if not updated_user:
@@ -244,21 +338,19 @@ def resend_verification_email(
         )
     
     # Отправляем новое письмо для подтверждения
-    tenant = database.get_tenant(user["tenant_id"])
+    tenant = user["tenant"]
     tenant_name = tenant["name"] if tenant else "Our Service"
     
-    email_sent = email_service.send_verification_email(
+    # Ошибки отправки логирует email_service: ответ не ждет SES
+    enqueue_email(
+        background_tasks,
+        send_verification_task,
         request_data.email, 
         new_verification_token, 
-        tenant_name
+        tenant_name,
+        auth_service.BASE_URL
     )
     
-    if not email_sent:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send verification email"
-        )
-    
     return {
         "message": "Verification email sent successfully",
         "email": request_data.email
@@ -266,8 +358,18 @@ def resend_verification_email(
 
 
 @app.post("/auth/logout", tags=["auth"])
-def logout(response: Response):
+def logout(
+    request: Request,
+    response: Response,
+    bearer_token: Optional[str] = Depends(security)
+):
     """Выход пользователя"""
+    if bearer_token and bearer_token.credentials:
+        token = bearer_token.credentials
+    else:
+        token = get_token_from_cookie(request)
+    if token:
+        auth_service.revoke_token(token)
     response.delete_cookie(key="session_token")
     return {"message": "Logged out successfully"}
 
@@ -295,14 +397,14 @@ def create_tenant(tenant: schemas.TenantCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/tenants/", response_model=List[schemas.TenantRead], tags=["tenants"])
-def read_tenants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    tenants = crud.get_tenants(db, skip=skip, limit=limit)
-    return tenants
+async def read_tenants(skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    tenants = await async_crud.get_tenants(db, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.TenantRead, tenants)
 
 
 @app.get("/tenants/{tenant_id}", response_model=schemas.TenantRead, tags=["tenants"])
-def read_tenant(tenant_id: UUID, db: Session = Depends(get_db)):
-    db_tenant = crud.get_tenant(db, tenant_id=tenant_id)
+async def read_tenant(tenant_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_tenant = await async_crud.get_tenant(db, tenant_id=tenant_id)
     if db_tenant is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -311,36 +413,46 @@ def read_tenant(tenant_id: UUID, db: Session = Depends(get_db)):
     return db_tenant
 
 
+@app.get("/tenants/{tenant_id}/stats", response_model=schemas.TenantStatsRead, tags=["tenants"])
+async def read_tenant_stats(tenant_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    # Данные на момент последнего обновления представления (раз в час). Tenant,
+    # созданный после REFRESH (или при схеме без представления), получает нули
+    stats = await async_crud.get_tenant_stats(db, tenant_id=tenant_id)
+    if stats is None:
+        if await async_crud.get_tenant(db, tenant_id=tenant_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Tenant not found"
+            )
+        stats = {"tenant_id": tenant_id, "sessions": 0, "insights": 0, "last_session": None}
+    return stats
+
+
 # User endpoints
 @app.post("/users/", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED, tags=["users"])
 def create_user(user: schemas.UserCreate, tenant_id: UUID, password: str, db: Session = Depends(get_db)):
-    # Verify that the tenant exists
-    db_tenant = crud.get_tenant(db, tenant_id=tenant_id)
-    if not db_tenant:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tenant not found"
-        )
+    try:
+        db_user = crud.create_user_with_password(db=db, user=user, tenant_id=tenant_id, password=password)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.User, exc, {"tenant_id": "Tenant not found"})
     
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
-    return crud.create_user_with_password(db=db, user=user, tenant_id=tenant_id, password=password)
+    return db_user
 
 
 @app.get("/users/", response_model=List[schemas.UserRead], tags=["users"])
-def read_users(tenant_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_users(db, tenant_id=tenant_id, skip=skip, limit=limit)
-    return users
+async def read_users(tenant_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    users = await async_crud.get_users(db, tenant_id=tenant_id, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.UserRead, users)
 
 
 @app.get("/users/{user_id}", response_model=schemas.UserRead, tags=["users"])
-def read_user(user_id: UUID, db: Session = Depends(get_db)):
-    db_user = crud.get_user(db, user_id=user_id)
+async def read_user(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_user = await async_crud.get_user(db, user_id=user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -352,26 +464,21 @@ def read_user(user_id: UUID, db: Session = Depends(get_db)):
 # Client endpoints
 @app.post("/clients/", response_model=schemas.ClientRead, status_code=status.HTTP_201_CREATED, tags=["clients"])
 def create_client(client: schemas.ClientCreate, tenant_id: UUID, db: Session = Depends(get_db)):
-    # Verify that the tenant exists
-    db_tenant = crud.get_tenant(db, tenant_id=tenant_id)
-    if not db_tenant:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Tenant not found"
-        )
-    
-    return crud.create_client(db=db, client=client, tenant_id=tenant_id)
+    try:
+        return crud.create_client(db=db, client=client, tenant_id=tenant_id)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.Client, exc, {"tenant_id": "Tenant not found"})
 
 
 @app.get("/clients/", response_model=List[schemas.ClientRead], tags=["clients"])
-def read_clients(tenant_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    clients = crud.get_clients(db, tenant_id=tenant_id, skip=skip, limit=limit)
-    return clients
+async def read_clients(tenant_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, tag: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    clients = await async_crud.get_clients(db, tenant_id=tenant_id, skip=skip, limit=limit, after_id=after_id, tag=tag)
+    return list_response(schemas.ClientRead, clients)
 
 
 @app.get("/clients/{client_id}", response_model=schemas.ClientRead, tags=["clients"])
-def read_client(client_id: UUID, db: Session = Depends(get_db)):
-    db_client = crud.get_client(db, client_id=client_id)
+async def read_client(client_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_client = await async_crud.get_client(db, client_id=client_id)
     if db_client is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -405,26 +512,21 @@ def delete_client(client_id: UUID, db: Session = Depends(get_db)):
 # Session endpoints
 @app.post("/sessions/", response_model=schemas.SessionRead, status_code=status.HTTP_201_CREATED, tags=["sessions"])
 def create_session(session: schemas.SessionCreate, db: Session = Depends(get_db)):
-    # Verify that the client exists
-    db_client = crud.get_client(db, client_id=session.client_id)
-    if not db_client:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Client not found"
-        )
-    
-    return crud.create_session(db=db, session=session)
+    try:
+        return crud.create_session(db=db, session=session)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.Session, exc, {"client_id": "Client not found"})
 
 
 @app.get("/sessions/", response_model=List[schemas.SessionRead], tags=["sessions"])
-def read_sessions(client_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    sessions = crud.get_sessions(db, client_id=client_id, skip=skip, limit=limit)
-    return sessions
+async def read_sessions(client_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    sessions = await async_crud.get_sessions(db, client_id=client_id, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.SessionRead, sessions)
 
 
 @app.get("/sessions/{session_id}", response_model=schemas.SessionRead, tags=["sessions"])
-def read_session(session_id: UUID, db: Session = Depends(get_db)):
-    db_session = crud.get_session(db, session_id=session_id)
+async def read_session(session_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_session = await async_crud.get_session(db, session_id=session_id)
     if db_session is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -458,35 +560,21 @@ def delete_session(session_id: UUID, db: Session = Depends(get_db)):
 # Note endpoints
 @app.post("/notes/", response_model=schemas.NoteRead, status_code=status.HTTP_201_CREATED, tags=["notes"])
 def create_note(note: schemas.NoteCreate, author_id: UUID, db: Session = Depends(get_db)):
-    # Verify that the author exists
-    db_user = crud.get_user(db, user_id=author_id)
-    if not db_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Author not found"
-        )
-    
-    # Verify that the session exists if provided
-    if note.session_id:
-        db_session = crud.get_session(db, session_id=note.session_id)
-        if not db_session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Session not found"
-            )
-    
-    return crud.create_note(db=db, note=note, author_id=author_id)
+    try:
+        return crud.create_note(db=db, note=note, author_id=author_id)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.Note, exc, {"author_id": "Author not found", "session_id": "Session not found"})
 
 
 @app.get("/notes/", response_model=List[schemas.NoteRead], tags=["notes"])
-def read_notes(session_id: UUID = None, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    notes = crud.get_notes(db, session_id=session_id, skip=skip, limit=limit)
-    return notes
+async def read_notes(session_id: UUID = None, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    notes = await async_crud.get_notes(db, session_id=session_id, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.NoteRead, notes)
 
 
 @app.get("/notes/{note_id}", response_model=schemas.NoteRead, tags=["notes"])
-def read_note(note_id: UUID, db: Session = Depends(get_db)):
-    db_note = crud.get_note(db, note_id=note_id)
+async def read_note(note_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_note = await async_crud.get_note(db, note_id=note_id)
     if db_note is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -520,26 +608,21 @@ def delete_note(note_id: UUID, db: Session = Depends(get_db)):
 # Media endpoints
 @app.post("/media/", response_model=schemas.MediaRead, status_code=status.HTTP_201_CREATED, tags=["media"])
 def create_media(media: schemas.MediaCreate, db: Session = Depends(get_db)):
-    # Verify that the session exists
-    db_session = crud.get_session(db, session_id=media.session_id)
-    if not db_session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Session not found"
-        )
-    
-    return crud.create_media(db=db, media=media)
+    try:
+        return crud.create_media(db=db, media=media)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.Media, exc, {"session_id": "Session not found"})
 
 
 @app.get("/media/", response_model=List[schemas.MediaRead], tags=["media"])
-def read_media_by_session(session_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    media = crud.get_media_by_session(db, session_id=session_id, skip=skip, limit=limit)
-    return media
+async def read_media_by_session(session_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    media = await async_crud.get_media_by_session(db, session_id=session_id, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.MediaRead, media)
 
 
 @app.get("/media/{media_id}", response_model=schemas.MediaRead, tags=["media"])
-def read_media(media_id: UUID, db: Session = Depends(get_db)):
-    db_media = crud.get_media(db, media_id=media_id)
+async def read_media(media_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_media = await async_crud.get_media(db, media_id=media_id)
     if db_media is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -573,31 +656,44 @@ def delete_media(media_id: UUID, db: Session = Depends(get_db)):
 # AIInsight endpoints
 @app.post("/ai-insights/", response_model=schemas.AIInsightRead, status_code=status.HTTP_201_CREATED, tags=["ai-insights"])
 def create_ai_insight(insight: schemas.AIInsightCreate, db: Session = Depends(get_db)):
-    # Verify that the session exists
-    db_session = crud.get_session(db, session_id=insight.session_id)
-    if not db_session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Session not found"
-        )
-    
-    return crud.create_ai_insight(db=db, insight=insight)
+    try:
+        return crud.create_ai_insight(db=db, insight=insight)
+    except IntegrityError as exc:
+        raise _reference_not_found(models.AIInsight, exc, {"session_id": "Session not found"})
 
 
 @app.get("/ai-insights/", response_model=List[schemas.AIInsightRead], tags=["ai-insights"])
-def read_ai_insights_by_session(session_id: UUID, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    insights = crud.get_ai_insights_by_session(db, session_id=session_id, skip=skip, limit=limit)
-    return insights
+async def read_ai_insights_by_session(session_id: UUID, skip: int = 0, limit: int = 100, after_id: Optional[UUID] = None, db: AsyncSession = Depends(get_async_db)):
+    insights = await async_crud.get_ai_insights_by_session(db, session_id=session_id, skip=skip, limit=limit, after_id=after_id)
+    return list_response(schemas.AIInsightRead, insights)
 
 
 @app.get("/ai-insights/{insight_id}", response_model=schemas.AIInsightRead, tags=["ai-insights"])
-def read_ai_insight(insight_id: UUID, db: Session = Depends(get_db)):
-    db_insight = crud.get_ai_insight(db, insight_id=insight_id)
+async def read_ai_insight(insight_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    db_insight = await async_crud.get_ai_insight(db, insight_id=insight_id)
+    if db_insight is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="AI Insight not found"
+        )
+    return db_insight
+
+
+@app.get("/ai-insights/{insight_id}/embedding", response_model=schemas.AIInsightReadWithEmbedding, tags=["ai-insights"])
+async def read_ai_insight_embedding(insight_id: UUID, format: Literal["json", "binary"] = "json", db: AsyncSession = Depends(get_async_db)):
+    db_insight = await async_crud.get_ai_insight(db, insight_id=insight_id, with_embedding=True)
     if db_insight is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="AI Insight not found"
         )
+    if format == "binary":
+        # Сырые float32 little-endian без перевода 1536 чисел в текст
+        embedding = db_insight.embedding
+        if embedding is None:
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        values = embedding.to_numpy() if hasattr(embedding, "to_numpy") else embedding
+        return Response(content=np.asarray(values, dtype="<f4").tobytes(), media_type="application/octet-stream")
     return db_insight
 
 
@@ -0,0 +1,19 @@
+from app.infrastructure.database.request_cache import start_request_cache, reset_request_cache
+
+
+class RequestCacheMiddleware:
+    """ASGI middleware, создающий пустой кэш чтений на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = start_request_cache()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_request_cache(token)
@@ -0,0 +1,55 @@
+import logging
+import dramatiq
+from dramatiq.brokers.redis import RedisBroker
+from dramatiq.brokers.stub import StubBroker
+from fastapi import BackgroundTasks
+from app.config import settings
+from app.infrastructure.external.email_service import email_service
+
+logger = logging.getLogger(__name__)
+
+# Письма уходят в отдельный пул воркеров (`dramatiq app.tasks.email`) и не занимают
+# воркеры API. Без брокера задачи выполняются в процессе API через BackgroundTasks
+QUEUE_ENABLED = bool(settings.email_broker_url)
+
+if QUEUE_ENABLED:
+    dramatiq.set_broker(RedisBroker(url=settings.email_broker_url))
+    logger.info("✅ Email queue broker initialized successfully")
+else:
+    dramatiq.set_broker(StubBroker())
+    logger.warning("⚠️ EMAIL_BROKER_URL not provided, emails will be sent in-process")
+
+
+class EmailDeliveryError(Exception):
+    """Письмо не отправлено: исключение из актора запускает повтор в Dramatiq"""
+
+
+@dramatiq.actor(queue_name="email", max_retries=3)
+def send_verification_task(to_email: str, verification_token: str, tenant_name: str, base_url: str = "http://localhost:8000"):
+    """Отправляет письмо для подтверждения email"""
+    # email_service ловит ошибки SES и возвращает False — без исключения повтора не будет
+    if not email_service.send_verification_email(to_email, verification_token, tenant_name, base_url):
+        raise EmailDeliveryError(f"Verification email to {to_email} was not sent")
+
+
+@dramatiq.actor(queue_name="email", max_retries=3)
+def send_welcome_task(to_email: str, tenant_name: str):
+    """Отправляет приветственное письмо"""
+    if not email_service.send_welcome_email(to_email, tenant_name):
+        raise EmailDeliveryError(f"Welcome email to {to_email} was not sent")
+
+
+# Без брокера письмо отправляет async-вариант метода прямо в event loop-е API,
+# не занимая поток пула на время запроса к SES
+_IN_PROCESS_SENDERS = {
+    send_verification_task.actor_name: "send_verification_email_async",
+    send_welcome_task.actor_name: "send_welcome_email_async",
+}
+
+
+def enqueue_email(background_tasks: BackgroundTasks, actor: dramatiq.Actor, *args) -> None:
+    """Ставит письмо в очередь брокера или, без брокера, в BackgroundTasks запроса"""
+    if QUEUE_ENABLED:
+        actor.send(*args)
+    else:
+        background_tasks.add_task(getattr(email_service, _IN_PROCESS_SENDERS[actor.actor_name]), *args)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Замер времени хеширования пароля Argon2id с продакшен-параметрами (значения по
+умолчанию Settings, а не текущее окружение). Бюджет интерактивного входа — 500 мс:
+
+    python scripts/benchmark_password_hashing.py
+"""
+
+import os
+import sys
+import time
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.hash import argon2
+from app.config import Settings
+
+BUDGET_MS = 500
+ROUNDS = 5
+
+
+def main():
+    defaults = Settings.model_fields
+    hasher = argon2.using(
+        memory_cost=defaults["argon2_memory_cost"].default,
+        time_cost=defaults["argon2_time_cost"].default,
+        parallelism=defaults["argon2_parallelism"].default,
+    )
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        hasher.hash("benchmark-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    
+    median_ms = sorted(timings)[ROUNDS // 2]
+    print(f"Argon2id: медиана {median_ms:.0f} мс за {ROUNDS} замеров (бюджет {BUDGET_MS} мс)")
+    if median_ms >= BUDGET_MS:
+        print("❌ Хеширование не укладывается в бюджет")
+        sys.exit(1)
+    print("✅ Хеширование укладывается в бюджет")
+
+
+if __name__ == "__main__":
+    main()
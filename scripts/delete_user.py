@@ -9,17 +9,14 @@ import sys
 # Добавляем корневую директорию проекта в sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+from app.infrastructure.database.database import get_session_local
 from app.infrastructure.database.database_factory import DatabaseFactory
 from app.infrastructure.database.mock_database import MockDatabase
-from app.config import settings
 
 def get_db_session():
-    """Создает сессию базы данных"""
-    engine = create_engine(settings.database_url)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return SessionLocal()
+    """Создает сессию базы данных (общий engine и пул приложения, без пересоздания)"""
+    return get_session_local()()
 
 def delete_user_by_email(email: str, use_mock: bool = False):
     """
@@ -64,8 +61,8 @@ def delete_user_by_email(email: str, use_mock: bool = False):
         
         try:
             # Удаляем из email mapping
-            if hasattr(db, 'email_to_user') and email in db.email_to_user:
-                del db.email_to_user[email]
+            if hasattr(db, 'string_index') and ("email", email) in db.string_index:
+                del db.string_index[("email", email)]
                 print("   ✅ Удален из email mapping")
             
             # Удаляем пользователя
@@ -77,7 +74,7 @@ def delete_user_by_email(email: str, use_mock: bool = False):
             tenant_id = user.get('tenant_id')
             if tenant_id and hasattr(db, 'tenants'):
                 # Проверяем, есть ли еще пользователи в этом tenant
-                other_users = [u for u in db.users.values() if u.get('tenant_id') == tenant_id]
+                other_users = [u for u in db.users.values() if u.tenant_id == tenant_id]
                 if not other_users and tenant_id in db.tenants:
                     del db.tenants[tenant_id]
                     print(f"   ✅ Удален tenant {tenant_id} (больше не используется)")
@@ -133,25 +130,30 @@ def delete_user_by_email(email: str, use_mock: bool = False):
             # Удаляем пользователя
             print(f"\n🗑️ Удаление пользователя...")
             
-            # Удаляем пользователя
-            delete_user_query = text("DELETE FROM users WHERE email = :email")
-            result = db_session.execute(delete_user_query, {"email": email})
+            # Удаляем пользователя и ставший пустым tenant одним запросом.
+            # Все части CTE видят один снимок, поэтому удаляемая строка исключается по email
+            delete_query = text("""
+                WITH deleted AS (
+                    DELETE FROM users WHERE email = :email RETURNING tenant_id
+                ),
+                orphan AS (
+                    SELECT d.tenant_id FROM deleted d
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM users u WHERE u.tenant_id = d.tenant_id AND u.email <> :email
+                    )
+                ),
+                deleted_tenants AS (
+                    DELETE FROM tenants WHERE id IN (SELECT tenant_id FROM orphan) RETURNING id
+                )
+                SELECT (SELECT count(*) FROM deleted) AS users_deleted,
+                       (SELECT id FROM deleted_tenants) AS tenant_id
+            """)
+            result = db_session.execute(delete_query, {"email": email}).one()
             
-            if result.rowcount > 0:
+            if result.users_deleted > 0:
                 print("   ✅ Пользователь удален из базы данных")
-                
-                # Проверяем, нужно ли удалить tenant
-                if user_data.tenant_id:
-                    # Проверяем, есть ли еще пользователи в этом tenant
-                    check_tenant_query = text("SELECT COUNT(*) FROM users WHERE tenant_id = :tenant_id")
-                    result = db_session.execute(check_tenant_query, {"tenant_id": user_data.tenant_id})
-                    user_count = result.scalar()
-                    
-                    if user_count == 0:
-                        # Удаляем tenant
-                        delete_tenant_query = text("DELETE FROM tenants WHERE id = :tenant_id")
-                        db_session.execute(delete_tenant_query, {"tenant_id": user_data.tenant_id})
-                        print(f"   ✅ Tenant {user_data.tenant_id} удален (больше не используется)")
+                if result.tenant_id:
+                    print(f"   ✅ Tenant {result.tenant_id} удален (больше не используется)")
                 
                 # Подтверждаем изменения
                 db_session.commit()
@@ -185,10 +187,10 @@ def list_all_users(use_mock: bool = False):
         
         for user_id, user in db.users.items():
             print(f"ID: {user_id}")
-            print(f"Email: {user['email']}")
-            print(f"Role: {user['role']}")
-            print(f"Verified: {user['is_verified']}")
-            print(f"Created: {user['created_at']}")
+            print(f"Email: {user.email}")
+            print(f"Role: {user.role}")
+            print(f"Verified: {user.is_verified}")
+            print(f"Created: {user.created_at}")
             print("-" * 80)
     
     else:
@@ -205,24 +207,31 @@ def list_all_users(use_mock: bool = False):
                 ORDER BY u.created_at DESC
             """)
             
-            result = db_session.execute(query)
-            users = result.fetchall()
+            # Серверный курсор и пачки по 1000 строк: одна запись в stdout на пачку
+            result = db_session.execute(query.execution_options(yield_per=1000))
+            separator = "-" * 80
+            total = 0
             
-            if not users:
+            for chunk in result.mappings().partitions():
+                if not total:
+                    print(separator)
+                total += len(chunk)
+                sys.stdout.write("".join(
+                    f"ID: {user['id']}\n"
+                    f"Email: {user['email']}\n"
+                    f"Role: {user['role']}\n"
+                    f"Verified: {user['is_verified']}\n"
+                    f"Created: {user['created_at']}\n"
+                    f"Tenant: {user['tenant_name'] or 'N/A'}\n"
+                    f"{separator}\n"
+                    for user in chunk
+                ))
+            
+            if not total:
                 print("📭 База данных пуста")
                 return
             
-            print(f"\nНайдено пользователей: {len(users)}")
-            print("-" * 80)
-            
-            for user in users:
-                print(f"ID: {user.id}")
-                print(f"Email: {user.email}")
-                print(f"Role: {user.role}")
-                print(f"Verified: {user.is_verified}")
-                print(f"Created: {user.created_at}")
-                print(f"Tenant: {user.tenant_name or 'N/A'}")
-                print("-" * 80)
+            print(f"\nНайдено пользователей: {total}")
                 
         except Exception as e:
             print(f"❌ Ошибка при получении списка пользователей: {e}")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Обновляет материализованное представление tenant_stats.
+Запускается по расписанию, например из cron раз в час:
+
+    0 * * * * cd /app && python scripts/refresh_tenant_stats.py
+"""
+
+import os
+import sys
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.infrastructure.database import crud
+from app.infrastructure.database.database import get_session_local
+
+
+def main():
+    db = get_session_local()()
+    try:
+        crud.refresh_tenant_stats(db)
+        print("✅ tenant_stats обновлено")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
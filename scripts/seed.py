@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Скрипт для наполнения базы тестовыми данными.
+Клиенты, сессии, заметки и инсайты загружаются через COPY ... FROM STDIN:
+одна команда на таблицу вместо INSERT на каждую строку.
+
+Использование: python scripts/seed.py [клиентов] [сессий на клиента] [инсайтов на сессию]
+"""
+
+import csv
+import io
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.application import schemas
+from app.infrastructure.database import crud
+from app.infrastructure.database.database import get_engine, get_session_local
+from app.infrastructure.database.ids import uuid7
+
+EMBEDDING_DIM = 1536
+
+
+def _copy(cursor, table: str, columns: tuple, rows) -> int:
+    """Загружает строки в таблицу одной командой COPY (CSV через буфер в памяти)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return count
+
+
+def _pg_array(values) -> str:
+    """Литерал массива PostgreSQL для COPY: {a,b}"""
+    return "{" + ",".join(f'"{value}"' for value in values) + "}"
+
+
+def _embedding(rng: random.Random) -> str:
+    """Случайный эмбеддинг в текстовом формате pgvector: [x,y,...]"""
+    return "[" + ",".join(f"{rng.uniform(-1, 1):.4f}" for _ in range(EMBEDDING_DIM)) + "]"
+
+
+def seed(clients_count: int = 100, sessions_per_client: int = 10, insights_per_session: int = 2):
+    """Создает tenant, владельца и пачку клиентов с сессиями, заметками и инсайтами"""
+    suffix = uuid4().hex[:8]
+    db = get_session_local()()
+    try:
+        tenant = crud.create_tenant(db, schemas.TenantCreate(name=f"Seed Practice {suffix}"))
+        owner = crud.create_user_with_password(
+            db,
+            schemas.UserCreate(email=f"seed-{suffix}@example.com", role="owner"),
+            tenant_id=tenant.id,
+            password="seed-password",
+        )
+        tenant_id, owner_id = tenant.id, owner.id
+    finally:
+        db.close()
+
+    rng = random.Random(suffix)
+    now = datetime.now(timezone.utc)
+    client_ids = [uuid7() for _ in range(clients_count)]
+    session_ids = [(uuid7(), client_id) for client_id in client_ids for _ in range(sessions_per_client)]
+
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        clients = _copy(cursor, "clients", ("id", "tenant_id", "full_name", "tags"), (
+            (client_id, tenant_id, f"Client {index}", _pg_array(rng.sample(["new", "therapy", "family", "online"], 2)))
+            for index, client_id in enumerate(client_ids)
+        ))
+        sessions = _copy(cursor, "sessions", ("id", "client_id", "scheduled_at", "duration_min", "status"), (
+            (session_id, client_id, (now - timedelta(days=rng.randint(0, 365))).isoformat(), 50, "done")
+            for session_id, client_id in session_ids
+        ))
+        notes = _copy(cursor, "notes", ("id", "session_id", "author_id", "body_md"), (
+            (uuid7(), session_id, owner_id, f"# Заметка\n\nСессия {session_id}")
+            for session_id, _ in session_ids
+        ))
+        insights = _copy(cursor, "ai_insights", ("id", "session_id", "kind", "content_json", "embedding"), (
+            (uuid7(), session_id, "summary", '{"summary": "seed"}', _embedding(rng))
+            for session_id, _ in session_ids
+            for _ in range(insights_per_session)
+        ))
+        connection.commit()
+    finally:
+        connection.close()
+
+    print(f"✅ Tenant {tenant_id}: клиентов {clients}, сессий {sessions}, заметок {notes}, инсайтов {insights}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    seed(*args)
@@ -10,29 +10,34 @@ import sys
 # Добавляем корневую директорию проекта в sys.path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import ProgrammingError
 from app.infrastructure.database.database import get_engine
 from app.infrastructure.database.models import Base
 from app.config import settings
 
+DUPLICATE_DATABASE = "42P04"
+
 def create_database():
     """Create the database if it doesn't exist."""
     # Connect to PostgreSQL server (not to a specific database)
-    db_url = settings.database_url
-    db_name = db_url.split('/')[-1]
-    server_url = '/'.join(db_url.split('/')[:-1]) + '/postgres'
+    db_url = make_url(settings.database_url)
+    db_name = db_url.database
+    server_url = db_url.set(database="postgres")
     
     try:
-        # Connect to default postgres database
-        engine_server = create_engine(server_url)
+        # CREATE DATABASE нельзя выполнить внутри транзакции, поэтому AUTOCOMMIT
+        engine_server = create_engine(server_url, isolation_level="AUTOCOMMIT")
         with engine_server.connect() as conn:
-            # Check if database exists
-            result = conn.execute(text(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}'"))
-            if not result.fetchone():
-                # Create database
-                conn.execute(text(f"CREATE DATABASE {db_name}"))
+            # Имя базы экранируется как идентификатор; существующая база — код 42P04
+            quoted_name = conn.dialect.identifier_preparer.quote(db_name)
+            try:
+                conn.exec_driver_sql(f"CREATE DATABASE {quoted_name}")
                 print(f"Database '{db_name}' created successfully!")
-            else:
+            except ProgrammingError as e:
+                if getattr(e.orig, "pgcode", None) != DUPLICATE_DATABASE:
+                    raise
                 print(f"Database '{db_name}' already exists.")
         engine_server.dispose()
     except Exception as e:
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Переключает ANN-индекс по ai_insights.embedding между HNSW и IVFFlat.
+Миграции всегда создают HNSW; IVFFlat строится в разы быстрее и удобен на время
+массовой загрузки, после которой индекс обычно возвращают обратно:
+
+    python scripts/switch_vector_index.py ivfflat
+    python scripts/switch_vector_index.py hnsw
+
+Новый индекс строится CONCURRENTLY до удаления старого, поиск не остается без индекса.
+"""
+
+import argparse
+import os
+import sys
+from typing import get_args
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.config import Settings, settings
+from app.infrastructure.database.database import get_engine
+
+_INDEXES = {
+    "hnsw": (
+        "ix_ai_insights_embedding_hnsw",
+        "USING hnsw (embedding halfvec_cosine_ops) WITH (m = 24, ef_construction = 128)",
+    ),
+    "ivfflat": (
+        "ix_ai_insights_embedding_ivfflat",
+        f"USING ivfflat (embedding halfvec_cosine_ops) WITH (lists = {settings.ivfflat_lists})",
+    ),
+}
+
+
+def switch_vector_index(target: str) -> None:
+    name, definition = _INDEXES[target]
+    # CREATE/DROP INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET maintenance_work_mem = '2GB'"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON ai_insights {definition}"))
+        for other, (other_name, _) in _INDEXES.items():
+            if other != target:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other_name}"))
+    print(f"✅ Индекс по embedding переключен на {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Переключение ANN-индекса по ai_insights.embedding")
+    parser.add_argument(
+        "target",
+        nargs="?",
+        choices=get_args(Settings.model_fields["vector_index_type"].annotation),
+        default=settings.vector_index_type,
+        help="Тип индекса (по умолчанию VECTOR_INDEX_TYPE)",
+    )
+    switch_vector_index(parser.parse_args().target)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import os
+
+# Дешевые параметры Argon2id (и bcrypt для старых хешей) для тестов: задаются до импорта app.config, так как
+# CryptContext создается при импорте. В продакшене остаются значения из settings.
+os.environ.setdefault("ARGON2_MEMORY_COST", "8")
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ.setdefault("ARGON2_PARALLELISM", "1")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+
+def pytest_configure(config):
+    # Маркеры pytest-xdist и pytest-recording; регистрируем сами, чтобы без плагинов не было PytestUnknownMarkWarning
+    config.addinivalue_line("markers", "xdist_group(name): тесты группы выполняются одним воркером xdist")
+    config.addinivalue_line("markers", "vcr: ответы записываются и проигрываются через pytest-recording")
@@ -0,0 +1,71 @@
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+# Записанные ответы (pytest-recording / vcrpy) хранятся только локально и лежат вне git:
+# в запросах к SES есть адреса и подписи AWS. В CI кассет нет — там тесты идут в сеть.
+CASSETTE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "cassettes")
+
+# Кассета старше недели удаляется при сборе модуля и записывается заново при следующем прогоне
+CASSETTE_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+@pytest.fixture(scope="module")
+def vcr_config(pytestconfig):
+    """
+    Первый прогон пишет реальные ответы сервера и SES, следующие проигрывают их
+    без сети. --record-mode из командной строки (make test-integration-record
+    передает rewrite) важнее значения по умолчанию once
+    """
+    config = {
+        "match_on": ["method", "scheme", "host", "port", "path", "query"],
+        "filter_headers": ["authorization", "x-amz-date", "x-amz-security-token", "cookie", "set-cookie"],
+        "filter_post_data_parameters": ["Source", "Destination.ToAddresses.member.1"],
+        "decode_compressed_response": True,
+    }
+    if pytestconfig.getoption("--record-mode", None) is None:
+        # record_mode из vcr_config перекрывает и флаг командной строки, поэтому только по умолчанию
+        config["record_mode"] = "once"
+    return config
+
+
+@pytest.fixture(scope="module")
+def vcr_cassette_dir(request):
+    """Кассеты каждого модуля — в своей папке: tests/fixtures/cassettes/<модуль>/ (устаревшие удаляются)"""
+    path = os.path.join(CASSETTE_DIR, request.module.__name__.rsplit(".", 1)[-1])
+    if os.path.isdir(path):
+        expired_before = time.time() - CASSETTE_MAX_AGE_SECONDS
+        for name in os.listdir(path):
+            cassette = os.path.join(path, name)
+            if os.path.getmtime(cassette) < expired_before:
+                os.remove(cassette)
+    return path
+
+
+@pytest.fixture(scope="module")
+def module_cassette(pytestconfig, vcr_config, vcr_cassette_dir):
+    """
+    Кассета для модульных фикстур: pytest-recording открывает свою кассету только
+    на время теста, а модульные фикстуры поднимаются раньше нее
+    """
+    @contextmanager
+    def _use(name: str):
+        try:
+            import vcr
+        except ImportError:
+            # Без vcrpy запросы просто идут в сеть, как и в самих тестах
+            yield None
+            return
+        config = dict(vcr_config)
+        config.setdefault("record_mode", pytestconfig.getoption("--record-mode", None) or "once")
+        if config["record_mode"] == "rewrite":
+            # rewrite — режим pytest-recording, у vcrpy его нет: удаляем кассету и пишем заново
+            path = os.path.join(vcr_cassette_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+            config["record_mode"] = "new_episodes"
+        with vcr.VCR(cassette_library_dir=vcr_cassette_dir).use_cassette(name, **config) as cassette:
+            yield cassette
+    return _use
@@ -4,66 +4,98 @@ Integration tests for the FastAPI application.
 These tests require the server to be running.
 """
 
+import logging
+import socket
+
 import pytest
-import requests
-import json
-import time
+import httpx
 from uuid import uuid4
 
 BASE_URL = "http://localhost:8000"
+SERVER_ADDRESS = ("localhost", 8000)
 
-def test_health():
-    """Test the health endpoint."""
-    print("Testing health endpoint...")
+# Диагностика — на уровне DEBUG, как в unit тестах
+logger = logging.getLogger(__name__)
+
+
+def _server_up() -> bool:
+    """Одна TCP-проба при сборе модуля вместо неудачного подключения в каждом тесте"""
     try:
-        response = requests.get(f"{BASE_URL}/health")
-        print(f"Response: {response.json()}")
-        if response.status_code == 200:
-            print("✅ Health check passed")
-            assert True
-        else:
-            print(f"❌ Health check failed: {response.status_code}")
-            assert False
-    except requests.exceptions.ConnectionError:
-        print("❌ Could not connect to the server. Make sure it's running.")
-        pytest.skip("Server not running")
-
-def test_create_tenant():
-    """Test creating a tenant."""
-    print("\nTesting tenant creation...")
+        with socket.create_connection(SERVER_ADDRESS, timeout=0.2):
+            return True
+    except OSError:
+        return False
+
+
+# При make test-parallel (--dist loadgroup) модуль целиком уходит одному воркеру,
+# чтобы tenant_id создавался один раз; ответы сервера записываются в кассеты (vcr).
+# Без сервера модуль пропускается целиком: кассеты ускоряют только локальные прогоны.
+pytestmark = [
+    pytest.mark.xdist_group("api"),
+    pytest.mark.vcr,
+    pytest.mark.skipif(not _server_up(), reason="Server not running on localhost:8000"),
+]
+
+
+@pytest.fixture(scope="module")
+def http():
+    """
+    Один клиент на модуль: keep-alive соединения переиспользуются между тестами,
+    Content-Type задан на клиенте, неудачные подключения повторяются транспортом
+    """
+    # HTTP/2 не включаем: uvicorn отдает только HTTP/1.1, мультиплексировать нечего
+    transport = httpx.HTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30),
+    )
+    with httpx.Client(
+        base_url=BASE_URL,
+        transport=transport,
+        timeout=5.0,
+        headers={"Content-Type": "application/json"},
+    ) as client:
+        yield client
+
+
+def _create_tenant(http) -> str:
     tenant_data = {
         "name": f"Test Organization {uuid4().hex[:8]}",
         "description": "Test organization for integration tests"
     }
-    
-    try:
-        response = requests.post(
-            f"{BASE_URL}/tenants/",
-            json=tenant_data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 201:
-            tenant = response.json()
-            print(f"✅ Tenant created successfully: {tenant['name']}")
-            assert tenant['id'] is not None
-            return tenant['id']
-        else:
-            print(f"❌ Tenant creation failed: {response.status_code}")
-            print(f"Response: {response.text}")
-            assert False
-    except Exception as e:
-        print(f"❌ Error creating tenant: {e}")
-        pytest.skip("Server not running")
-
-def test_create_user():
+    response = http.post("/tenants/", json=tenant_data)
+    assert response.status_code == 201, f"Tenant creation failed: {response.status_code} {response.text}"
+    return response.json()["id"]
+
+
+@pytest.fixture(scope="module")
+def tenant_id(http, module_cassette):
+    """
+    Один tenant на модуль для тестов пользователей и клиентов. POST идет через
+    собственную кассету: иначе при проигрывании tenant создавался бы заново и
+    запросы тестов с новым tenant_id не совпадали бы с записанными
+    """
+    with module_cassette("tenant_id.yaml"):
+        return _create_tenant(http)
+
+
+def test_health(http):
+    """Test the health endpoint."""
+    logger.debug("Testing health endpoint...")
+    response = http.get("/health")
+    assert response.status_code == 200, f"Health check failed: {response.status_code}"
+    logger.debug("Response: %s", response.content)
+    logger.debug("✅ Health check passed")
+
+def test_create_tenant(http):
+    """Test creating a tenant."""
+    logger.debug("\nTesting tenant creation...")
+    tenant_id = _create_tenant(http)
+    logger.debug(f"✅ Tenant created successfully: {tenant_id}")
+    assert tenant_id is not None
+
+def test_create_user(http, tenant_id):
     """Test creating a user."""
-    print("\nTesting user creation...")
-    
-    # First create a tenant
-    tenant_id = test_create_tenant()
-    if not tenant_id:
-        pytest.skip("Could not create tenant for user test")
+    logger.debug("\nTesting user creation...")
     
     user_data = {
         "email": f"test{uuid4().hex[:8]}@example.com",
@@ -71,55 +103,28 @@ def test_create_user():
         "locale": "en"
     }
     
-    try:
-        response = requests.post(
-            f"{BASE_URL}/users/?tenant_id={tenant_id}&password=testpassword123",
-            json=user_data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 201:
-            user = response.json()
-            print(f"✅ User created successfully: {user['email']}")
-            assert user['id'] is not None
-        else:
-            print(f"❌ User creation failed: {response.status_code}")
-            print(f"Response: {response.text}")
-            assert False
-    except Exception as e:
-        print(f"❌ Error creating user: {e}")
-        pytest.skip("Server not running")
-
-def test_get_users():
+    response = http.post(
+        f"/users/?tenant_id={tenant_id}&password=testpassword123",
+        json=user_data
+    )
+    assert response.status_code == 201, f"User creation failed: {response.status_code} {response.text}"
+    user = response.json()
+    logger.debug(f"✅ User created successfully: {user['email']}")
+    assert user['id'] is not None
+
+def test_get_users(http, tenant_id):
     """Test getting all users."""
-    print("\nTesting get users...")
+    logger.debug("\nTesting get users...")
     
-    # First create a tenant
-    tenant_id = test_create_tenant()
-    if not tenant_id:
-        pytest.skip("Could not create tenant for get users test")
-    
-    try:
-        response = requests.get(f"{BASE_URL}/users/?tenant_id={tenant_id}")
-        if response.status_code == 200:
-            users = response.json()
-            print(f"✅ Retrieved {len(users)} users")
-            assert isinstance(users, list)
-        else:
-            print(f"❌ Get users failed: {response.status_code}")
-            assert False
-    except Exception as e:
-        print(f"❌ Error getting users: {e}")
-        pytest.skip("Server not running")
-
-def test_create_client():
+    response = http.get(f"/users/?tenant_id={tenant_id}")
+    assert response.status_code == 200, f"Get users failed: {response.status_code}"
+    users = response.json()
+    logger.debug(f"✅ Retrieved {len(users)} users")
+    assert isinstance(users, list)
+
+def test_create_client(http, tenant_id):
     """Test creating a client."""
-    print("\nTesting client creation...")
-    
-    # First create a tenant
-    tenant_id = test_create_tenant()
-    if not tenant_id:
-        pytest.skip("Could not create tenant for client test")
+    logger.debug("\nTesting client creation...")
     
     client_data = {
         "full_name": "John Doe",
@@ -127,43 +132,21 @@ def test_create_client():
         "tags": ["new", "therapy"]
     }
     
-    try:
-        response = requests.post(
-            f"{BASE_URL}/clients/?tenant_id={tenant_id}",
-            json=client_data,
-            headers={"Content-Type": "application/json"}
-        )
-        
-        if response.status_code == 201:
-            client = response.json()
-            print(f"✅ Client created successfully: {client['full_name']}")
-            assert client['id'] is not None
-        else:
-            print(f"❌ Client creation failed: {response.status_code}")
-            print(f"Response: {response.text}")
-            assert False
-    except Exception as e:
-        print(f"❌ Error creating client: {e}")
-        pytest.skip("Server not running")
-
-def test_get_clients():
+    response = http.post(
+        f"/clients/?tenant_id={tenant_id}",
+        json=client_data
+    )
+    assert response.status_code == 201, f"Client creation failed: {response.status_code} {response.text}"
+    client = response.json()
+    logger.debug(f"✅ Client created successfully: {client['full_name']}")
+    assert client['id'] is not None
+
+def test_get_clients(http, tenant_id):
     """Test getting all clients."""
-    print("\nTesting get clients...")
+    logger.debug("\nTesting get clients...")
     
-    # First create a tenant
-    tenant_id = test_create_tenant()
-    if not tenant_id:
-        pytest.skip("Could not create tenant for get clients test")
-    
-    try:
-        response = requests.get(f"{BASE_URL}/clients/?tenant_id={tenant_id}")
-        if response.status_code == 200:
-            clients = response.json()
-            print(f"✅ Retrieved {len(clients)} clients")
-            assert isinstance(clients, list)
-        else:
-            print(f"❌ Get clients failed: {response.status_code}")
-            assert False
-    except Exception as e:
-        print(f"❌ Error getting clients: {e}")
-        pytest.skip("Server not running") 
+    response = http.get(f"/clients/?tenant_id={tenant_id}")
+    assert response.status_code == 200, f"Get clients failed: {response.status_code}"
+    clients = response.json()
+    logger.debug(f"✅ Retrieved {len(clients)} clients")
+    assert isinstance(clients, list)
@@ -9,6 +9,11 @@ import pytest
 from app.infrastructure.external.email_service import EmailService
 from app.config import settings
 
+# Ответы SES записываются в локальную кассету при первом прогоне и дальше проигрываются
+# без сети. Тест пропускается до первого запроса, если не заданы AWS_* и TEST_EMAIL,
+# поэтому и проигрывание требует этих переменных (для кассеты ключи могут быть любыми)
+pytestmark = pytest.mark.vcr
+
 def test_email_sending():
     """Тестирует отправку реальных писем"""
     
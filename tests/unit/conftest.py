@@ -0,0 +1,79 @@
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app as fastapi_app
+from app.infrastructure.database.database_factory import DatabaseFactory
+from app.infrastructure.database.mock_database import MockDatabase
+from app.infrastructure.external.email_service import email_service
+
+
+class _OrjsonTestClient(TestClient):
+    """TestClient, у ответов которого response.json() разбирается через orjson, а не stdlib json"""
+
+    def request(self, *args, **kwargs):
+        response = super().request(*args, **kwargs)
+        response.json = lambda **_: orjson.loads(response.content)
+        return response
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    Приложение импортируется один раз за прогон. База выбирается на каждый запрос
+    через DatabaseFactory, поэтому подмена create_database работает и для общего app
+    """
+    return fastapi_app
+
+
+@pytest.fixture(scope="session")
+def _shared_client(app):
+    """
+    Один TestClient на весь прогон: приложение и middleware собираются один раз.
+    Внутри with клиент держит один event loop (portal) на все запросы, а не
+    поднимает новый на каждый вызов; lifespan приложения тоже отрабатывает
+    """
+    with _OrjsonTestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def client(_shared_client):
+    """Общий клиент без cookies предыдущего теста (session_token после login)"""
+    _shared_client.cookies.clear()
+    return _shared_client
+
+
+@pytest.fixture(scope="session")
+def shared_mock_db():
+    """Одна мок-база на весь прогон: создается один раз и очищается перед каждым тестом"""
+    return MockDatabase()
+
+
+@pytest.fixture
+def mock_db(shared_mock_db):
+    shared_mock_db.clear()
+    return shared_mock_db
+
+
+@pytest.fixture(scope="module")
+def _module_patches(shared_mock_db):
+    """Мок-база вместо DatabaseFactory и отправка писем без SES — одним ExitStack на модуль"""
+    with ExitStack() as stack:
+        stack.enter_context(patch.object(DatabaseFactory, "create_database", return_value=shared_mock_db))
+        yield SimpleNamespace(
+            send_verification_email=stack.enter_context(
+                patch.object(email_service, "send_verification_email", return_value=True)
+            ),
+            send_welcome_email=stack.enter_context(
+                patch.object(email_service, "send_welcome_email", return_value=True)
+            ),
+        )
+
+
+@pytest.fixture
+def patched_env(_module_patches, mock_db):
+    return _module_patches
@@ -3,260 +3,284 @@
 Тест полного цикла аутентификации с подтверждением email
 """
 
+import logging
 import os
 import sys
-import json
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 
+import pytest
+from passlib.hash import bcrypt
+
+from app.domain.services import password_hashing
+
 # Добавляем текущую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi.testclient import TestClient
-from app.main import app
-from app.infrastructure.database.database_factory import DatabaseFactory
-from app.infrastructure.database.mock_database import MockDatabase
+
+# Диагностика шагов — на уровне DEBUG: при обычном прогоне не выводится
+logger = logging.getLogger(__name__)
 
 
-def test_full_auth_cycle():
+@pytest.fixture
+def make_verified_user(client, patched_env, mock_db):
+    """Фабрика пользователей с подтвержденным email: регистрация и подтверждение по токену из письма"""
+    def _make(email: str, password: str = "testpassword", tenant_name: str = "Test Practice", role: str = "therapist"):
+        response = client.post("/auth/register", json={
+            "email": email,
+            "password": password,
+            "tenant_name": tenant_name,
+            "role": role
+        })
+        assert response.status_code == 201, f"Ошибка регистрации для теста: {response.text}"
+        token = patched_env.send_verification_email.call_args.args[1]
+        response = client.get(f"/auth/verify?token={token}")
+        assert response.status_code == 200, f"Ошибка подтверждения email для теста: {response.text}"
+        return email, password
+    return _make
+
+
+def test_full_auth_cycle(client, patched_env, mock_db):
     """Тест полного цикла: регистрация -> подтверждение email -> вход -> получение данных пользователя"""
-    print("🚀 Тестирование полного цикла аутентификации")
+    logger.debug("🚀 Тестирование полного цикла аутентификации")
     
-    # Патчим DatabaseFactory для использования мок-базы
-    with patch('app.main.DatabaseFactory.create_database', return_value=MockDatabase()):
-        with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-            with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                client = TestClient(app)
-        
-                # 1. Регистрация пользователя
-                print("\n1. Регистрация пользователя...")
-                register_data = {
-                    "email": "fullcycle@example.com",
-                    "password": "testpassword123",
-                    "tenant_name": "Full Cycle Test Practice",
-                    "role": "therapist",
-                    "locale": "ru"
-                }
-                
-                response = client.post("/auth/register", json=register_data)
-                print(f"Status: {response.status_code}")
-                
-                if response.status_code == 201:
-                    print("✅ Регистрация успешна")
-                    user_data = response.json()
-                    user_id = user_data["user_id"]
-                    print(f"User ID: {user_id}")
-                else:
-                    print(f"❌ Ошибка регистрации: {response.text}")
-                    assert False, f"Ошибка регистрации: {response.text}"
-                
-                # 2. Получаем verification token из мок-базы
-                print("\n2. Получение verification token...")
-                mock_db = DatabaseFactory.create_database()
-                user = mock_db.get_user_by_email("fullcycle@example.com")
-                
-                assert user and user.get("verification_token"), "Verification token не найден"
-                verification_token = user["verification_token"]
-                print(f"✅ Verification token получен: {verification_token[:20]}...")
-                
-                # 3. Подтверждаем email
-                print("\n3. Подтверждение email...")
-                response = client.get(f"/auth/verify?token={verification_token}")
-                print(f"Status: {response.status_code}")
-                
-                assert response.status_code == 200, f"Ошибка подтверждения email: {response.text}"
-                print("✅ Email подтвержден")
-                print(f"Response: {response.json()}")
-                
-                # 4. Попытка входа после подтверждения
-                print("\n4. Вход после подтверждения email...")
-                login_data = {
-                    "email": "fullcycle@example.com",
-                    "password": "testpassword123"
-                }
-                
-                response = client.post("/auth/login", json=login_data)
-                print(f"Status: {response.status_code}")
-                
-                assert response.status_code == 200, f"Ошибка входа: {response.text}"
-                print("✅ Вход успешен")
-                login_response = response.json()
-                print(f"Response: {json.dumps(login_response, indent=2)}")
-                
-                # Проверяем, что в ответе есть session cookie
-                cookies = response.cookies
-                print(f"Все cookies: {dict(cookies)}")
-                assert "session_token" in cookies, f"Session cookie не найден. Доступные cookies: {list(cookies.keys())}"
-                print(f"✅ Session cookie установлен: {cookies['session_token'][:20]}...")
-                
-                # 5. Получение информации о пользователе с токеном
-                print("\n5. Получение информации о пользователе...")
-                response = client.get("/auth/me")
-                print(f"Status: {response.status_code}")
-                
-                assert response.status_code == 200, f"Ошибка получения информации о пользователе: {response.text}"
-                print("✅ Информация о пользователе получена")
-                user_info = response.json()
-                print(f"User info: {json.dumps(user_info, indent=2)}")
-                
-                # Проверяем, что данные корректны
-                assert user_info["email"] == "fullcycle@example.com"
-                assert user_info["role"] == "therapist"
-                assert user_info["is_verified"] == True
-                print("✅ Данные пользователя корректны")
-                
-                # 6. Проверка состояния мок-базы после всех операций
-                print("\n6. Проверка состояния мок-базы...")
-                tenants = mock_db.get_tenants()
-                
-                # Получаем tenant_id для получения пользователей
-                assert len(tenants) > 0, "Нет tenants в базе данных"
-                tenant_id = tenants[0]['id']
-                users = mock_db.get_users(tenant_id)
-                
-                print(f"Количество tenants: {len(tenants)}")
-                print(f"Количество users: {len(users)}")
-                
-                # Проверяем, что пользователь подтвержден в базе
-                updated_user = mock_db.get_user_by_email("fullcycle@example.com")
-                assert updated_user and updated_user.get("is_verified"), "Пользователь не подтвержден в базе данных"
-                print("✅ Пользователь подтвержден в базе данных")
-                
-                print("\n✅ Полный цикл аутентификации прошел успешно!")
+    # 1. Регистрация пользователя
+    logger.debug("\n1. Регистрация пользователя...")
+    register_data = {
+        "email": "fullcycle@example.com",
+        "password": "testpassword123",
+        "tenant_name": "Full Cycle Test Practice",
+        "role": "therapist",
+        "locale": "ru"
+    }
+    
+    response = client.post("/auth/register", json=register_data)
+    logger.debug(f"Status: {response.status_code}")
+    
+    if response.status_code == 201:
+        logger.debug("✅ Регистрация успешна")
+        user_data = response.json()
+        user_id = user_data["user_id"]
+        logger.debug(f"User ID: {user_id}")
+    else:
+        logger.debug("❌ Ошибка регистрации: %s", response.content)
+        assert False, f"Ошибка регистрации: {response.text}"
+    
+    # 2. Получаем verification token из мок-базы
+    logger.debug("\n2. Получение verification token...")
+    user = mock_db.get_user_by_email("fullcycle@example.com")
+    
+    assert user and user.get("verification_token"), "Verification token не найден"
+    # В базе хранится только HMAC токена, сам токен уходит в письме
+    verification_token = patched_env.send_verification_email.call_args.args[1]
+    logger.debug(f"✅ Verification token получен: {verification_token[:20]}...")
+    
+    # 3. Подтверждаем email
+    logger.debug("\n3. Подтверждение email...")
+    response = client.get(f"/auth/verify?token={verification_token}")
+    logger.debug(f"Status: {response.status_code}")
+    
+    assert response.status_code == 200, f"Ошибка подтверждения email: {response.text}"
+    logger.debug("✅ Email подтвержден")
+    logger.debug("Response: %s", response.content)
+    
+    # 4. Попытка входа после подтверждения
+    logger.debug("\n4. Вход после подтверждения email...")
+    login_data = {
+        "email": "fullcycle@example.com",
+        "password": "testpassword123"
+    }
+    
+    response = client.post("/auth/login", json=login_data)
+    logger.debug(f"Status: {response.status_code}")
+    
+    assert response.status_code == 200, f"Ошибка входа: {response.text}"
+    logger.debug("✅ Вход успешен")
+    login_response = response.json()
+    logger.debug("Response: %s", login_response)
+    
+    # Проверяем, что в ответе есть session cookie
+    cookies = response.cookies
+    logger.debug(f"Все cookies: {dict(cookies)}")
+    assert "session_token" in cookies, f"Session cookie не найден. Доступные cookies: {list(cookies.keys())}"
+    logger.debug(f"✅ Session cookie установлен: {cookies['session_token'][:20]}...")
+    
+    # 5. Получение информации о пользователе с токеном
+    logger.debug("\n5. Получение информации о пользователе...")
+    response = client.get("/auth/me")
+    logger.debug(f"Status: {response.status_code}")
+    
+    assert response.status_code == 200, f"Ошибка получения информации о пользователе: {response.text}"
+    logger.debug("✅ Информация о пользователе получена")
+    user_info = response.json()
+    logger.debug("User info: %s", user_info)
+    
+    # Проверяем, что данные корректны
+    assert user_info["email"] == "fullcycle@example.com"
+    assert user_info["role"] == "therapist"
+    assert user_info["is_verified"] == True
+    logger.debug("✅ Данные пользователя корректны")
+    
+    # 6. Проверка состояния мок-базы после всех операций
+    logger.debug("\n6. Проверка состояния мок-базы...")
+    tenants = mock_db.get_tenants()
+    
+    # Получаем tenant_id для получения пользователей
+    assert len(tenants) > 0, "Нет tenants в базе данных"
+    tenant_id = tenants[0]['id']
+    users = mock_db.get_users(tenant_id)
+    
+    logger.debug(f"Количество tenants: {len(tenants)}")
+    logger.debug(f"Количество users: {len(users)}")
+    
+    # Проверяем, что пользователь подтвержден в базе
+    updated_user = mock_db.get_user_by_email("fullcycle@example.com")
+    assert updated_user and updated_user.get("is_verified"), "Пользователь не подтвержден в базе данных"
+    logger.debug("✅ Пользователь подтвержден в базе данных")
+    
+    logger.debug("\n✅ Полный цикл аутентификации прошел успешно!")
 
 
-def test_verification_with_invalid_token():
+def test_verification_with_invalid_token(client, patched_env):
     """Тест подтверждения email с неверным токеном"""
-    print("\n🧪 Тестирование подтверждения с неверным токеном")
+    logger.debug("\n🧪 Тестирование подтверждения с неверным токеном")
     
-    with patch('app.main.DatabaseFactory.create_database', return_value=MockDatabase()):
-        with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-            with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                client = TestClient(app)
-        
-                # Попытка подтверждения с неверным токеном
-                response = client.get("/auth/verify?token=invalid-token-123")
-                print(f"Status: {response.status_code}")
-                
-                if response.status_code == 400:
-                    print("✅ Правильно отклонен неверный токен")
-                    print(f"Response: {response.json()}")
-                else:
-                    print(f"❌ Неожиданный статус: {response.status_code}")
+    # Попытка подтверждения с неверным токеном
+    response = client.get("/auth/verify?token=invalid-token-123")
+    logger.debug(f"Status: {response.status_code}")
+    
+    if response.status_code == 400:
+        logger.debug("✅ Правильно отклонен неверный токен")
+        logger.debug("Response: %s", response.content)
+    else:
+        logger.debug(f"❌ Неожиданный статус: {response.status_code}")
 
 
-def test_login_with_wrong_password():
+def test_login_with_wrong_password(client, make_verified_user):
     """Тест входа с неверным паролем"""
-    print("\n🧪 Тестирование входа с неверным паролем")
+    logger.debug("\n🧪 Тестирование входа с неверным паролем")
     
-    with patch('app.main.DatabaseFactory.create_database', return_value=MockDatabase()):
-        with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-            with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                client = TestClient(app)
-        
-                # Сначала регистрируем пользователя
-                register_data = {
-                    "email": "wrongpass@example.com",
-                    "password": "correctpassword",
-                    "tenant_name": "Wrong Pass Test",
-                    "role": "therapist"
-                }
-                
-                response = client.post("/auth/register", json=register_data)
-                if response.status_code != 201:
-                    print("❌ Ошибка регистрации для теста")
-                    return
-                
-                # Подтверждаем email
-                mock_db = DatabaseFactory.create_database()
-                user = mock_db.get_user_by_email("wrongpass@example.com")
-                if user and user.get("verification_token"):
-                    client.get(f"/auth/verify?token={user['verification_token']}")
-                
-                # Попытка входа с неверным паролем
-                login_data = {
-                    "email": "wrongpass@example.com",
-                    "password": "wrongpassword"
-                }
-                
-                response = client.post("/auth/login", json=login_data)
-                print(f"Status: {response.status_code}")
-                
-                if response.status_code == 401:
-                    print("✅ Правильно отклонен неверный пароль")
-                    print(f"Response: {response.json()}")
-                else:
-                    print(f"❌ Неожиданный статус: {response.status_code}")
+    email, _ = make_verified_user("wrongpass@example.com", "correctpassword", "Wrong Pass Test")
+    
+    # Попытка входа с неверным паролем
+    login_data = {
+        "email": email,
+        "password": "wrongpassword"
+    }
+    
+    response = client.post("/auth/login", json=login_data)
+    logger.debug(f"Status: {response.status_code}")
+    
+    if response.status_code == 401:
+        logger.debug("✅ Правильно отклонен неверный пароль")
+        logger.debug("Response: %s", response.content)
+    else:
+        logger.debug(f"❌ Неожиданный статус: {response.status_code}")
+
+
+def test_repeated_wrong_login_costs_full_check(client, make_verified_user):
+    """
+    Повторный неверный вход платит полную проверку и для существующего, и для
+    несуществующего email: по времени ответа нельзя понять, зарегистрирован ли адрес
+    """
+    email, _ = make_verified_user("timing@example.com", "correctpassword", "Timing Test")
+    
+    # Пул потоков вместо пула процессов, чтобы подсчитать вызовы проверки в этом процессе
+    with ThreadPoolExecutor(max_workers=1) as pool, \
+         patch.object(password_hashing, "_get_hash_pool", return_value=pool), \
+         patch.object(password_hashing, "_verify_in_worker", wraps=password_hashing._verify_in_worker) as real_check, \
+         patch.object(password_hashing, "verify_dummy_password", wraps=password_hashing.verify_dummy_password) as dummy_check:
+        for login_email in (email, "unknown@example.com"):
+            for _ in range(2):
+                response = client.post("/auth/login", json={"email": login_email, "password": "wrongpassword"})
+                assert response.status_code == 401, f"Неожиданный ответ: {response.text}"
+    
+    assert real_check.call_count == 2, "Повторный неверный пароль для существующего email ответил из кэша"
+    assert dummy_check.call_count == 2, "Для несуществующего email проверка-заглушка выполнена не каждый раз"
 
 
-def test_logout():
+def test_login_rehashes_legacy_bcrypt(client, patched_env, mock_db):
+    """Успешный вход заменяет старый bcrypt-хеш на Argon2id"""
+    tenant = mock_db.create_tenant({"name": "Legacy Practice"})
+    user = mock_db.create_user({
+        "email": "legacy@example.com",
+        "password_hash": bcrypt.using(rounds=4).hash("legacy-password"),
+        "tenant_id": tenant["id"],
+        "role": "therapist",
+        "is_verified": True,
+    })
+    
+    response = client.post("/auth/login", json={"email": "legacy@example.com", "password": "legacy-password"})
+    assert response.status_code == 200, f"Ошибка входа: {response.text}"
+    
+    rehashed = mock_db.get_user(user["id"])["password_hash"]
+    assert rehashed.startswith("$argon2id$"), "bcrypt-хеш не был перехеширован при входе"
+    
+    # С новым хешем вход по-прежнему работает
+    response = client.post("/auth/login", json={"email": "legacy@example.com", "password": "legacy-password"})
+    assert response.status_code == 200, f"Ошибка повторного входа: {response.text}"
+
+
+def test_logout(client, make_verified_user):
     """Тест выхода из системы"""
-    print("\n🧪 Тестирование выхода из системы")
+    logger.debug("\n🧪 Тестирование выхода из системы")
+    
+    email, password = make_verified_user("logout@example.com", "testpassword", "Logout Test")
+    
+    # Входим
+    login_data = {
+        "email": email,
+        "password": password
+    }
     
-    with patch('app.main.DatabaseFactory.create_database', return_value=MockDatabase()):
-        with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-            with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                client = TestClient(app)
+    response = client.post("/auth/login", json=login_data)
+    if response.status_code != 200:
+        logger.debug("❌ Ошибка входа для теста")
+        return
+    
+    # Проверяем, что можем получить информацию о пользователе
+    response = client.get("/auth/me")
+    if response.status_code != 200:
+        logger.debug("❌ Не можем получить информацию о пользователе")
+        return
+    
+    # Выходим
+    response = client.post("/auth/logout")
+    logger.debug(f"Status: {response.status_code}")
+    
+    if response.status_code == 200:
+        logger.debug("✅ Выход успешен")
+        logger.debug("Response: %s", response.content)
         
-                # Сначала регистрируем и входим
-                register_data = {
-                    "email": "logout@example.com",
-                    "password": "testpassword",
-                    "tenant_name": "Logout Test",
-                    "role": "therapist"
-                }
-                
-                response = client.post("/auth/register", json=register_data)
-                if response.status_code != 201:
-                    print("❌ Ошибка регистрации для теста")
-                    return
-                
-                # Подтверждаем email
-                mock_db = DatabaseFactory.create_database()
-                user = mock_db.get_user_by_email("logout@example.com")
-                if user and user.get("verification_token"):
-                    client.get(f"/auth/verify?token={user['verification_token']}")
-                
-                # Входим
-                login_data = {
-                    "email": "logout@example.com",
-                    "password": "testpassword"
-                }
-                
-                response = client.post("/auth/login", json=login_data)
-                if response.status_code != 200:
-                    print("❌ Ошибка входа для теста")
-                    return
-                
-                # Проверяем, что можем получить информацию о пользователе
-                response = client.get("/auth/me")
-                if response.status_code != 200:
-                    print("❌ Не можем получить информацию о пользователе")
-                    return
-                
-                # Выходим
-                response = client.post("/auth/logout")
-                print(f"Status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    print("✅ Выход успешен")
-                    print(f"Response: {response.json()}")
-                    
-                    # Проверяем, что после выхода не можем получить информацию о пользователе
-                    response = client.get("/auth/me")
-                    if response.status_code == 401:
-                        print("✅ После выхода доступ к /auth/me правильно отклонен")
-                    else:
-                        print(f"❌ После выхода неожиданный статус /auth/me: {response.status_code}")
-                else:
-                    print(f"❌ Ошибка выхода: {response.text}")
+        # Проверяем, что после выхода не можем получить информацию о пользователе
+        response = client.get("/auth/me")
+        if response.status_code == 401:
+            logger.debug("✅ После выхода доступ к /auth/me правильно отклонен")
+        else:
+            logger.debug(f"❌ После выхода неожиданный статус /auth/me: {response.status_code}")
+    else:
+        logger.debug("❌ Ошибка выхода: %s", response.content)
 
 
 if __name__ == "__main__":
-    print("=== Тестирование полного цикла аутентификации ===")
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
+
+
+def test_double_submit_verify_sends_one_welcome(client, patched_env, mock_db):
+    """Два одновременных перехода по ссылке: подтверждает и шлет приветствие только один"""
+    response = client.post("/auth/register", json={
+        "email": "doubleclick@example.com",
+        "password": "testpassword123",
+        "tenant_name": "Double Click Practice",
+        "role": "therapist"
+    })
+    assert response.status_code == 201
+    token = patched_env.send_verification_email.call_args.args[1]
+    patched_env.send_welcome_email.reset_mock()
     
-    test_full_auth_cycle()
-    test_verification_with_invalid_token()
-    test_login_with_wrong_password()
-    test_logout()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        responses = list(executor.map(lambda _: client.get(f"/auth/verify?token={token}"), range(2)))
     
-    print("\n=== Все тесты завершены ===") 
+    assert sorted(response.status_code for response in responses) == [200, 400]
+    assert patched_env.send_welcome_email.call_count == 1
+    assert mock_db.get_user_by_email("doubleclick@example.com")["is_verified"] is True
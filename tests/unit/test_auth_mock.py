@@ -1,179 +1,106 @@
 import os
-import requests
+import sys
 import json
-from unittest.mock import patch
-from fastapi.testclient import TestClient
-from app.main import app
-from app.infrastructure.database.database_factory import DatabaseFactory
-from app.infrastructure.database.mock_database import MockDatabase
+import logging
+import pytest
 
 # Устанавливаем переменную окружения для использования мок-базы
 os.environ["DATABASE_TYPE"] = "mock"
 os.environ["TESTING"] = "true"
 
-# Создаем тестовый клиент
-client = TestClient(app)
+# Диагностика шагов — на уровне DEBUG: при обычном прогоне не форматируется и не выводится
+logger = logging.getLogger(__name__)
 
-# Создаем мок-базу для тестов
-mock_db = MockDatabase()
+# Тела запросов для test_multiple_runs сериализуются один раз при импорте модуля
+JSON_HEADERS = {"content-type": "application/json"}
+REGISTER_PAYLOADS = [
+    json.dumps({
+        "email": f"test{i}@example.com",
+        "password": "testpassword123",
+        "tenant_name": f"Test Practice {i}",
+        "role": "therapist",
+        "locale": "ru"
+    }).encode()
+    for i in range(3)
+]
 
 
-def get_mock_database():
-    """Dependency для получения мок-базы данных"""
-    return mock_db
+REGISTER_PAYLOAD = json.dumps({
+    "email": "test@example.com",
+    "password": "testpassword123",
+    "tenant_name": "Test Therapy Practice",
+    "role": "therapist",
+    "locale": "ru"
+}).encode()
 
 
-def test_auth_flow():
-    """Тестирует полный flow аутентификации с мок-базой данных"""
-    
-    print("=== Тестирование аутентификации с мок-базой данных ===\n")
-    
-    # Очищаем мок-базу перед тестами
-    mock_db.clear()
-    
-    # Патчим DatabaseFactory.create_database чтобы возвращать мок-базу
-    with patch('app.main.DatabaseFactory.create_database', return_value=mock_db):
-        with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-            with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                
-                # 1. Регистрация нового пользователя
-                print("1. Регистрация пользователя...")
-                register_data = {
-                    "email": "test@example.com",
-                    "password": "testpassword123",
-                    "tenant_name": "Test Therapy Practice",
-                    "role": "therapist",
-                    "locale": "ru"
-                }
-                
-                response = client.post("/auth/register", json=register_data)
-                print(f"Status: {response.status_code}")
-                if response.status_code == 201:
-                    print("✅ Регистрация успешна")
-                    print(f"Response: {response.json()}")
-                    # Проверим состояние мок-базы сразу после регистрации
-                    print(f"  После регистрации - tenants: {len(mock_db.tenants)}, users: {len(mock_db.users)}")
-                else:
-                    print(f"❌ Ошибка регистрации: {response.text}")
-                    return
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 2. Попытка входа без подтверждения email
-                print("2. Попытка входа без подтверждения email...")
-                login_data = {
-                    "email": "test@example.com",
-                    "password": "testpassword123"
-                }
-                
-                response = client.post("/auth/login", json=login_data)
-                print(f"Status: {response.status_code}")
-                if response.status_code == 401:
-                    print("✅ Правильно отклонен вход без подтверждения email")
-                    print(f"Response: {response.json()}")
-                else:
-                    print(f"❌ Неожиданный ответ: {response.text}")
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 3. Получение информации о пользователе (должно требовать аутентификации)
-                print("3. Попытка получить информацию о пользователе без токена...")
-                response = client.get("/auth/me")
-                print(f"Status: {response.status_code}")
-                if response.status_code == 401:
-                    print("✅ Правильно отклонен доступ без токена")
-                else:
-                    print(f"❌ Неожиданный ответ: {response.text}")
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 4. Проверка health endpoint
-                print("4. Проверка health endpoint...")
-                response = client.get("/health")
-                print(f"Status: {response.status_code}")
-                if response.status_code == 200:
-                    print("✅ Health endpoint работает")
-                    print(f"Response: {response.json()}")
-                else:
-                    print(f"❌ Ошибка health endpoint: {response.text}")
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 5. Проверка документации API
-                print("5. Проверка документации API...")
-                response = client.get("/docs")
-                print(f"Status: {response.status_code}")
-                if response.status_code == 200:
-                    print("✅ Документация API доступна")
-                else:
-                    print(f"❌ Ошибка документации API: {response.text}")
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 6. Проверка повторной регистрации с тем же email
-                print("6. Попытка повторной регистрации с тем же email...")
-                response = client.post("/auth/register", json=register_data)
-                print(f"Status: {response.status_code}")
-                if response.status_code == 400:
-                    print("✅ Правильно отклонена повторная регистрация")
-                    print(f"Response: {response.json()}")
-                else:
-                    print(f"❌ Неожиданный ответ: {response.text}")
-                    print(f"  При повторной регистрации - tenants: {len(mock_db.tenants)}, users: {len(mock_db.users)}")
-                    print(f"  Email mapping: {mock_db.email_to_user}")
-                
-                print("\n" + "="*50 + "\n")
-                
-                # 7. Проверка состояния мок-базы
-                print("7. Проверка состояния мок-базы...")
-                print(f"Количество tenants: {len(mock_db.tenants)}")
-                print(f"Количество users: {len(mock_db.users)}")
-                print(f"Количество clients: {len(mock_db.clients)}")
-                
-                # Добавим детальную отладочную информацию
-                print(f"Tenants: {list(mock_db.tenants.keys())}")
-                print(f"Users: {list(mock_db.users.keys())}")
-                print(f"Email to user mapping: {mock_db.email_to_user}")
-                
-                assert len(mock_db.tenants) == 1, f"Ожидался 1 tenant, найдено: {len(mock_db.tenants)}"
-                assert len(mock_db.users) == 1, f"Ожидался 1 user, найдено: {len(mock_db.users)}"
-                print("✅ Данные корректно сохранены в мок-базе")
-    
-    # Очищаем мок-базу после тестов
-    mock_db.clear()
+@pytest.fixture
+def registered_user(client, patched_env, mock_db):
+    """Зарегистрированный пользователь с неподтвержденным email (мок-база очищается перед каждым тестом)"""
+    response = client.post("/auth/register", content=REGISTER_PAYLOAD, headers=JSON_HEADERS)
+    assert response.status_code == 201, f"Ошибка регистрации: {response.text}"
+    logger.debug(f"После регистрации - tenants: {len(mock_db.tenants)}, users: {len(mock_db.users)}")
+    return response.json()
+
+
+def test_register(registered_user, mock_db):
+    """Регистрация сохраняет tenant и пользователя в мок-базе"""
+    assert registered_user["email"] == "test@example.com"
+    assert len(mock_db.tenants) == 1, f"Ожидался 1 tenant, найдено: {len(mock_db.tenants)}"
+    assert len(mock_db.users) == 1, f"Ожидался 1 user, найдено: {len(mock_db.users)}"
+
+
+def test_login_unverified_rejected(client, registered_user):
+    """Вход без подтверждения email отклоняется"""
+    response = client.post(
+        "/auth/login",
+        json={"email": "test@example.com", "password": "testpassword123"},
+    )
+    assert response.status_code == 401, f"Неожиданный ответ: {response.text}"
+
 
+def test_me_requires_token(client, patched_env):
+    """/auth/me без токена недоступен"""
+    response = client.get("/auth/me")
+    assert response.status_code == 401, f"Неожиданный ответ: {response.text}"
 
-def test_multiple_runs():
+
+def test_health(client, patched_env):
+    response = client.get("/health")
+    assert response.status_code == 200, f"Ошибка health endpoint: {response.text}"
+
+
+def test_duplicate_register_rejected(client, registered_user, mock_db):
+    """Повторная регистрация с тем же email отклоняется и не создает новых записей"""
+    response = client.post("/auth/register", content=REGISTER_PAYLOAD, headers=JSON_HEADERS)
+    assert response.status_code == 400, f"Неожиданный ответ: {response.text}"
+    logger.debug(f"Email mapping: {mock_db.string_index}")
+    assert len(mock_db.tenants) == 1, f"Ожидался 1 tenant, найдено: {len(mock_db.tenants)}"
+    assert len(mock_db.users) == 1, f"Ожидался 1 user, найдено: {len(mock_db.users)}"
+
+
+def test_multiple_runs(client, patched_env, mock_db):
     """Тестирует, что можно запускать тесты многократно без конфликтов"""
     
-    print("\n=== Тестирование множественных запусков ===\n")
+    logger.debug("\n=== Тестирование множественных запусков ===\n")
     
     for i in range(3):
-        print(f"Запуск {i + 1}:")
+        logger.debug(f"Запуск {i + 1}:")
         
         # Очищаем мок-базу перед каждым запуском
         mock_db.clear()
         
-        with patch('app.main.DatabaseFactory.create_database', return_value=mock_db):
-            with patch('app.infrastructure.external.email_service.email_service.send_verification_email', return_value=True):
-                with patch('app.infrastructure.external.email_service.email_service.send_welcome_email', return_value=True):
-                    
-                    register_data = {
-                        "email": f"test{i}@example.com",
-                        "password": "testpassword123",
-                        "tenant_name": f"Test Practice {i}",
-                        "role": "therapist",
-                        "locale": "ru"
-                    }
-                    
-                    response = client.post("/auth/register", json=register_data)
-                    assert response.status_code == 201, f"Ошибка регистрации {i + 1}: {response.text}"
-                    print(f"  ✅ Регистрация {i + 1} успешна")
-        
-        print()
+        response = client.post("/auth/register", content=REGISTER_PAYLOADS[i], headers=JSON_HEADERS)
+        assert response.status_code == 201, f"Ошибка регистрации {i + 1}: {response.text}"
+        logger.debug(f"  ✅ Регистрация {i + 1} успешна")
+
+
+def test_openapi_schema(client):
+    """Схема OpenAPI (основа /docs) строится без ошибок; отдельно от flow аутентификации"""
+    response = client.get("/openapi.json")
+    assert response.status_code == 200, f"Ошибка схемы OpenAPI: {response.text}"
+    assert "/auth/register" in response.json()["paths"]
 
 
 if __name__ == "__main__":
-    test_auth_flow()
-    test_multiple_runs()
-    print("=== Все тесты завершены ===") 
+    sys.exit(pytest.main([__file__, "-v", "-s"]))
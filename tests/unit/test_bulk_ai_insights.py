@@ -0,0 +1,45 @@
+"""
+Пакетная вставка инсайтов: RealDatabase идет через crud с RETURNING только id
+"""
+
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from app.infrastructure.database.mock_database import MockDatabase
+from app.infrastructure.database.real_database import RealDatabase
+
+
+def _insights(count: int):
+    return [
+        {"session_id": uuid4(), "kind": "summary", "content_json": {"text": str(i)}, "embedding": None}
+        for i in range(count)
+    ]
+
+
+def test_real_database_returns_only_ids_in_chunks():
+    session = MagicMock()
+    session.execute.side_effect = lambda stmt, rows: MagicMock(
+        scalars=lambda: MagicMock(all=lambda: [uuid4() for _ in rows])
+    )
+    
+    ids = RealDatabase(session).bulk_create_ai_insights(_insights(1200))
+    
+    assert len(ids) == 1200
+    assert [len(call.args[1]) for call in session.execute.call_args_list] == [500, 500, 200]
+    stmt = session.execute.call_args_list[0].args[0]
+    assert [column.name for column in stmt._returning] == ["id"]
+    session.commit.assert_called_once()
+
+
+def test_bulk_create_ai_insights_empty_skips_database():
+    session = MagicMock()
+    assert RealDatabase(session).bulk_create_ai_insights([]) == []
+    session.execute.assert_not_called()
+
+
+def test_mock_database_returns_ids():
+    db = MockDatabase()
+    ids = db.bulk_create_ai_insights(_insights(3))
+    
+    assert len(ids) == 3
+    assert all(db.get_ai_insight(insight_id)["id"] == insight_id for insight_id in ids)
@@ -10,21 +10,17 @@ from unittest.mock import patch, MagicMock
 # Добавляем текущую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.infrastructure.external.email_service import EmailService
+import pytest
+
+from app.infrastructure.external.email_service import EmailService, email_service as shared_email_service
+from app.tasks.email import EmailDeliveryError, send_verification_task
 from app.config import settings
 
 
 def test_email_service_mock_mode():
     """Тест email сервиса в mock режиме (без AWS credentials)"""
     print("\n🧪 1. Testing Email Service in Mock Mode")
-    # Очищаем AWS credentials из окружения
-    for var in ["AWS_REGION", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "SENDER_EMAIL"]:
-        if var in os.environ:
-            del os.environ[var]
-    with patch.object(settings, 'aws_access_key_id', None), \
-         patch.object(settings, 'aws_secret_access_key', None), \
-         patch.object(settings, 'aws_region', None), \
-         patch.object(settings, 'sender_email', None):
+    with patch.object(EmailService, '_make_ses_client', return_value=None):
         email_service = EmailService()
         assert email_service.ses_client is None
         
@@ -43,15 +39,11 @@ def test_email_service_mock_mode():
 def test_email_service_with_aws_credentials():
     """Тест email сервиса с AWS credentials (mock SES)"""
     print("\n🧪 2. Testing Email Service with AWS Credentials")
-    # Мокаем AWS credentials и sender_email
-    with patch.object(settings, 'aws_access_key_id', 'test-key'), \
-         patch.object(settings, 'aws_secret_access_key', 'test-secret'), \
-         patch.object(settings, 'aws_region', 'us-east-1'), \
-         patch.object(settings, 'sender_email', 'test@example.com'):
-        mock_ses_client = MagicMock()
-        mock_response = {"MessageId": "test-message-id"}
-        mock_ses_client.send_email.return_value = mock_response
-        with patch('boto3.client', return_value=mock_ses_client):
+    # Подменяем SES клиент целиком, без boto3.client и AWS credentials
+    mock_ses_client = MagicMock()
+    mock_ses_client.send_templated_email.return_value = {"MessageId": "test-message-id"}
+    with patch.object(settings, 'sender_email', 'test@example.com'):
+        with patch.object(EmailService, '_make_ses_client', return_value=mock_ses_client):
             email_service = EmailService()
             assert email_service.ses_client is not None
             
@@ -64,13 +56,15 @@ def test_email_service_with_aws_credentials():
             )
             
             assert result is True, "SES email service did not return True"
-            assert mock_ses_client.send_email.called, "SES send_email was not called"
+            assert mock_ses_client.create_template.called, "SES templates were not synced"
+            assert mock_ses_client.send_templated_email.called, "SES send_templated_email was not called"
             
             # Проверяем параметры вызова
-            call_args = mock_ses_client.send_email.call_args
+            call_args = mock_ses_client.send_templated_email.call_args
             assert call_args[1]['Source'] == "test@example.com"
             assert call_args[1]['Destination']['ToAddresses'] == ["test@example.com"]
-            assert "Подтверждение регистрации" in call_args[1]['Message']['Subject']['Data']
+            assert call_args[1]['Template'] == "verification-v1"
+            assert "Test Company" in call_args[1]['TemplateData']
             
             print("✅ AWS SES email service works correctly \n")
 
@@ -78,14 +72,7 @@ def test_email_service_with_aws_credentials():
 def test_welcome_email():
     """Тест отправки приветственного письма"""
     print("\n🧪 3. Testing Welcome Email")
-    # Очищаем AWS credentials из окружения
-    for var in ["AWS_REGION", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "SENDER_EMAIL"]:
-        if var in os.environ:
-            del os.environ[var]
-    with patch.object(settings, 'aws_access_key_id', None), \
-         patch.object(settings, 'aws_secret_access_key', None), \
-         patch.object(settings, 'aws_region', None), \
-         patch.object(settings, 'sender_email', None):
+    with patch.object(EmailService, '_make_ses_client', return_value=None):
         email_service = EmailService()
         result = email_service.send_welcome_email(
             "test@example.com",
@@ -99,29 +86,29 @@ def test_email_service_error_handling():
     """Тест обработки ошибок в email сервисе"""
     print("\n🧪 4. Testing Email Service Error Handling")
     
-    # Мокаем AWS credentials
-    with patch.dict(os.environ, {
-        "AWS_REGION": "us-east-1",
-        "AWS_ACCESS_KEY_ID": "test-key",
-        "AWS_SECRET_ACCESS_KEY": "test-secret",
-        "SENDER_EMAIL": "test@example.com"
-    }):
-        # Мокаем boto3.client с ошибкой
-        mock_ses_client = MagicMock()
-        mock_ses_client.send_email.side_effect = Exception("AWS SES Error")
+    # SES клиент, который падает при отправке
+    mock_ses_client = MagicMock()
+    mock_ses_client.send_email.side_effect = Exception("AWS SES Error")
+    
+    with patch.object(EmailService, '_make_ses_client', return_value=mock_ses_client):
+        email_service = EmailService()
         
-        with patch('boto3.client', return_value=mock_ses_client):
-            email_service = EmailService()
-            
-            # Тестируем обработку ошибки
-            result = email_service.send_email(
-                "test@example.com",
-                "Test Subject",
-                "Test Body"
-            )
-            
-            assert result is False, "Error handling did not return False"
-            print("✅ Error handling works correctly \n")
+        # Тестируем обработку ошибки
+        result = email_service.send_email(
+            "test@example.com",
+            "Test Subject",
+            "Test Body"
+        )
+        
+        assert result is False, "Error handling did not return False"
+        print("✅ Error handling works correctly \n")
+
+
+def test_email_task_raises_on_failed_send():
+    """Актор очереди падает, если письмо не ушло, чтобы Dramatiq повторил попытку"""
+    with patch.object(shared_email_service, "send_verification_email", return_value=False):
+        with pytest.raises(EmailDeliveryError):
+            send_verification_task.fn("test@example.com", "test-token-123", "Test Company")
 
 
 if __name__ == "__main__":
@@ -131,5 +118,6 @@ if __name__ == "__main__":
     test_email_service_with_aws_credentials()
     test_welcome_email()
     test_email_service_error_handling()
+    test_email_task_raises_on_failed_send()
     
     print("\n✅ All email service tests passed!") 
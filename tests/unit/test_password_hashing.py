@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Тесты хеширования паролей
+"""
+
+from passlib.hash import argon2, bcrypt
+
+from app.config import settings
+from app.domain.services import auth_service
+
+
+def test_new_hashes_use_argon2():
+    """Новые пароли хешируются через Argon2id"""
+    password_hash = auth_service.get_password_hash("secret-password")
+    assert password_hash.startswith("$argon2id$")
+    assert auth_service.verify_password("secret-password", password_hash)
+    assert not auth_service.verify_password("wrong-password", password_hash)
+
+
+def test_legacy_bcrypt_hash_still_verifies():
+    """Старые bcrypt-хеши проверяются и помечаются на перехеширование"""
+    legacy_hash = bcrypt.using(rounds=4).hash("legacy-password")
+    assert auth_service.verify_password("legacy-password", legacy_hash)
+    assert auth_service.pwd_context.needs_update(legacy_hash)
+
+
+def test_argon2_uses_configured_cost():
+    """
+    Новые хеши создаются с параметрами из settings. Время хеширования с
+    продакшен-параметрами замеряет scripts/benchmark_password_hashing.py
+    """
+    params = argon2.from_string(auth_service.get_password_hash("configured-password"))
+    assert params.memory_cost == settings.argon2_memory_cost
+    assert params.rounds == settings.argon2_time_cost
+    assert params.parallelism == settings.argon2_parallelism
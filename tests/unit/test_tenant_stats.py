@@ -0,0 +1,56 @@
+"""
+Тесты /tenants/{tenant_id}/stats: tenant без строки в tenant_stats и схема без представления
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import ProgrammingError
+
+from app.infrastructure.database import async_crud
+from app.infrastructure.database.database import get_async_db
+
+
+@pytest.fixture
+def no_async_db(app):
+    """Сессия не нужна: функции async_crud подменяются в тестах"""
+    app.dependency_overrides[get_async_db] = lambda: None
+    yield
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+def test_stats_zero_for_tenant_created_after_refresh(client, no_async_db):
+    tenant_id = uuid4()
+    with patch.object(async_crud, "get_tenant_stats", AsyncMock(return_value=None)), \
+         patch.object(async_crud, "get_tenant", AsyncMock(return_value=SimpleNamespace(id=tenant_id))):
+        response = client.get(f"/tenants/{tenant_id}/stats")
+    
+    assert response.status_code == 200
+    assert response.json() == {
+        "tenant_id": str(tenant_id), "sessions": 0, "insights": 0, "last_session": None
+    }
+
+
+def test_stats_404_for_unknown_tenant(client, no_async_db):
+    with patch.object(async_crud, "get_tenant_stats", AsyncMock(return_value=None)), \
+         patch.object(async_crud, "get_tenant", AsyncMock(return_value=None)):
+        response = client.get(f"/tenants/{uuid4()}/stats")
+    
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Tenant not found"
+
+
+def test_get_tenant_stats_without_view_returns_none():
+    """Схема из create_all: представления tenant_stats нет, транзакция откатывается"""
+    orig = Exception('relation "tenant_stats" does not exist')
+    orig.pgcode = async_crud.UNDEFINED_TABLE
+    db = SimpleNamespace(
+        execute=AsyncMock(side_effect=ProgrammingError("SELECT", {}, orig)),
+        rollback=AsyncMock(),
+    )
+    
+    assert asyncio.run(async_crud.get_tenant_stats(db, tenant_id=uuid4())) is None
+    db.rollback.assert_awaited_once()
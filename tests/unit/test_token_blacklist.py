@@ -0,0 +1,41 @@
+"""
+Черный список токенов: при недоступном Redis проверка работает fail closed
+"""
+
+from unittest.mock import MagicMock
+
+import redis
+
+from app.infrastructure.external.token_blacklist import TokenBlacklistService
+
+
+def test_unreachable_redis_rejects_token():
+    service = TokenBlacklistService()
+    service.redis_client = MagicMock()
+    service.redis_client.exists.side_effect = redis.ConnectionError("down")
+    
+    assert service.is_blacklisted("some-jti") is True
+
+
+def test_in_memory_blacklist_expires():
+    service = TokenBlacklistService()
+    service.redis_client = None
+    service.blacklist("revoked", 60)
+    service.blacklist("expired", 0)
+    
+    assert service.is_blacklisted("revoked")
+    assert not service.is_blacklisted("expired")
+
+
+def test_revocation_during_redis_outage_survives_recovery():
+    service = TokenBlacklistService()
+    service.redis_client = MagicMock()
+    service.redis_client.set.side_effect = redis.ConnectionError("down")
+    service.blacklist("logged-out", 60)
+    
+    # Redis снова доступен, но записи о токене в нем нет
+    service.redis_client.exists.side_effect = None
+    service.redis_client.exists.return_value = 0
+    
+    assert service.is_blacklisted("logged-out") is True
+    assert service.is_blacklisted("other") is False